@@ -1,95 +1,128 @@
 import os
-import json
-from datetime import datetime, timedelta
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
-from flask import Flask, request, jsonify
-import requests
-from sqlalchemy import create_engine, Column, Integer, String, DateTime, Float, ForeignKey
-from sqlalchemy.orm import declarative_base, sessionmaker, relationship
+from flask import Flask, Response, request, jsonify
 
-# إعدادات أساسية
-TELEGRAM_TOKEN = os.getenv("TELEGRAM_TOKEN", "ضع_توكن_البوت_هنا")
-TELEGRAM_API_URL = f"https://api.telegram.org/bot{TELEGRAM_TOKEN}"
-NOWPAYMENTS_IPN_SECRET = os.getenv("NOWPAYMENTS_IPN_SECRET", "ضع_IPN_SECRET_هنا")
+import jobs
+import entitlements
+import outbox
+import metrics
+from entitlements import Entitlement
+from config import (EXPIRE_INTERVAL_SECONDS, EXPIRY_NOTIFY, SIGNAL_ENGINE_ENABLED,
+                    RENEWAL_REMINDERS_ENABLED, RENEWAL_INTERVAL_SECONDS, INVOICE_WORKERS)
+
+# طبقة قاعدة البيانات (SQLAlchemy: models / services / ipn / signal_engine) تُستورد داخل المعالجات
+# عند أول حاجة لها، فاستيراد app سريع، ورسائل المشتركين من كاش الصلاحيات لا تحمّلها أصلاً
 
+# إعدادات أساسية
 WEBHOOK_ROUTE = f"/market-signals-bot/telegram-webhook"
 NOWPAYMENTS_ROUTE = f"/market-signals-bot/nowpayments-webhook"
 PORT = int(os.getenv("PORT", 5000))
 
-# قاعدة البيانات
-DATABASE_URL = "sqlite:///./market_signals_bot.db"
-Base = declarative_base()
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
-SessionLocal = sessionmaker(bind=engine)
-
-class User(Base):
-    __tablename__ = "users"
-    id = Column(Integer, primary_key=True)
-    telegram_id = Column(String, unique=True, index=True, nullable=False)
-    username = Column(String, nullable=True)
-    first_name = Column(String, nullable=True)
-    last_name = Column(String, nullable=True)
-    created_at = Column(DateTime, default=datetime.utcnow)
-    subscriptions = relationship("Subscription", back_populates="user")
-
-class Subscription(Base):
-    __tablename__ = "subscriptions"
-    id = Column(Integer, primary_key=True)
-    user_id = Column(Integer, ForeignKey("users.id"))
-    start_date = Column(DateTime)
-    end_date = Column(DateTime)
-    status = Column(String, default="active")  # active, expired
-    payment_id = Column(String, nullable=True)
-    amount = Column(Float, nullable=True)
-    currency = Column(String, nullable=True)
-    user = relationship("User", back_populates="subscriptions")
-
-Base.metadata.create_all(bind=engine)
+# الجداول تُنشأ بـ "python manage.py init-db" عند النشر وليس عند الاستيراد
 
 app = Flask(__name__)
 
 def send_message(chat_id, text):
-    requests.post(f"{TELEGRAM_API_URL}/sendMessage", json={"chat_id": chat_id, "text": text})
-
-def get_user(session, telegram_id, create_if_not_exist=True, user_info=None):
-    user = session.query(User).filter_by(telegram_id=str(telegram_id)).first()
-    if not user and create_if_not_exist:
-        user = User(
-            telegram_id=str(telegram_id),
-            username=user_info.get("username") if user_info else None,
-            first_name=user_info.get("first_name") if user_info else None,
-            last_name=user_info.get("last_name") if user_info else None,
-        )
-        session.add(user)
-        session.commit()
-    return user
-
-def get_active_subscription(session, user_id):
-    now = datetime.utcnow()
-    return session.query(Subscription).filter(
-        Subscription.user_id == user_id,
-        Subscription.status == "active",
-        Subscription.start_date <= now,
-        Subscription.end_date >= now
-    ).first()
-
-def expire_subscriptions():
-    session = SessionLocal()
-    now = datetime.utcnow()
-    expired = session.query(Subscription).filter(
-        Subscription.status == "active",
-        Subscription.end_date < now
-    ).all()
-    for sub in expired:
-        sub.status = "expired"
-        session.add(sub)
-    session.commit()
-    session.close()
+    # لا ننتظر تيليجرام داخل الطلب: الرسالة تُضاف للطابور وترسلها عمال outbox
+    outbox.send_message(chat_id, text)
+
+# فواتير /renew الناقصة تُنشأ في خيوط الخلفية (طلب NowPayments قد يستغرق ثوانٍ)،
+# والرابط يصل عبر outbox؛ اشتراك واحد لا يُطلب له أكثر من فاتورة في الوقت نفسه
+_invoice_pool = None
+_invoice_pending = set()
+_invoice_lock = threading.Lock()
+
+def request_invoice(chat_id, subscription_id):
+    """يرجع False إذا كانت فاتورة هذا الاشتراك قيد الإنشاء أصلاً."""
+    global _invoice_pool
+    with _invoice_lock:
+        if subscription_id in _invoice_pending:
+            return False
+        _invoice_pending.add(subscription_id)
+        if _invoice_pool is None:
+            _invoice_pool = ThreadPoolExecutor(max_workers=INVOICE_WORKERS, thread_name_prefix="invoice")
+    _invoice_pool.submit(_create_invoice, chat_id, subscription_id)
+    return True
+
+def _create_invoice(chat_id, subscription_id):
+    from models import Subscription, session_scope
+    import services
+    invoice_url = None
+    try:
+        with session_scope() as session:
+            subscription = session.get(Subscription, subscription_id)
+            if subscription is not None and subscription.status == "pending":
+                invoice_url, _ = services.get_or_create_invoice(session, subscription)
+    except Exception as e:
+        print(f"[app] invoice for subscription {subscription_id} failed: {e}")
+    finally:
+        with _invoice_lock:
+            _invoice_pending.discard(subscription_id)
+    if invoice_url:
+        send_message(chat_id, f"رابط تجديد اشتراكك:\n{invoice_url}")
+    else:
+        send_message(chat_id, "تعذر إنشاء رابط الدفع حالياً، حاول لاحقاً.")
+
+def _after_fork():
+    # خيوط المجمع وقفله لا تنتقل مع fork
+    global _invoice_pool, _invoice_lock
+    _invoice_pool = None
+    _invoice_pending.clear()
+    _invoice_lock = threading.Lock()
+
+os.register_at_fork(after_in_child=_after_fork)
+
+@app.teardown_appcontext
+def remove_session(exc=None):
+    # إذا لم يلمس أي طلب قاعدة البيانات بعد فلا داعي لتحميل models هنا
+    models = sys.modules.get("models")
+    if models is not None:
+        models.ScopedSession.remove()
+
+def expire_subscriptions(notify=EXPIRY_NOTIFY):
+    from models import session_scope
+    import services
+    # تحديث واحد على مستوى المجموعة بدلاً من تحميل كل اشتراك منتهٍ وتعديله منفرداً
+    with session_scope() as session:
+        expired, chat_ids = services.expire_subscriptions(session, collect_chat_ids=notify)
+    for chat_id in chat_ids:
+        send_message(chat_id, "⌛ انتهى اشتراكك. استخدم /subscribe للتجديد.")
+    return expired
+
+def start_background_jobs():
+    # إعداد معدلات تيليجرام الخاطئ يفشل عند البدء وليس عند أول بث
+    from telegram_client import bulk_rate
+    bulk_rate()
+    jobs.add_interval_job(expire_subscriptions, EXPIRE_INTERVAL_SECONDS, "expire_subscriptions")
+    if RENEWAL_REMINDERS_ENABLED:
+        import renewals
+        jobs.add_interval_job(renewals.run, RENEWAL_INTERVAL_SECONDS, "renewal_reminders")
+    if SIGNAL_ENGINE_ENABLED:
+        import signal_engine
+        signal_engine.schedule()
+    return jobs.start()
+
+# قيم تسمية command في المقاييس محدودة بالأوامر المعروفة حتى لا ينفجر عدد السلاسل
+COMMANDS = {"/start", "/help", "/subscribe", "/renew", "/status", "/cancel", "/advice"}
+
+def _command_label(update):
+    text = (update.get("message") or {}).get("text") or ""
+    command = text.split(maxsplit=1)[0] if text else ""
+    return command if command in COMMANDS else "other"
 
 @app.route(WEBHOOK_ROUTE, methods=["POST"])
 def telegram_webhook():
-    expire_subscriptions()
     update = request.get_json()
+    command = _command_label(update)
+    metrics.WEBHOOK_REQUESTS.inc(route="telegram", command=command)
+    with metrics.WEBHOOK_SECONDS.time(route="telegram", command=command):
+        return handle_update(update)
+
+def handle_update(update):
+    # انتهاء الاشتراكات يُعالج في مهمة مجدولة؛ هنا نكتفي بفحص end_date وقت القراءة
     if "message" in update:
         message = update["message"]
         chat_id = message["chat"]["id"]
@@ -97,10 +130,24 @@ def telegram_webhook():
         from_user = message.get("from", {})
         telegram_id = str(from_user.get("id"))
 
-        session = SessionLocal()
-        user = get_user(session, telegram_id, True, from_user)
-        sub = get_active_subscription(session, user.id)
-        session.close()
+        # المسار الشائع للمشتركين العائدين لا يلمس قاعدة البيانات
+        sub = entitlements.cache.get(telegram_id)
+        if sub is None:
+            from models import ScopedSession
+            from services import get_user, get_active_subscription_for_user
+            generation = entitlements.cache.generation(telegram_id)
+            session = ScopedSession()
+            user = get_user(session, telegram_id, True, from_user)
+            active = get_active_subscription_for_user(session, user.id)
+            if active:
+                sub = Entitlement(
+                    user_id=user.id,
+                    strategy=active.strategy,
+                    start_date=active.start_date,
+                    end_date=active.end_date,
+                    first_name=user.first_name,
+                )
+                entitlements.cache.put(telegram_id, sub, generation)
 
         if not sub:
             send_message(chat_id, "🚫 يرجى الاشتراك أولاً للدخول إلى الخدمة.\n\n"\
@@ -109,12 +156,13 @@ def telegram_webhook():
 
         # أوامر البوت
         if text == "/start":
-            send_message(chat_id, f"مرحبًا {user.first_name or ''} 👋\n"
+            send_message(chat_id, f"مرحبًا {sub.first_name or ''} 👋\n"
                                   "البوت يعمل بنجاح.\n"
                                   "استخدم /help لمعرفة الأوامر.")
         elif text == "/help":
             send_message(chat_id,
                 "/subscribe - الاشتراك في الخدمة\n"
+                "/renew - رابط تجديد الاشتراك\n"
                 "/status - حالة الاشتراك\n"
                 "/advice - تلقي توصية وتحليل\n"
                 "/cancel - إلغاء الاشتراك")
@@ -124,80 +172,84 @@ def telegram_webhook():
                 "1️⃣ اشتراك 1 بسعر 40$ (استراتيجية 1)\n"
                 "2️⃣ اشتراك 2 بسعر 70$ (استراتيجية 2)\n"
                 "يرجى زيارة الرابط للدفع (يتم إرساله من إدارة البوت تلقائيًا بعد طلب الاشتراك).")
+        elif text == "/renew":
+            # فاتورة التجديد غالباً أُنشئت مسبقاً مع تذكير renewals.py؛ وإلا تُنشأ خارج الطلب
+            from models import ScopedSession
+            import services
+            from strategies import get_strategy
+            session = ScopedSession()
+            pending = services.get_or_create_pending_subscription(
+                session, telegram_id, sub.strategy, get_strategy(sub.strategy).price_usd
+            )
+            if pending.invoice_url:
+                send_message(chat_id, f"رابط تجديد اشتراكك:\n{pending.invoice_url}")
+            else:
+                request_invoice(chat_id, pending.id)
+                send_message(chat_id, "⏳ جارٍ إنشاء رابط التجديد، سيصلك خلال لحظات.")
         elif text == "/status":
             send_message(chat_id,
                          f"حالة اشتراكك:\n"
                          f"من: {sub.start_date.strftime('%Y-%m-%d')}\n"
                          f"إلى: {sub.end_date.strftime('%Y-%m-%d')}\n"
-                         f"الحالة: {sub.status}")
+                         "الحالة: active")
         elif text == "/cancel":
-            session = SessionLocal()
-            sub = get_active_subscription(session, user.id)
+            from models import ScopedSession
+            from services import get_active_subscription_for_user
+            session = ScopedSession()
+            sub = get_active_subscription_for_user(session, sub.user_id)
             if sub:
                 sub.status = "expired"
-                session.add(sub)
                 session.commit()
                 send_message(chat_id, "تم إلغاء اشتراكك. شكرًا لك.")
             else:
                 send_message(chat_id, "ليس لديك اشتراك نشط للإلغاء.")
-            session.close()
+            entitlements.invalidate(telegram_id)
         elif text == "/advice":
-            # دمج استراتيجياتك هنا
-            send_message(chat_id, "📊 لا توجد توصيات حالياً.")
+            # من آخر نتائج محرك الإشارات المخزنة، بدون أي حساب وقت الطلب
+            import signal_engine
+            send_message(chat_id, signal_engine.format_advice(signal_engine.latest_signals(sub.strategy)))
         else:
             send_message(chat_id, "❓ أمر غير معروف، استخدم /help للمساعدة.")
     return "ok"
 
 @app.route(NOWPAYMENTS_ROUTE, methods=["POST"])
 def nowpayments_webhook():
-    signature = request.headers.get("x-nowpayments-sig")
-    if signature != NOWPAYMENTS_IPN_SECRET:
+    metrics.WEBHOOK_REQUESTS.inc(route="nowpayments", command="ipn")
+    with metrics.WEBHOOK_SECONDS.time(route="nowpayments", command="ipn"):
+        return handle_ipn()
+
+def handle_ipn():
+    from models import ScopedSession
+    import ipn
+    # التحقق من HMAC مرة واحدة على الجسم الخام قبل أي معالجة
+    data = ipn.parse_verified(request.get_data(), request.headers.get("x-nowpayments-sig", ""))
+    if data is None:
         return "Unauthorized", 401
 
-    data = request.get_json()
-
-    payment_status = data.get("payment_status")
-    order_id = data.get("order_id")
-    amount = data.get("pay_amount")
-    currency = data.get("pay_currency")
-
-    if payment_status == "finished":
-        session = SessionLocal()
-        user = get_user(session, str(order_id), create_if_not_exist=False)
-
-        if not user:
-            session.close()
-            return jsonify({"error": "User not found"}), 404
-
-        active_sub = get_active_subscription(session, user.id)
-        if active_sub and active_sub.status == "active":
-            session.close()
-            return jsonify({"message": "Subscription already active"}), 200
-
-        start_date = datetime.utcnow()
-        end_date = start_date + timedelta(days=30)
-
-        new_sub = Subscription(
-            user_id=user.id,
-            start_date=start_date,
-            end_date=end_date,
-            status="active",
-            payment_id=str(data.get("payment_id")),
-            amount=amount,
-            currency=currency
-        )
-        session.add(new_sub)
-        session.commit()
-        session.close()
-
-        send_message(int(user.telegram_id), f"✅ تم تفعيل اشتراكك بنجاح حتى {end_date.strftime('%Y-%m-%d')}\n"
-                                            f"بسم الله  !")
+    result = ipn.ingest(ScopedSession(), data)
+    if result.status == ipn.NOT_FOUND:
+        return jsonify({"error": "User not found"}), 404
+    if result.status == ipn.ALREADY_ACTIVE:
+        return jsonify({"message": "Subscription already active"}), 200
+    if result.status == ipn.PROCESSED:
+        entitlements.invalidate(result.telegram_id)
+        send_message(int(result.telegram_id), f"✅ تم تفعيل اشتراكك بنجاح حتى {result.end_date.strftime('%Y-%m-%d')}\n"
+                                              f"بسم الله  !")
     return "ok"
 
+@app.route("/stats")
+def stats():
+    return jsonify({"outbox": outbox.outbox.stats(), "entitlements": entitlements.cache.stats()})
+
+@app.route("/metrics")
+def metrics_endpoint():
+    return Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
 @app.route("/")
 def home():
     return "بوت market-signals-bot يعمل بنظام Webhook و NowPayments IPN."
 
 if __name__ == "__main__":
     print("تشغيل بوت market-signals-bot...")
+    start_background_jobs()
     app.run(host="0.0.0.0", port=PORT)
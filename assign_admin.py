@@ -1,16 +1,43 @@
-from models import SessionLocal, User
+import argparse
+import sys
 
-def assign_admin(telegram_id: str):
+from models import SessionLocal
+from reports import set_admins
+
+def assign_admins(telegram_ids, is_admin=True):
     session = SessionLocal()
-    user = session.query(User).filter_by(telegram_id=telegram_id).first()
-    if user:
-        user.is_admin = True
-        session.commit()
-        print(f"تم تعيين المستخدم {telegram_id} كأدمن.")
-    else:
+    try:
+        updated, missing = set_admins(session, telegram_ids, is_admin)
+    finally:
+        session.close()
+    action = "كأدمن" if is_admin else "كمستخدم عادي"
+    print(f"تم تعيين {updated} مستخدم {action}.")
+    for telegram_id in missing:
         print(f"المستخدم {telegram_id} غير موجود في قاعدة البيانات.")
-    session.close()
+    return updated, missing
+
+def assign_admin(telegram_id: str):
+    return assign_admins([telegram_id])
+
+def _read_ids(path):
+    # ملف بمعرف في كل سطر (أو مفصولة بفواصل)، و "-" للقراءة من stdin
+    f = sys.stdin if path == "-" else open(path)
+    try:
+        return [t for line in f for t in line.replace(",", " ").split()]
+    finally:
+        if f is not sys.stdin:
+            f.close()
 
 if __name__ == "__main__":
-    telegram_id = input("أدخل معرف تيليجرام للمستخدم الذي تريد تعيينه أدمن: ").strip()
-    assign_admin(telegram_id)
+    parser = argparse.ArgumentParser(description="تعيين (أو إلغاء) صلاحية الأدمن لعدة مستخدمين دفعة واحدة")
+    parser.add_argument("telegram_ids", nargs="*")
+    parser.add_argument("--file", help="ملف معرفات تيليجرام، أو - لـ stdin")
+    parser.add_argument("--revoke", action="store_true", help="إلغاء صلاحية الأدمن بدلاً من تعيينها")
+    args = parser.parse_args()
+
+    telegram_ids = list(args.telegram_ids)
+    if args.file:
+        telegram_ids += _read_ids(args.file)
+    if not telegram_ids:
+        telegram_ids = input("أدخل معرفات تيليجرام (مفصولة بفواصل) للمستخدمين الذين تريد تعيينهم أدمن: ").replace(",", " ").split()
+    assign_admins(telegram_ids, is_admin=not args.revoke)
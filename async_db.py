@@ -0,0 +1,69 @@
+# async_db.py
+# تشغيل استعلامات SQLAlchemy المتزامنة في مجمع خيوط مخصص حتى لا توقف حلقة asyncio في bot.py
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy.orm import sessionmaker
+
+from config import DB_EXECUTOR_WORKERS
+from models import LazySession
+import services
+
+# expire_on_commit=False: الكائنات المرجعة تبقى مقروءة بعد إغلاق الجلسة في خيط المجمع
+ExecutorSession = sessionmaker(class_=LazySession, expire_on_commit=False)
+
+_executor = None
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=DB_EXECUTOR_WORKERS, thread_name_prefix="db")
+    return _executor
+
+
+def _call(func, args, kwargs):
+    session = ExecutorSession()
+    try:
+        result = func(session, *args, **kwargs)
+        session.commit()
+        return result
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+
+async def run_db(func, *args, **kwargs):
+    """
+    await run_db(func, ...) تنفذ func(db, ...) في مجمع خيوط قاعدة البيانات بجلسة خاصة بها.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_executor(), _call, func, args, kwargs)
+
+
+def db_task(func):
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        return await run_db(func, *args, **kwargs)
+    return wrapper
+
+
+# نسخ غير متزامنة من دوال services.py (بدون وسيط db)
+get_or_create_user = db_task(services.get_or_create_user)
+get_user = db_task(services.get_user)
+create_subscription = db_task(services.create_subscription)
+get_or_create_pending_subscription = db_task(services.get_or_create_pending_subscription)
+store_invoice = db_task(services.store_invoice)
+activate_subscription = db_task(services.activate_subscription)
+get_active_subscription = db_task(services.get_active_subscription)
+get_user_strategy = db_task(services.get_user_strategy)
+
+
+def shutdown():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False)
+        _executor = None
@@ -0,0 +1,184 @@
+# backtest.py
+# اختبار تاريخي للاستراتيجيات على ملفات شموع محلية (CSV أو Parquet، ملف لكل رمز)
+# الإشارات تُحسب لكل الشموع دفعة واحدة بـ NumPy، والرموز تُوزع على مجمع عمليات
+# python backtest.py data/5m --rsi 50 55 60 --workers 8
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from config import SIGNAL_TP_PERCENTS, SIGNAL_SL_PERCENT
+from strategies import STRATEGIES, CrossAbove, Above, Strategy, evaluate_masks
+
+# الشموع الأولى تُستخدم لتسخين EMA و RSI ولا تُفتح فيها صفقات (مثل نافذة الـ 100 شمعة في check_signal)
+WARMUP_BARS = 100
+MAX_HOLD_BARS = 288  # يوم كامل على فريم 5 دقائق
+CHUNK_SIZE = 32
+
+
+def symbol_from_path(path):
+    return os.path.splitext(os.path.basename(path))[0]
+
+
+def load_candles(path):
+    """يرجع مصفوفة (n × 6) بأعمدة fetch_ohlcv: timestamp, open, high, low, close, volume."""
+    if path.endswith(".parquet"):
+        try:
+            import pandas as pd
+            df = pd.read_parquet(path)
+        except ImportError:
+            raise SystemExit("Parquet files need pandas and pyarrow: pip install -r requirements-backtest.txt")
+        return df[["timestamp", "open", "high", "low", "close", "volume"]].to_numpy(dtype=float)
+    with open(path) as f:
+        first = f.readline()
+    has_header = not first.split(",")[0].strip().lstrip("-").replace(".", "", 1).isdigit()
+    data = np.loadtxt(path, delimiter=",", skiprows=1 if has_header else 0, usecols=range(6), ndmin=2)
+    return data[np.argsort(data[:, 0], kind="stable")]
+
+
+def find_files(data_dir):
+    return sorted(
+        os.path.join(data_dir, name)
+        for name in os.listdir(data_dir)
+        if name.endswith((".csv", ".parquet"))
+    )
+
+
+def signal_masks(closes, strategies):
+    """closes: (رموز × شموع) محاذاة لليمين. يرجع {strategy: مصفوفة bool لكل شمعة}."""
+    return evaluate_masks(closes, strategies)
+
+
+def rsi_variants(thresholds):
+    # نفس شروط الاستراتيجيات الحالية مع حدود RSI مختلفة، والمؤشرات تُحسب مرة واحدة لكلها
+    return {
+        f"rsi>{t:g}": Strategy(f"rsi>{t:g}", [CrossAbove("ema9", "ema21"), Above("rsi14", t)])
+        for t in thresholds
+    }
+
+
+def simulate(candles, entries, tp_percents, sl_percent, max_hold, fee_percent):
+    """
+    صفقة مستقلة لكل إشارة بسعر إغلاق شمعة الإشارة، مقسمة بالتساوي على الأهداف مثل tps في SignalLog.
+    إذا لمست الشمعة الهدف ووقف الخسارة معاً نعتبر الوقف أولاً (افتراض متحفظ).
+    يرجع مصفوفة ربح/خسارة كل صفقة بالنسبة المئوية.
+    """
+    high, low, close = candles[:, 2], candles[:, 3], candles[:, 4]
+    n = len(close)
+    share = 1.0 / len(tp_percents)
+    pnls = np.empty(len(entries))
+    for k, i in enumerate(entries):
+        entry = close[i]
+        end = min(n, i + 1 + max_hold)
+        if end <= i + 1:
+            pnls[k] = 0.0
+            continue
+        h = high[i + 1:end]
+        l = low[i + 1:end]
+        sl_hits = np.flatnonzero(l <= entry * (1 - sl_percent / 100))
+        sl_at = sl_hits[0] if sl_hits.size else np.inf
+        timeout_pnl = (close[end - 1] / entry - 1) * 100
+        pnl = 0.0
+        for tp in tp_percents:
+            tp_hits = np.flatnonzero(h >= entry * (1 + tp / 100))
+            tp_at = tp_hits[0] if tp_hits.size else np.inf
+            if tp_at < sl_at:
+                pnl += share * tp
+            elif sl_at != np.inf:
+                pnl += share * -sl_percent
+            else:
+                pnl += share * timeout_pnl
+        pnls[k] = pnl - fee_percent
+    return pnls
+
+
+def backtest_chunk(paths, strategies, tp_percents, sl_percent, max_hold, fee_percent, warmup):
+    series = [load_candles(p) for p in paths]
+    length = max((len(c) for c in series), default=0)
+    closes = np.full((len(series), length), np.nan)
+    for row, candles in enumerate(series):
+        if len(candles):
+            closes[row, length - len(candles):] = candles[:, 4]
+    masks = signal_masks(closes, strategies)
+
+    results = {name: [] for name in strategies}
+    bars = 0
+    for row, (path, candles) in enumerate(zip(paths, series)):
+        offset = length - len(candles)
+        bars += len(candles)
+        for name, mask in masks.items():
+            entries = np.flatnonzero(mask[row, offset:])
+            entries = entries[entries >= warmup]
+            if entries.size:
+                pnls = simulate(candles, entries, tp_percents, sl_percent, max_hold, fee_percent)
+                results[name].append(pnls)
+    return {name: (np.concatenate(p) if p else np.empty(0)) for name, p in results.items()}, bars
+
+
+def summarize(pnls):
+    trades = len(pnls)
+    return {
+        "trades": trades,
+        "win_rate": round(float((pnls > 0).mean()) * 100, 2) if trades else None,
+        "total_pnl_percent": round(float(pnls.sum()), 2),
+        "avg_pnl_percent": round(float(pnls.mean()), 4) if trades else None,
+    }
+
+
+def run(data_dir, strategies=None, workers=None, tp_percents=None, sl_percent=None,
+        max_hold=MAX_HOLD_BARS, fee_percent=0.0, warmup=WARMUP_BARS, chunk_size=CHUNK_SIZE):
+    strategies = strategies or STRATEGIES
+    tp_percents = tp_percents or SIGNAL_TP_PERCENTS
+    sl_percent = SIGNAL_SL_PERCENT if sl_percent is None else sl_percent
+    paths = find_files(data_dir)
+    chunks = [paths[i:i + chunk_size] for i in range(0, len(paths), chunk_size)]
+
+    started = time.perf_counter()
+    collected = {name: [] for name in strategies}
+    bars = 0
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [
+            pool.submit(backtest_chunk, chunk, strategies, tp_percents, sl_percent, max_hold, fee_percent, warmup)
+            for chunk in chunks
+        ]
+        for future in futures:
+            chunk_results, chunk_bars = future.result()
+            bars += chunk_bars
+            for name, pnls in chunk_results.items():
+                collected[name].append(pnls)
+    elapsed = time.perf_counter() - started
+
+    return {
+        "symbols": len(paths),
+        "bars": bars,
+        "seconds": round(elapsed, 3),
+        "bars_per_second": round(bars / elapsed, 1) if elapsed > 0 else None,
+        "strategies": {
+            name: summarize(np.concatenate(p) if p else np.empty(0)) for name, p in collected.items()
+        },
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Backtest the registered strategies on local OHLCV files")
+    parser.add_argument("data_dir", help="directory with one <symbol>.csv or <symbol>.parquet per symbol")
+    parser.add_argument("--rsi", type=float, nargs="*", help="RSI thresholds to test instead of the configured strategies")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--tp", type=float, nargs="*", default=None, help="take-profit percents")
+    parser.add_argument("--sl", type=float, default=None, help="stop-loss percent")
+    parser.add_argument("--max-hold", type=int, default=MAX_HOLD_BARS)
+    parser.add_argument("--fee", type=float, default=0.0, help="round-trip fee percent per trade")
+    args = parser.parse_args(argv)
+
+    strategies = rsi_variants(args.rsi) if args.rsi else None
+    report = run(args.data_dir, strategies=strategies, workers=args.workers, tp_percents=args.tp,
+                 sl_percent=args.sl, max_hold=args.max_hold, fee_percent=args.fee)
+    print(json.dumps(report, indent=2))
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+# benchmarks/bot_load.py
+# يدفع آلاف التحديثات المتزامنة عبر Application الخاص بـ bot.py ويقيس زمن المعالجات (p50/p99)
+# python -m benchmarks.bot_load --updates 3000 --users 1000
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+from benchmarks.stubs import StubServer, TelegramStubHandler
+from benchmarks.util import percentile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def make_update(update_id, user_id, command):
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": int(datetime.utcnow().timestamp()),
+            "chat": {"id": user_id, "type": "private"},
+            "from": {"id": user_id, "is_bot": False, "first_name": "u"},
+            "text": command,
+            "entities": [{"type": "bot_command", "offset": 0, "length": len(command)}],
+        },
+    }
+
+
+async def drive(bot_module, base_url, updates, users, concurrency):
+    from telegram import Update
+    application = bot_module.build_application(token="123:TEST", base_url=f"{base_url}/bot")
+    await application.initialize()
+    timings = []
+    # مثل concurrent_updates في PTB: عدد محدود من المعالجات يعمل في نفس الوقت
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(i):
+        command = "/start" if i < users else "/status"
+        update = Update.de_json(make_update(i + 1, 100000 + i % users, command), application.bot)
+        async with semaphore:
+            started = time.perf_counter()
+            await application.process_update(update)
+            timings.append(time.perf_counter() - started)
+
+    # الدفعة الأولى تنشئ المستخدمين، ثم كل التحديثات الباقية دفعة واحدة بالتوازي
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(users)))
+    await asyncio.gather(*(one(i) for i in range(users, updates)))
+    wall = time.perf_counter() - started
+    await application.shutdown()
+    return timings, wall
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--updates", type=int, default=3000)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix="bot_load_")
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    if ROOT not in sys.path:
+        sys.path.insert(0, ROOT)
+    import bot
+    from models import init_db
+    init_db()
+
+    with StubServer(TelegramStubHandler) as server:
+        timings, wall = asyncio.run(drive(bot, server.base_url, args.updates, args.users, args.concurrency))
+    result = {
+        "benchmark": "bot_handlers",
+        "updates": args.updates,
+        "p50_ms": round(statistics.median(timings) * 1000, 3),
+        "p99_ms": round(percentile(timings, 99) * 1000, 3),
+        "updates_per_second": round(args.updates / wall, 1),
+    }
+    print(json.dumps(result))
+    return result
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+# benchmarks/broadcast_bench.py
+# يقيس معدل الرسائل في الثانية لبث إشارة لكل المشتركين عبر Telegram API وهمي محلي
+# python -m benchmarks.broadcast_bench --subscribers 2000 --rate 1000
+import argparse
+import json
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from benchmarks.stubs import StubServer, TelegramStubHandler
+from models import Base, User, Subscription, SignalLog
+from telegram_client import TelegramClient
+import broadcast
+
+
+def make_db(subscribers, strategy="strategy_one"):
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine)
+    db = Session()
+    end = datetime.utcnow() + timedelta(days=10)
+    db.execute(insert(User), [{"id": i, "telegram_id": str(100000 + i)} for i in range(1, subscribers + 1)])
+    db.execute(insert(Subscription), [
+        {"user_id": i, "strategy": strategy, "status": "active", "start_date": datetime.utcnow(), "end_date": end}
+        for i in range(1, subscribers + 1)
+    ])
+    db.commit()
+    return db
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--subscribers", type=int, default=2000)
+    parser.add_argument("--latency", type=float, default=0.01)
+    parser.add_argument("--throttle-every", type=int, default=500)
+    parser.add_argument("--rate", type=float, default=1000, help="global messages/second limit")
+    parser.add_argument("--workers", type=int, default=32)
+    args = parser.parse_args(argv)
+
+    db = make_db(args.subscribers)
+    log = SignalLog(symbol="BTC-USDT", entry_price=1.0)
+    db.add(log)
+    db.commit()
+    with StubServer(TelegramStubHandler, latency=args.latency, throttle_every=args.throttle_every,
+                    retry_after=0.1) as server:
+        client = TelegramClient(token="TEST", api_base=server.base_url, pool_size=args.workers,
+                                global_rate=args.rate, per_chat_interval=0)
+        stats = broadcast.broadcast_signal(db, log, "📈 BTC-USDT", "strategy_one", client=client, workers=args.workers)
+        delivered = server.state.get("delivered", 0)
+    db.refresh(log)
+    result = {
+        "benchmark": "broadcast",
+        "subscribers": args.subscribers,
+        "sent": stats["sent"],
+        "delivered_by_stub": delivered,
+        "sent_to_count": log.sent_to_count,
+        "seconds": round(stats["seconds"], 4),
+        "messages_per_second": round(stats["messages_per_second"], 1),
+    }
+    print(json.dumps(result))
+    db.close()
+    return result
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+# benchmarks/export_bench.py
+# يقارن تصدير الاشتراكات بـ ORM .all() مع التصدير المتدفق بترقيم keyset من reports.py:
+# الزمن وذروة الذاكرة (tracemalloc) لعدة أحجام، وعدد كتابات webhook المتزامنة التي نجحت أثناء التصدير
+# python -m benchmarks.export_bench --rows 10000 100000
+import argparse
+import csv
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def seed(rows):
+    from sqlalchemy import delete, insert
+    from models import SessionLocal, User, Subscription
+
+    now = datetime.utcnow()
+    db = SessionLocal()
+    db.execute(delete(Subscription))
+    db.execute(delete(User))
+    chunk = 50000
+    for start in range(1, rows + 1, chunk):
+        ids = range(start, min(rows, start + chunk - 1) + 1)
+        db.execute(insert(User), [{"id": i, "telegram_id": str(100000 + i), "first_name": f"user{i}"} for i in ids])
+        db.execute(insert(Subscription), [
+            {"id": i, "user_id": i, "strategy": "strategy_one" if i % 2 else "strategy_two",
+             "status": "active", "start_date": now - timedelta(days=5), "end_date": now + timedelta(days=25),
+             "payment_id": f"p{i}", "amount": 40.0, "currency": "usdt"}
+            for i in ids
+        ])
+    db.commit()
+    db.close()
+
+
+def naive_export(out):
+    # النمط القديم: كل الكائنات في الذاكرة دفعة واحدة
+    from models import SessionLocal, Subscription
+    from reports import EXPORTS
+
+    names = EXPORTS["subscriptions"][1]
+    db = SessionLocal()
+    writer = csv.writer(out)
+    writer.writerow(names)
+    subscriptions = db.query(Subscription).all()
+    for s in subscriptions:
+        writer.writerow([getattr(s, name) for name in names])
+    db.close()
+    return len(subscriptions)
+
+
+def streaming_export(out):
+    import reports
+    return reports.export("subscriptions", out, fmt="csv")
+
+
+def measure(func):
+    with open(os.devnull, "w") as out:
+        tracemalloc.start()
+        started = time.perf_counter()
+        count = func(out)
+        elapsed = time.perf_counter() - started
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return {"rows": count, "seconds": round(elapsed, 3), "peak_mb": round(peak / 2 ** 20, 2),
+            "rows_per_second": round(count / elapsed)}
+
+
+def writes_during(func):
+    # كاتب يحاكي webhook: تحديث صغير ومعاملة قصيرة بشكل متكرر طوال التصدير
+    from sqlalchemy import update
+    from models import SessionLocal, User
+
+    stop = threading.Event()
+    counts = {"ok": 0, "failed": 0}
+
+    def writer():
+        db = SessionLocal()
+        while not stop.is_set():
+            try:
+                db.execute(update(User).where(User.id == 1).values(last_name=str(time.time())))
+                db.commit()
+                counts["ok"] += 1
+            except Exception:
+                db.rollback()
+                counts["failed"] += 1
+            time.sleep(0.001)
+        db.close()
+
+    thread = threading.Thread(target=writer)
+    thread.start()
+    try:
+        with open(os.devnull, "w") as out:
+            func(out)
+    finally:
+        stop.set()
+        thread.join()
+    return counts
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, nargs="+", default=[10000, 100000])
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix="export_bench_")
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    os.environ.pop("REPORTS_DATABASE_URL", None)
+    if ROOT not in sys.path:
+        sys.path.insert(0, ROOT)
+    from models import init_db
+    init_db()
+
+    levels = []
+    for rows in args.rows:
+        seed(rows)
+        levels.append({
+            "rows": rows,
+            "naive": measure(naive_export),
+            "streaming": measure(streaming_export),
+            "writes_during_streaming": writes_during(streaming_export),
+        })
+    result = {"benchmark": "export", "levels": levels}
+    print(json.dumps(result))
+    return result
+
+
+if __name__ == "__main__":
+    main()
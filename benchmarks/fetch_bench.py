@@ -0,0 +1,66 @@
+# benchmarks/fetch_bench.py
+# يقارن زمن جلب شموع كل الرموز تسلسلياً مقابل okx_async مع زمن استجابة و 429 محقونين
+# python -m benchmarks.fetch_bench --symbols 300 --latency 0.05 --throttle-every 25
+import argparse
+import asyncio
+import json
+import time
+
+import requests
+
+from benchmarks.stubs import StubServer, OKXStubHandler
+from okx_async import AsyncOHLCVFetcher, CANDLES_PATH, parse_candles
+
+
+def sequential(base_url, symbols):
+    session = requests.Session()
+    started = time.perf_counter()
+    for symbol in symbols:
+        while True:
+            resp = session.get(base_url + CANDLES_PATH, params={"instId": symbol, "bar": "5m", "limit": "100"}, timeout=10)
+            if resp.status_code == 429:
+                time.sleep(float(resp.headers.get("Retry-After", "0.05")))
+                continue
+            parse_candles(resp.json()["data"])
+            break
+    return time.perf_counter() - started
+
+
+async def concurrent(base_url, symbols, concurrency, rate, burst):
+    async with AsyncOHLCVFetcher(base_url=base_url, concurrency=concurrency, rate=rate, burst=burst) as fetcher:
+        results = await fetcher.fetch_many(symbols, "5m", 100)
+        assert all(results.values()), "missing candles"
+        return fetcher.last_scan_seconds, fetcher.requests, fetcher.throttled
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--symbols", type=int, default=300)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--throttle-every", type=int, default=25)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--rate", type=float, default=1000)
+    parser.add_argument("--burst", type=int, default=100)
+    args = parser.parse_args(argv)
+
+    symbols = [f"SYM{i}-USDT" for i in range(args.symbols)]
+    with StubServer(OKXStubHandler, latency=args.latency, throttle_every=args.throttle_every) as server:
+        seq_seconds = sequential(server.base_url, symbols)
+        async_seconds, sent, throttled = asyncio.run(
+            concurrent(server.base_url, symbols, args.concurrency, args.rate, args.burst)
+        )
+    result = {
+        "benchmark": "ohlcv_fetch",
+        "symbols": args.symbols,
+        "sequential_seconds": round(seq_seconds, 4),
+        "async_seconds": round(async_seconds, 4),
+        "speedup": round(seq_seconds / async_seconds, 2),
+        "async_requests": sent,
+        "async_throttled": throttled,
+    }
+    print(json.dumps(result))
+    return result
+
+
+if __name__ == "__main__":
+    main()
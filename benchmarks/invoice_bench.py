@@ -0,0 +1,73 @@
+# benchmarks/invoice_bench.py
+# يقيس إنشاء الفواتير عبر عميل NowPayments الموحد مقابل خادم وهمي يحقن زمن استجابة و 503/429،
+# ويتأكد أن تكرار /subscribe لنفس المستخدم لا ينشئ فاتورة جديدة
+# python -m benchmarks.invoice_bench --users 200 --repeats 5
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+
+from benchmarks.stubs import StubServer, NowPaymentsStubHandler
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--latency", type=float, default=0.02)
+    parser.add_argument("--fail-every", type=int, default=10)
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix="invoice_bench_")
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    if ROOT not in sys.path:
+        sys.path.insert(0, ROOT)
+    from models import init_db, session_scope
+    from nowpayments import NowPaymentsClient, AsyncNowPaymentsClient
+    import services
+    init_db()
+
+    with StubServer(NowPaymentsStubHandler, latency=args.latency, fail_every=args.fail_every) as server:
+        client = NowPaymentsClient(api_base=server.base_url)
+        started = time.perf_counter()
+        urls = set()
+        for repeat in range(args.repeats):
+            for i in range(args.users):
+                with session_scope() as db:
+                    sub = services.get_or_create_pending_subscription(db, str(9000 + i), "strategy_one", 40)
+                    url, _ = services.get_or_create_invoice(db, sub, client=client)
+                    urls.add(url)
+        sync_seconds = time.perf_counter() - started
+        api_calls = server.requests
+
+        async def burst():
+            async_client = AsyncNowPaymentsClient(api_base=server.base_url)
+            try:
+                began = time.perf_counter()
+                results = await asyncio.gather(*(async_client.create_invoice(i, 40) for i in range(args.users)))
+                return time.perf_counter() - began, sum(1 for url, _ in results if url)
+            finally:
+                await async_client.aclose()
+
+        async_seconds, async_ok = asyncio.run(burst())
+
+    result = {
+        "benchmark": "invoices",
+        "subscribe_taps": args.users * args.repeats,
+        "distinct_invoices": len(urls - {None}),
+        "api_calls_incl_retries": api_calls,
+        "sync_seconds": round(sync_seconds, 3),
+        "async_invoices": async_ok,
+        "async_seconds": round(async_seconds, 3),
+    }
+    print(json.dumps(result))
+    return result
+
+
+if __name__ == "__main__":
+    main()
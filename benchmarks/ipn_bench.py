@@ -0,0 +1,93 @@
+# benchmarks/ipn_bench.py
+# يعيد إرسال نفس IPN ألف مرة (تسلسلياً وبالتوازي) ويتأكد أن التكلفة تقارب معالجة IPN واحد
+# python -m benchmarks.ipn_bench --duplicates 1000
+import argparse
+import hashlib
+import hmac
+import json
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SECRET = "bench-secret"
+
+
+def signed(payload):
+    body = json.dumps(payload).encode("utf-8")
+    signature = hmac.new(SECRET.encode("utf-8"), body, hashlib.sha512).hexdigest()
+    return body, {"x-nowpayments-sig": signature, "Content-Type": "application/json"}
+
+
+def load_app(workdir):
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    os.environ["NOWPAYMENTS_IPN_SECRET"] = SECRET
+    os.environ.setdefault("TELEGRAM_API_BASE", "http://127.0.0.1:9")
+    if ROOT not in sys.path:
+        sys.path.insert(0, ROOT)
+    import app
+    from models import init_db
+    init_db()
+    return app
+
+
+def post(app, body, headers):
+    with app.app.test_client() as client:
+        return client.post(app.NOWPAYMENTS_ROUTE, data=body, headers=headers).status_code
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--duplicates", type=int, default=1000)
+    parser.add_argument("--threads", type=int, default=16)
+    args = parser.parse_args(argv)
+
+    app = load_app(tempfile.mkdtemp(prefix="ipn_bench_"))
+    # لا نرسل رسائل تيليجرام فعلية أثناء القياس
+    app.send_message = lambda chat_id, text: None
+    from models import session_scope, User, Subscription
+    with session_scope() as db:
+        db.add_all([User(telegram_id="1001"), User(telegram_id="1002")])
+
+    def payload(user, payment_id):
+        return {"payment_id": payment_id, "payment_status": "finished", "order_id": user,
+                "pay_amount": 40, "pay_currency": "usdt"}
+
+    # IPN واحد جديد
+    body, headers = signed(payload("1001", 1))
+    started = time.perf_counter()
+    assert post(app, body, headers) == 200
+    first_ms = (time.perf_counter() - started) * 1000
+
+    # نفس IPN يُعاد تسلسلياً
+    started = time.perf_counter()
+    for _ in range(args.duplicates):
+        post(app, body, headers)
+    sequential_ms = (time.perf_counter() - started) * 1000
+
+    # IPN جديد يصل مكرراً بالتوازي (سباق على الفهرس الفريد)
+    body, headers = signed(payload("1002", 2))
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.threads) as pool:
+        statuses = list(pool.map(lambda _: post(app, body, headers), range(args.duplicates)))
+    concurrent_ms = (time.perf_counter() - started) * 1000
+
+    with session_scope() as db:
+        subscriptions = db.query(Subscription).count()
+    result = {
+        "benchmark": "ipn_replay",
+        "duplicates": args.duplicates,
+        "first_ms": round(first_ms, 3),
+        "duplicate_avg_ms": round(sequential_ms / args.duplicates, 3),
+        "concurrent_total_ms": round(concurrent_ms, 1),
+        "non_200": sum(1 for s in statuses if s != 200),
+        "subscriptions_created": subscriptions,
+    }
+    print(json.dumps(result))
+    return result
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+# benchmarks/renewals_bench.py
+# يقيس دورة تذكيرات التجديد على جدول كبير: اشتراكات تنتهي على مدى 30 يوماً، فلا يقع في نوافذ التذكير
+# إلا جزء صغير منها. يطبع زمن الدورة الأولى (إرسال + فواتير عبر خوادم وهمية) والثانية (لا شيء لإرساله)،
+# وعدد الرسائل التي وصلت فعلاً (يجب أن يساوي عدد المرشحين: تذكير واحد فقط لكل نافذة)، وخطة استعلام الاختيار
+# python -m benchmarks.renewals_bench --subscribers 100000
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from benchmarks.stubs import StubServer, TelegramStubHandler, NowPaymentsStubHandler
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def seed(subscribers, now):
+    from sqlalchemy import insert
+    from models import SessionLocal, User, Subscription
+
+    db = SessionLocal()
+    chunk = 50000
+    minutes = 30 * 24 * 60
+    for start in range(1, subscribers + 1, chunk):
+        ids = range(start, min(subscribers, start + chunk - 1) + 1)
+        db.execute(insert(User), [{"id": i, "telegram_id": str(100000 + i)} for i in ids])
+        db.execute(insert(Subscription), [
+            {"user_id": i, "strategy": "strategy_one" if i % 2 else "strategy_two", "status": "active",
+             "start_date": now - timedelta(days=5),
+             # end_date موزعة بالتساوي على الثلاثين يوماً القادمة
+             "end_date": now + timedelta(minutes=(i * 7919) % minutes + 1)}
+            for i in ids
+        ])
+    db.commit()
+    db.close()
+
+
+def query_plan(now):
+    from sqlalchemy import text
+    from sqlalchemy.dialects import sqlite
+    from models import SessionLocal
+    import renewals
+
+    # نفس استعلام due() بقيم ثابتة لعرض الخطة
+    captured = []
+
+    class Capture:
+        def execute(self, statement):
+            captured.append(statement)
+            return []
+
+    renewals.due(Capture(), "3d", now, now + timedelta(days=3))
+    sql = str(captured[0].compile(dialect=sqlite.dialect(), compile_kwargs={"literal_binds": True}))
+    db = SessionLocal()
+    plan = [row[-1] for row in db.execute(text(f"EXPLAIN QUERY PLAN {sql}"))]
+    db.close()
+    return plan
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--subscribers", type=int, default=100000)
+    parser.add_argument("--latency", type=float, default=0.005)
+    parser.add_argument("--workers", type=int, default=32)
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix="renewals_bench_")
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    os.environ.setdefault("METRICS_ENABLED", "0")
+    if ROOT not in sys.path:
+        sys.path.insert(0, ROOT)
+    from models import init_db, SessionLocal
+    from nowpayments import NowPaymentsClient
+    from telegram_client import TelegramClient
+    import renewals
+    import services
+
+    init_db()
+    now = datetime.utcnow()
+    seed(args.subscribers, now)
+
+    with StubServer(TelegramStubHandler, latency=args.latency) as telegram, \
+            StubServer(NowPaymentsStubHandler, latency=args.latency) as payments:
+        telegram_client = TelegramClient(token="TEST", api_base=telegram.base_url, pool_size=args.workers,
+                                         global_rate=1000000, per_chat_interval=0)
+        payments_client = NowPaymentsClient(api_base=payments.base_url, pool_size=args.workers)
+        # حد الفواتير الافتراضي محافظ لـ NowPayments الحقيقي؛ الخادم الوهمي لا يحتاجه
+        renewals.RENEWAL_INVOICE_RATE = 1000000
+
+        started = time.perf_counter()
+        first = renewals.run(now=now, telegram=telegram_client, payments=payments_client, workers=args.workers)
+        first_seconds = time.perf_counter() - started
+        started = time.perf_counter()
+        second = renewals.run(now=now, telegram=telegram_client, payments=payments_client, workers=args.workers)
+        second_seconds = time.perf_counter() - started
+        delivered = telegram.state.get("delivered", 0)
+        invoice_requests = payments.requests
+
+    db = SessionLocal()
+    started = time.perf_counter()
+    services.expire_subscriptions(db)
+    expire_noop = time.perf_counter() - started
+    db.close()
+
+    selected = sum(s["selected"] for s in first.values())
+    result = {
+        "benchmark": "renewals",
+        "subscribers": args.subscribers,
+        "first_run": {"seconds": round(first_seconds, 3), "windows": first},
+        "second_run": {"seconds": round(second_seconds, 3), "windows": second},
+        "delivered": delivered,
+        "invoice_requests": invoice_requests,
+        "exactly_once": delivered == selected and not any(s["selected"] for s in second.values()),
+        "expire_noop_seconds": round(expire_noop, 4),
+        "query_plan": query_plan(now),
+    }
+    print(json.dumps(result, ensure_ascii=False))
+    return result
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+# benchmarks/startup_bench.py
+# يقيس زمن استيراد كل نقطة دخول في عملية Python جديدة (بارد، بدون كاش الوحدات)،
+# وزمن أول طلب webhook بعد الاستيراد لأن طبقة قاعدة البيانات تُحمّل عنده
+# python -m benchmarks.startup_bench --runs 5
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+ENTRY_POINTS = ["app", "wsgi", "bot", "signal_engine", "backtest", "manage"]
+# أرضية المقارنة: استيراد flask وحده هو الحد الأدنى الممكن لـ app على نفس الجهاز
+FLOOR = "flask"
+TARGET_MS = {"app": 200, "wsgi": 200}
+
+IMPORT_SNIPPET = """
+import time
+started = time.perf_counter()
+import {module}
+print((time.perf_counter() - started) * 1000)
+"""
+
+FIRST_REQUEST_SNIPPET = """
+import time
+import app
+started = time.perf_counter()
+client = app.app.test_client()
+client.post(app.WEBHOOK_ROUTE, json={"message": {"chat": {"id": 1}, "from": {"id": 1}, "text": "/status"}})
+print((time.perf_counter() - started) * 1000)
+"""
+
+
+def measure(snippet, env):
+    proc = subprocess.run([sys.executable, "-c", snippet], cwd=ROOT, env=env, capture_output=True, text=True)
+    if proc.returncode != 0:
+        return None, proc.stderr.strip().splitlines()[-1] if proc.stderr else "failed"
+    return float(proc.stdout.strip().splitlines()[-1]), None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--modules", nargs="*", default=ENTRY_POINTS)
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix="startup_bench_")
+    env = dict(os.environ, DATABASE_URL=f"sqlite:///{os.path.join(workdir, 'bench.db')}",
+               TELEGRAM_API_BASE="http://127.0.0.1:9", METRICS_ENABLED="0")
+    subprocess.run([sys.executable, "manage.py", "init-db"], cwd=ROOT, env=env, check=True, capture_output=True)
+
+    results = {}
+    for module in [FLOOR, *args.modules]:
+        timings, error = [], None
+        for _ in range(args.runs):
+            value, error = measure(IMPORT_SNIPPET.format(module=module), env)
+            if value is None:
+                break
+            timings.append(value)
+        if not timings:
+            results[module] = {"error": error}
+            continue
+        entry = {"import_ms_median": round(statistics.median(timings), 1), "import_ms_min": round(min(timings), 1)}
+        if module in TARGET_MS:
+            entry["target_ms"] = TARGET_MS[module]
+            entry["within_target"] = entry["import_ms_median"] <= TARGET_MS[module]
+        results[module] = entry
+
+    first = [measure(FIRST_REQUEST_SNIPPET, env)[0] for _ in range(args.runs)]
+    first = [t for t in first if t is not None]
+    result = {
+        "benchmark": "startup",
+        "runs": args.runs,
+        "entry_points": results,
+        "webhook_first_request_ms": round(statistics.median(first), 1) if first else None,
+    }
+    print(json.dumps(result))
+    return result
+
+
+if __name__ == "__main__":
+    main()
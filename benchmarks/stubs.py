@@ -0,0 +1,165 @@
+# benchmarks/stubs.py
+# خوادم محلية وهمية للبورصة وغيرها حتى تعمل القياسات بدون إنترنت
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+
+class StubServer:
+    """
+    يشغّل ThreadingHTTPServer على منفذ عشوائي في خيط خلفي.
+    with StubServer(Handler) as server: server.base_url ...
+    """
+
+    def __init__(self, handler_cls, **state):
+        self.handler_cls = handler_cls
+        self.state = dict(state)
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._httpd = None
+        self._thread = None
+
+    def next_request(self):
+        with self._lock:
+            self.requests += 1
+            return self.requests
+
+    @property
+    def base_url(self):
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def __enter__(self):
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", 0), self.handler_cls)
+        self._httpd.daemon_threads = True
+        self._httpd.request_queue_size = 1024
+        self._httpd.stub = self
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    @property
+    def stub(self):
+        return self.server.stub
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status, payload, headers=None):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length) if length else b""
+        if not raw:
+            return {}
+        if "application/x-www-form-urlencoded" in (self.headers.get("Content-Type") or ""):
+            # python-telegram-bot يرسل المعاملات كنموذج وليس JSON
+            return {k: v[0] for k, v in parse_qs(raw.decode("utf-8")).items()}
+        return json.loads(raw)
+
+
+def synthetic_candles(symbol, limit, end_ts=None, period_ms=300000):
+    # شموع حتمية لكل رمز: موجة بسيطة حول سعر أساسي مشتق من اسم الرمز
+    end_ts = end_ts if end_ts is not None else int(time.time() // 300) * period_ms
+    base = 10 + (sum(map(ord, symbol)) % 500)
+    rows = []
+    for i in range(limit):
+        ts = end_ts - i * period_ms
+        price = base * (1 + 0.01 * ((ts // period_ms) % 17 - 8) / 8)
+        rows.append([str(ts), str(price), str(price * 1.002), str(price * 0.998), str(price), "100", "0", "0", "1"])
+    return rows
+
+
+class OKXStubHandler(StubHandler):
+    """
+    يحاكي GET /api/v5/market/candles. الحالة: latency بالثواني، و throttle_every لإرجاع 429 كل N طلب.
+    """
+
+    def do_GET(self):
+        n = self.stub.next_request()
+        state = self.stub.state
+        time.sleep(state.get("latency", 0.0))
+        every = state.get("throttle_every")
+        if every and n % every == 0:
+            self.send_json(429, {"code": "50011", "msg": "Too Many Requests"}, {"Retry-After": "0.05"})
+            return
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        symbol = query.get("instId", ["X"])[0]
+        limit = int(query.get("limit", ["100"])[0])
+        self.send_json(200, {"code": "0", "msg": "", "data": synthetic_candles(symbol, limit)})
+
+
+class TelegramStubHandler(StubHandler):
+    """
+    يحاكي POST /bot<token>/sendMessage. الحالة: latency، و throttle_every لإرجاع 429 مع retry_after.
+    الرسائل المستلمة تُعد في state["delivered"].
+    """
+
+    def do_POST(self):
+        n = self.stub.next_request()
+        state = self.stub.state
+        payload = self.read_json()
+        if self.path.endswith("/getMe"):
+            self.send_json(200, {"ok": True, "result": {"id": 1, "is_bot": True, "first_name": "stub", "username": "stub_bot"}})
+            return
+        time.sleep(state.get("latency", 0.0))
+        every = state.get("throttle_every")
+        if every and n % every == 0:
+            retry_after = state.get("retry_after", 1)
+            self.send_json(429, {"ok": False, "error_code": 429,
+                                 "description": f"Too Many Requests: retry after {retry_after}",
+                                 "parameters": {"retry_after": retry_after}})
+            return
+        with self.stub._lock:
+            state["delivered"] = state.get("delivered", 0) + 1
+        self.send_json(200, {"ok": True, "result": {
+            "message_id": n,
+            "date": int(time.time()),
+            "chat": {"id": payload.get("chat_id"), "type": "private"},
+            "text": payload.get("text"),
+        }})
+
+
+class NowPaymentsStubHandler(StubHandler):
+    """
+    يحاكي POST /v1/invoice. الحالة: latency، و fail_every لإرجاع 503 كل N طلب، و throttle_every لإرجاع 429.
+    """
+
+    def do_POST(self):
+        n = self.stub.next_request()
+        state = self.stub.state
+        payload = self.read_json()
+        time.sleep(state.get("latency", 0.0))
+        if state.get("fail_every") and n % state["fail_every"] == 0:
+            self.send_json(503, {"message": "Service Unavailable"})
+            return
+        if state.get("throttle_every") and n % state["throttle_every"] == 0:
+            self.send_json(429, {"message": "Too Many Requests"}, {"Retry-After": "0.05"})
+            return
+        invoice_id = str(5000000 + n)
+        self.send_json(200, {
+            "id": invoice_id,
+            "order_id": payload.get("order_id"),
+            "price_amount": payload.get("price_amount"),
+            "invoice_url": f"https://nowpayments.io/payment/?iid={invoice_id}",
+        })
@@ -0,0 +1,345 @@
+# benchmarks/suite.py
+# مجموعة قياسات موحدة للمسارات الساخنة تعمل بدون إنترنت (خوادم وهمية لتيليجرام و OKX، وقاعدة SQLite مؤقتة)
+# كل حالة تعمل في عملية منفصلة حتى لا تتشارك الإعدادات والكاش، والنتيجة JSON قابلة للمقارنة بخط أساس:
+#   python -m benchmarks.suite --save benchmarks/baseline.json
+#   python -m benchmarks.suite --baseline benchmarks/baseline.json --threshold 10
+# يرجع رمز خروج 1 إذا ساء أي مقياس أداء عن خط الأساس بأكثر من threshold٪ (مقاييس COUNT للعرض فقط)
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HIGHER = "higher"
+LOWER = "lower"
+# أعداد تصف حجم الحالة (صفوف منتهية، رسائل مرسلة) وليست أداءً: تُعرض في المقارنة ولا تُعد تراجعاً
+COUNT = "count"
+
+
+def _metric(value, better, unit):
+    return {"value": round(value, 6), "better": better, "unit": unit}
+
+
+def _temp_database():
+    workdir = tempfile.mkdtemp(prefix="bench_suite_")
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    os.environ["METRICS_ENABLED"] = os.environ.get("METRICS_ENABLED", "0")
+    if ROOT not in sys.path:
+        sys.path.insert(0, ROOT)
+    return workdir
+
+
+# الحالات: كل دالة ترجع {اسم المقياس: _metric(...)}
+
+def case_webhook(users, requests_count):
+    from benchmarks.stubs import StubServer, TelegramStubHandler
+    from benchmarks.webhook_bench import load_app, seed, run
+
+    workdir = _temp_database()
+    with StubServer(TelegramStubHandler) as server:
+        os.environ["TELEGRAM_API_BASE"] = server.base_url
+        os.environ.setdefault("TELEGRAM_TOKEN", "TEST")
+        app = load_app(workdir)
+        seed(app, users)
+        client = app.app.test_client()
+        # تمريرة تسخين أولى تملأ كاش الصلاحيات كما في الخادم الفعلي بعد دقائق من التشغيل
+        cold = run(app, client, users, requests_count, inline_expire=False)
+        warm = run(app, client, users, requests_count, inline_expire=False)
+        app.outbox.outbox.join()
+    return {
+        "webhook.cold_requests_per_second": _metric(cold["requests_per_second"], HIGHER, "req/s"),
+        "webhook.requests_per_second": _metric(warm["requests_per_second"], HIGHER, "req/s"),
+        "webhook.p99_ms": _metric(warm["p99_ms"], LOWER, "ms"),
+    }
+
+
+def case_expire(rows):
+    _temp_database()
+    from sqlalchemy import insert
+    from models import SessionLocal, User, Subscription, init_db
+    import services
+
+    init_db()
+    now = datetime.utcnow()
+    db = SessionLocal()
+    chunk = 50000
+    for start in range(1, rows + 1, chunk):
+        ids = range(start, min(rows, start + chunk - 1) + 1)
+        db.execute(insert(User), [{"id": i, "telegram_id": str(100000 + i)} for i in ids])
+        db.execute(insert(Subscription), [
+            {
+                "user_id": i,
+                "status": "active" if i % 3 else "expired",
+                "start_date": now - timedelta(days=40),
+                # 10٪ من الاشتراكات انتهى تاريخها وما زالت active
+                "end_date": now - timedelta(hours=1) if i % 10 == 0 else now + timedelta(days=20),
+            }
+            for i in ids
+        ])
+    db.commit()
+
+    started = time.perf_counter()
+    expired, _ = services.expire_subscriptions(db)
+    first = time.perf_counter() - started
+    # الحالة الأكثر تكراراً: المهمة الدورية لا تجد شيئاً لتحديثه
+    started = time.perf_counter()
+    services.expire_subscriptions(db)
+    noop = time.perf_counter() - started
+    db.close()
+    return {
+        f"expire.{rows}.seconds": _metric(first, LOWER, "s"),
+        f"expire.{rows}.noop_seconds": _metric(noop, LOWER, "s"),
+        f"expire.{rows}.expired": _metric(expired, COUNT, "rows"),
+    }
+
+
+def case_check_signal(symbols, rounds):
+    _temp_database()
+    from benchmarks.stubs import synthetic_candles
+    from okx_async import parse_candles
+    import candle_cache
+    import strategy_one
+
+    period = 300
+    clock = [float(int(time.time() // period) * period + 1)]
+
+    def fetch(symbol, timeframe, limit):
+        # مصدر OHLCV محلي: آخر شمعة هي الشمعة المفتوحة حالياً حسب الساعة الوهمية
+        end_ts = int(clock[0] // period) * period * 1000
+        return parse_candles(synthetic_candles(symbol, limit, end_ts=end_ts))
+
+    candle_cache.cache = candle_cache.CandleCache(fetch, clock=lambda: clock[0])
+    names = [f"SYM{i}-USDT" for i in range(symbols)]
+
+    started = time.perf_counter()
+    for name in names:
+        strategy_one.check_signal(name)
+    cold = (time.perf_counter() - started) / symbols
+
+    steady = []
+    for _ in range(rounds):
+        # شمعة جديدة لكل رمز: جلب تزايدي + تحديث المؤشرات بخطوة واحدة
+        clock[0] += period
+        started = time.perf_counter()
+        for name in names:
+            strategy_one.check_signal(name)
+        steady.append((time.perf_counter() - started) / symbols)
+    return {
+        "check_signal.cold_us_per_symbol": _metric(cold * 1e6, LOWER, "us"),
+        "check_signal.us_per_symbol": _metric(min(steady) * 1e6, LOWER, "us"),
+    }
+
+
+def case_scan(symbols):
+    _temp_database()
+    from benchmarks.stubs import StubServer, OKXStubHandler
+    from okx_async import AsyncOHLCVFetcher
+    import scanner
+
+    names = [f"SYM{i}-USDT" for i in range(symbols)]
+
+    async def fetch(base_url):
+        async with AsyncOHLCVFetcher(base_url=base_url, concurrency=50, rate=100000, burst=100000) as fetcher:
+            return await fetcher.fetch_many(names, scanner.TIMEFRAME, scanner.LIMIT)
+
+    with StubServer(OKXStubHandler) as server:
+        started = time.perf_counter()
+        candles = asyncio.run(fetch(server.base_url))
+        fetched = time.perf_counter() - started
+    evaluated = []
+    for _ in range(5):
+        # التقييم يستغرق ميلي ثوانٍ فقط، فنأخذ أفضل تكرار لتقليل الضجيج
+        started = time.perf_counter()
+        scanner.scan_candles(candles)
+        evaluated.append(time.perf_counter() - started)
+    evaluated = min(evaluated)
+    return {
+        "scan.fetch_seconds": _metric(fetched, LOWER, "s"),
+        "scan.evaluate_seconds": _metric(evaluated, LOWER, "s"),
+        "scan.total_seconds": _metric(fetched + evaluated, LOWER, "s"),
+    }
+
+
+def case_broadcast(subscribers, workers):
+    _temp_database()
+    from benchmarks.broadcast_bench import make_db
+    from benchmarks.stubs import StubServer, TelegramStubHandler
+    from models import SignalLog
+    from telegram_client import TelegramClient
+    import broadcast
+
+    db = make_db(subscribers)
+    log = SignalLog(symbol="BTC-USDT", entry_price=1.0)
+    db.add(log)
+    db.commit()
+    with StubServer(TelegramStubHandler) as server:
+        client = TelegramClient(token="TEST", api_base=server.base_url, pool_size=workers,
+                                global_rate=1000000, per_chat_interval=0)
+        stats = broadcast.broadcast_signal(db, log, "📈 BTC-USDT", "strategy_one", client=client, workers=workers)
+    db.close()
+    return {
+        "broadcast.messages_per_second": _metric(stats["messages_per_second"], HIGHER, "msg/s"),
+        "broadcast.sent": _metric(stats["sent"], COUNT, "msgs"),
+    }
+
+
+def case_renewals(subscribers):
+    _temp_database()
+    from benchmarks.renewals_bench import seed
+    from benchmarks.stubs import StubServer, TelegramStubHandler, NowPaymentsStubHandler
+    from models import init_db
+    from nowpayments import NowPaymentsClient
+    from telegram_client import TelegramClient
+    import renewals
+
+    init_db()
+    now = datetime.utcnow()
+    seed(subscribers, now)
+    renewals.RENEWAL_INVOICE_RATE = 1000000
+    with StubServer(TelegramStubHandler) as telegram, StubServer(NowPaymentsStubHandler) as payments:
+        clients = {
+            "telegram": TelegramClient(token="TEST", api_base=telegram.base_url, pool_size=32,
+                                       global_rate=1000000, per_chat_interval=0),
+            "payments": NowPaymentsClient(api_base=payments.base_url, pool_size=32),
+        }
+        started = time.perf_counter()
+        first = renewals.run(now=now, workers=32, **clients)
+        sent_seconds = time.perf_counter() - started
+        # الدورات التالية هي الأكثر تكراراً: لا شيء جديد في النوافذ
+        started = time.perf_counter()
+        renewals.run(now=now, workers=32, **clients)
+        idle_seconds = time.perf_counter() - started
+    sent = sum(w["sent"] for w in first.values())
+    return {
+        f"renewals.{subscribers}.reminders_per_second": _metric(sent / sent_seconds, HIGHER, "msg/s"),
+        f"renewals.{subscribers}.idle_seconds": _metric(idle_seconds, LOWER, "s"),
+    }
+
+
+CASES = {
+    "webhook": case_webhook,
+    "expire": case_expire,
+    "check_signal": case_check_signal,
+    "scan": case_scan,
+    "broadcast": case_broadcast,
+    "renewals": case_renewals,
+}
+
+
+def plan(args):
+    """قائمة (اسم الحالة، معاملاتها) حسب خيارات سطر الأوامر."""
+    steps = [
+        ("webhook", {"users": args.users, "requests_count": args.requests}),
+        *[("expire", {"rows": rows}) for rows in args.expire_rows],
+        ("check_signal", {"symbols": args.symbols, "rounds": 3}),
+        ("scan", {"symbols": args.symbols}),
+        ("broadcast", {"subscribers": args.subscribers, "workers": 32}),
+        ("renewals", {"subscribers": args.renewal_subscribers}),
+    ]
+    return [(name, params) for name, params in steps if not args.only or name in args.only]
+
+
+def run_case_subprocess(name, params):
+    cmd = [sys.executable, "-m", "benchmarks.suite", "--case", name, "--params", json.dumps(params)]
+    proc = subprocess.run(cmd, cwd=ROOT, capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(f"case {name} {params} failed:\n{proc.stderr[-2000:]}")
+    # آخر سطر هو النتيجة؛ ما قبله مخرجات تشخيصية من الوحدات
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def best(values, better):
+    if better == COUNT:
+        return values[-1]
+    return max(values) if better == HIGHER else min(values)
+
+
+def run_suite(args):
+    results = {}
+    for name, params in plan(args):
+        runs = [run_case_subprocess(name, params) for _ in range(args.repeat)]
+        for metric, first in runs[0].items():
+            values = [r[metric]["value"] for r in runs]
+            results[metric] = dict(first, value=best(values, first["better"]))
+        print(f"[suite] {name} {params} done", file=sys.stderr)
+    return results
+
+
+def compare(results, baseline, threshold):
+    """يرجع قائمة بكل مقياس مشترك مع نسبة التغير، و regression=True إذا ساء بأكثر من threshold٪."""
+    rows = []
+    for metric, current in sorted(results.items()):
+        previous = baseline.get(metric)
+        if previous is None or not previous["value"]:
+            continue
+        change = (current["value"] - previous["value"]) / previous["value"] * 100
+        worse = -change if current["better"] == HIGHER else change
+        rows.append({
+            "metric": metric,
+            "baseline": previous["value"],
+            "current": current["value"],
+            "change_percent": round(change, 2),
+            "regression": current["better"] != COUNT and worse > threshold,
+        })
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline benchmark suite for the webhook, DB, strategy and broadcast hot paths")
+    parser.add_argument("--only", nargs="*", choices=sorted(CASES), help="run only these cases")
+    parser.add_argument("--users", type=int, default=5000)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--expire-rows", type=int, nargs="*", default=[10000, 100000, 1000000])
+    parser.add_argument("--symbols", type=int, default=300)
+    parser.add_argument("--subscribers", type=int, default=2000)
+    parser.add_argument("--renewal-subscribers", type=int, default=100000)
+    parser.add_argument("--repeat", type=int, default=1, help="run each case N times and keep the best value")
+    parser.add_argument("--quick", action="store_true", help="smaller sizes (no 1M-row expire run)")
+    parser.add_argument("--baseline", help="baseline JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=10.0, help="allowed slowdown in percent")
+    parser.add_argument("--save", help="write the results JSON here (e.g. to record a new baseline)")
+    parser.add_argument("--case", help=argparse.SUPPRESS)
+    parser.add_argument("--params", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.case:
+        # داخل العملية الفرعية: حالة واحدة فقط
+        print(json.dumps(CASES[args.case](**json.loads(args.params or "{}"))))
+        return 0
+
+    if args.quick:
+        args.users, args.requests = 1000, 500
+        args.expire_rows = [r for r in args.expire_rows if r <= 100000]
+        args.symbols, args.subscribers = 100, 500
+        args.renewal_subscribers = 10000
+
+    report = {
+        "created_at": datetime.utcnow().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "results": run_suite(args),
+    }
+    status = 0
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        report["threshold_percent"] = args.threshold
+        report["comparison"] = compare(report["results"], baseline.get("results", baseline), args.threshold)
+        report["regressions"] = [row["metric"] for row in report["comparison"] if row["regression"]]
+        status = 1 if report["regressions"] else 0
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(report, f, indent=2)
+    print(json.dumps(report, indent=2))
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,7 @@
+# benchmarks/util.py
+# دوال مساعدة مشتركة بين القياسات
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))] if ordered else None
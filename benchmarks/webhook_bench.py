@@ -0,0 +1,92 @@
+# benchmarks/webhook_bench.py
+# يقيس زمن معالجة telegram_webhook مع انتهاء الاشتراكات داخل الطلب (السلوك القديم) وبدونه
+# python -m benchmarks.webhook_bench --users 5000 --requests 500
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from benchmarks.stubs import StubServer, TelegramStubHandler
+from benchmarks.util import percentile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def load_app(workdir):
+    # قاعدة البيانات في مجلد مؤقت حتى لا يلمس القياس قاعدة الإنتاج
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    if ROOT not in sys.path:
+        sys.path.insert(0, ROOT)
+    import app
+    from models import init_db
+    init_db()
+    return app
+
+
+def seed(app, users):
+    from sqlalchemy import insert
+    from models import SessionLocal, User, Subscription
+    session = SessionLocal()
+    now = datetime.utcnow()
+    session.execute(insert(User), [{"id": i, "telegram_id": str(100000 + i)} for i in range(1, users + 1)])
+    session.execute(insert(Subscription), [
+        {
+            "user_id": i,
+            "status": "active",
+            "start_date": now - timedelta(days=40),
+            # ربع الاشتراكات منتهية التاريخ لكنها ما زالت active
+            "end_date": now - timedelta(days=1) if i % 4 == 0 else now + timedelta(days=20),
+        }
+        for i in range(1, users + 1)
+    ])
+    session.commit()
+    session.close()
+
+
+def run(app, client, users, requests_count, inline_expire):
+    timings = []
+    for _ in range(requests_count):
+        uid = 100000 + random.randint(1, users)
+        update = {"message": {"chat": {"id": uid}, "from": {"id": uid, "first_name": "u"}, "text": "/status"}}
+        started = time.perf_counter()
+        if inline_expire:
+            app.expire_subscriptions(notify=False)
+        client.post(app.WEBHOOK_ROUTE, json=update)
+        timings.append(time.perf_counter() - started)
+    return {
+        "p50_ms": round(statistics.median(timings) * 1000, 3),
+        "p99_ms": round(percentile(timings, 99) * 1000, 3),
+        "requests_per_second": round(requests_count / sum(timings), 1),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=5000)
+    parser.add_argument("--requests", type=int, default=500)
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix="webhook_bench_")
+    with StubServer(TelegramStubHandler) as server:
+        os.environ["TELEGRAM_API_BASE"] = server.base_url
+        os.environ.setdefault("TELEGRAM_TOKEN", "TEST")
+        app = load_app(workdir)
+        seed(app, args.users)
+        client = app.app.test_client()
+        before = run(app, client, args.users, args.requests, inline_expire=True)
+        after = run(app, client, args.users, args.requests, inline_expire=False)
+        app.outbox.outbox.join()
+        delivered = server.state.get("delivered", 0)
+    result = {"benchmark": "telegram_webhook", "users": args.users, "before": before, "after": after,
+              "delivered": delivered}
+    print(json.dumps(result))
+    return result
+
+
+if __name__ == "__main__":
+    main()
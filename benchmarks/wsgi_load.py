@@ -0,0 +1,161 @@
+# benchmarks/wsgi_load.py
+# يشغّل wsgi:app تحت gunicorn بعدد عمال متزايد ويدفع تحديثات تيليجرام و IPN موقعة،
+# ثم يطبع الإنتاجية (طلب/ثانية) وزمن الاستجابة لكل عدد عمال
+# python -m benchmarks.wsgi_load --workers 1 2 4 --users 5000 --duration 10
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing import Pool
+
+import requests
+
+from benchmarks.ipn_bench import SECRET, signed
+from benchmarks.stubs import StubServer, TelegramStubHandler
+from benchmarks.util import percentile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+WEBHOOK_ROUTE = "/market-signals-bot/telegram-webhook"
+NOWPAYMENTS_ROUTE = "/market-signals-bot/nowpayments-webhook"
+
+
+def seed_db(database_url, users):
+    # نفس بيانات webhook_bench: ربع الاشتراكات منتهية التاريخ
+    os.environ["DATABASE_URL"] = database_url
+    if ROOT not in sys.path:
+        sys.path.insert(0, ROOT)
+    from models import init_db
+    from benchmarks.webhook_bench import seed
+    init_db()
+    seed(None, users)
+
+
+def start_server(port, workers, env):
+    env = dict(env, PORT=str(port), WEB_WORKERS=str(workers))
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "--log-level", "warning", "wsgi:app"],
+        cwd=ROOT, env=env,
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            if requests.get(base_url + "/", timeout=1).status_code == 200:
+                return proc, base_url
+        except requests.RequestException:
+            time.sleep(0.2)
+    proc.terminate()
+    raise RuntimeError("gunicorn did not start")
+
+
+def stop_server(proc):
+    proc.terminate()
+    try:
+        proc.wait(timeout=15)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+
+
+def client_process(args):
+    # عملية مولّد حمل: عدة خيوط، لكل خيط جلسة keep-alive خاصة
+    base_url, users, duration, threads, ipn_ratio, seed = args
+    deadline = time.time() + duration
+
+    def loop(thread_index):
+        rng = random.Random(seed * 1000 + thread_index)
+        session = requests.Session()
+        timings, errors, ipns, payment_id = [], 0, 0, seed * 10 ** 9 + thread_index * 10 ** 6
+        while time.time() < deadline:
+            uid = 100000 + rng.randint(1, users)
+            started = time.perf_counter()
+            if rng.random() < ipn_ratio:
+                payment_id += 1
+                body, headers = signed({"payment_id": payment_id, "payment_status": "finished",
+                                        "order_id": str(uid), "pay_amount": 40, "pay_currency": "usdt"})
+                resp = session.post(base_url + NOWPAYMENTS_ROUTE, data=body, headers=headers)
+                ipns += 1
+            else:
+                update = {"message": {"chat": {"id": uid}, "from": {"id": uid, "first_name": "u"}, "text": "/status"}}
+                resp = session.post(base_url + WEBHOOK_ROUTE, json=update)
+            timings.append(time.perf_counter() - started)
+            if resp.status_code >= 500:
+                errors += 1
+        return timings, errors, ipns
+
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        results = list(pool.map(loop, range(threads)))
+    timings = [t for r in results for t in r[0]]
+    return timings, sum(r[1] for r in results), sum(r[2] for r in results)
+
+
+def run_level(base_url, args):
+    jobs = [(base_url, args.users, args.duration, args.threads, args.ipn_ratio, i + 1)
+            for i in range(args.client_processes)]
+    started = time.perf_counter()
+    with Pool(args.client_processes) as pool:
+        results = pool.map(client_process, jobs)
+    elapsed = time.perf_counter() - started
+    timings = [t for r in results for t in r[0]]
+    return {
+        "requests": len(timings),
+        "ipns": sum(r[2] for r in results),
+        "errors": sum(r[1] for r in results),
+        "requests_per_second": round(len(timings) / elapsed, 1),
+        "p50_ms": round(percentile(timings, 50) * 1000, 3) if timings else None,
+        "p99_ms": round(percentile(timings, 99) * 1000, 3) if timings else None,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--users", type=int, default=5000)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--client-processes", type=int, default=4)
+    parser.add_argument("--threads", type=int, default=8, help="threads per client process")
+    parser.add_argument("--ipn-ratio", type=float, default=0.05)
+    parser.add_argument("--port", type=int, default=18080)
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix="wsgi_load_")
+    database_url = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    seed_db(database_url, args.users)
+
+    levels = []
+    with StubServer(TelegramStubHandler) as telegram:
+        env = dict(
+            os.environ,
+            DATABASE_URL=database_url,
+            TELEGRAM_API_BASE=telegram.base_url,
+            TELEGRAM_TOKEN=os.environ.get("TELEGRAM_TOKEN", "TEST"),
+            NOWPAYMENTS_IPN_SECRET=SECRET,
+            SHARED_STATE_PATH=os.path.join(workdir, "shared.state"),
+            TELEGRAM_RATE_STATE_PATH=os.path.join(workdir, "telegram.rate"),
+            JOBS_LOCK_PATH=os.path.join(workdir, "jobs.lock"),
+            SIGNAL_ENGINE_ENABLED="0",
+            # الرد الوهمي لتيليجرام فوري؛ لا نريد أن يحد معدل الإرسال من قياس الخادم
+            TELEGRAM_GLOBAL_RATE="100000",
+            TELEGRAM_PER_CHAT_INTERVAL="0",
+        )
+        for workers in args.workers:
+            proc, base_url = start_server(args.port, workers, env)
+            try:
+                level = run_level(base_url, args)
+            finally:
+                stop_server(proc)
+            level["workers"] = workers
+            levels.append(level)
+
+    result = {"benchmark": "wsgi_load", "users": args.users, "duration": args.duration,
+              "client_processes": args.client_processes, "threads": args.threads, "levels": levels}
+    print(json.dumps(result))
+    return result
+
+
+if __name__ == "__main__":
+    main()
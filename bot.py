@@ -1,26 +1,26 @@
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ApplicationBuilder, CommandHandler, ContextTypes, CallbackQueryHandler
 from config import TELEGRAM_TOKEN, ADMIN_IDS
-from models import SessionLocal, User, Subscription, init_db
+from services import get_user, get_active_subscription
+from async_db import run_db
+import async_db
+from nowpayments import AsyncNowPaymentsClient, subscription_order_id
+from strategies import STRATEGIES, DEFAULT_STRATEGY
 from datetime import datetime, timedelta
 
-init_db()  # إنشاء الجداول عند بداية التشغيل
+_payments = None
 
-db = SessionLocal()
+def get_payments_client():
+    global _payments
+    if _payments is None:
+        _payments = AsyncNowPaymentsClient()
+    return _payments
 
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user = update.effective_user
     telegram_id = str(user.id)
-    db_user = db.query(User).filter(User.telegram_id == telegram_id).first()
-    if not db_user:
-        db_user = User(
-            telegram_id=telegram_id,
-            username=user.username,
-            first_name=user.first_name,
-            last_name=user.last_name
-        )
-        db.add(db_user)
-        db.commit()
+    # الاستعلام يعمل في مجمع خيوط قاعدة البيانات حتى لا يوقف حلقة الأحداث
+    await async_db.get_or_create_user(telegram_id, user.username, user.first_name, user.last_name)
     await update.message.reply_text(
         "مرحباً بك في بوت إشارات التداول.\n"
         "للاشتراك أرسل /subscribe\n"
@@ -30,28 +30,63 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 async def subscribe(update: Update, context: ContextTypes.DEFAULT_TYPE):
     telegram_id = str(update.effective_user.id)
-    # هنا سترسل رابط دفع مع فاتورة، لاحقاً نكمل الكود
-    await update.message.reply_text(
-        "سيتم إرسال رابط الدفع بعد إعداد بوابة الدفع."
+    strategy = context.args[0] if context.args and context.args[0] in STRATEGIES else DEFAULT_STRATEGY
+    await _send_invoice(update, telegram_id, strategy)
+
+async def renew(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    # نفس استراتيجية الاشتراك الحالي؛ الدفع قبل الانتهاء يمدد من نهاية الاشتراك الحالي
+    telegram_id = str(update.effective_user.id)
+    strategy = await async_db.get_user_strategy(telegram_id)
+    if context.args and context.args[0] in STRATEGIES:
+        strategy = context.args[0]
+    await _send_invoice(update, telegram_id, strategy if strategy in STRATEGIES else DEFAULT_STRATEGY)
+
+async def _send_invoice(update: Update, telegram_id, strategy):
+    subscription = await async_db.get_or_create_pending_subscription(
+        telegram_id, strategy, STRATEGIES[strategy].price_usd
     )
+    # الفاتورة محفوظة مع الاشتراك المعلّق، فلا نطلب فاتورة جديدة عند تكرار /subscribe
+    invoice_url = subscription.invoice_url
+    if not invoice_url:
+        invoice_url, invoice_id = await get_payments_client().create_invoice(
+            subscription_order_id(subscription.id), subscription.amount, price_currency="usd", pay_currency="usdt"
+        )
+        if invoice_url:
+            await async_db.store_invoice(subscription.id, invoice_url, invoice_id)
+    if not invoice_url:
+        await update.message.reply_text("تعذر إنشاء رابط الدفع حالياً، حاول لاحقاً.")
+        return
+    await update.message.reply_text(f"رابط الدفع لاشتراكك ({strategy}):\n{invoice_url}")
+
+def _status_lookup(db, telegram_id):
+    db_user = get_user(db, telegram_id, create_if_not_exist=False)
+    active_sub = get_active_subscription(db, telegram_id) if db_user else None
+    return db_user is not None, (active_sub.end_date if active_sub else None)
 
 async def status(update: Update, context: ContextTypes.DEFAULT_TYPE):
     telegram_id = str(update.effective_user.id)
-    db_user = db.query(User).filter(User.telegram_id == telegram_id).first()
-    if not db_user:
+    found, end_date = await run_db(_status_lookup, telegram_id)
+    if not found:
         await update.message.reply_text("لم يتم العثور على بياناتك. الرجاء إرسال /start أولاً.")
         return
-    active_sub = (
-        db.query(Subscription)
-        .filter(Subscription.user_id == db_user.id)
-        .filter(Subscription.status == "active")
-        .order_by(Subscription.end_date.desc())
-        .first()
-    )
-    if active_sub and active_sub.end_date > datetime.utcnow():
-        days_left = (active_sub.end_date - datetime.utcnow()).days
+    if end_date and end_date > datetime.utcnow():
+        days_left = (end_date - datetime.utcnow()).days
         await update.message.reply_text(f"اشتراكك فعال وينتهي بعد {days_left} يوم.")
     else:
         await update.message.reply_text("ليس لديك اشتراك نشط حالياً. أرسل /subscribe للاشتراك.")
 
 # تابع باقي أوامر الإدارة لاحقاً
+
+def build_application(token=TELEGRAM_TOKEN, base_url=None):
+    builder = ApplicationBuilder().token(token).concurrent_updates(True)
+    if base_url:
+        builder = builder.base_url(base_url)
+    application = builder.build()
+    application.add_handler(CommandHandler("start", start))
+    application.add_handler(CommandHandler("subscribe", subscribe))
+    application.add_handler(CommandHandler("renew", renew))
+    application.add_handler(CommandHandler("status", status))
+    return application
+
+if __name__ == "__main__":
+    build_application().run_polling()
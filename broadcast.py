@@ -0,0 +1,154 @@
+# broadcast.py
+# إرسال إشارة لكل المشتركين النشطين في استراتيجية: استعلام واحد لاختيار المستلمين،
+# إرسال متوازٍ عبر TelegramClient (بحدوده)، وتسجيل النتائج دفعة واحدة
+# BroadcastQueue: دورة الفحص تضيف الإشارة وترجع، والبث (~30 رسالة/ثانية) يجري في خيط منفصل
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from sqlalchemy import insert, select, update
+from sqlalchemy.orm import Session
+
+from config import BROADCAST_WORKERS
+from models import User, Subscription, SignalLog, SignalDelivery, session_scope
+from telegram_client import get_bulk_client
+import metrics
+
+
+def get_active_subscriber_ids(db: Session, strategy: str):
+    now = datetime.utcnow()
+    stmt = (
+        select(User.telegram_id)
+        .join(Subscription, Subscription.user_id == User.id)
+        .where(Subscription.strategy == strategy)
+        .where(Subscription.status == "active")
+        .where(Subscription.end_date >= now)
+        .distinct()
+    )
+    return list(db.execute(stmt).scalars())
+
+
+def send_all(chat_ids, text, client=None, workers=None):
+    client = client or get_bulk_client()
+    with ThreadPoolExecutor(max_workers=workers or BROADCAST_WORKERS) as pool:
+        return list(pool.map(lambda chat_id: client.send_message(chat_id, text), chat_ids))
+
+
+def record_deliveries(db: Session, signal_log_id: int, results):
+    now = datetime.utcnow()
+    rows = [
+        {
+            "signal_log_id": signal_log_id,
+            "telegram_id": str(r.chat_id),
+            "ok": r.ok,
+            "status_code": r.status_code,
+            "error": r.error,
+            "attempts": r.attempts,
+            "sent_at": now,
+        }
+        for r in results
+    ]
+    if rows:
+        db.execute(insert(SignalDelivery), rows)
+    sent = sum(1 for r in results if r.ok)
+    db.execute(update(SignalLog).where(SignalLog.id == signal_log_id).values(sent_to_count=sent))
+    db.commit()
+    return sent
+
+
+def broadcast_signal(db: Session, signal_log: SignalLog, text: str, strategy: str, client=None, workers=None):
+    """
+    يرسل نص الإشارة لكل مشتركي الاستراتيجية ويحدّث SignalLog.sent_to_count.
+    يرجع dict فيه عدد المستلمين والناجح والفاشل والمدة ومعدل الرسائل في الثانية.
+    """
+    chat_ids = get_active_subscriber_ids(db, strategy)
+    started = time.perf_counter()
+    results = send_all(chat_ids, text, client=client, workers=workers)
+    elapsed = time.perf_counter() - started
+    sent = record_deliveries(db, signal_log.id, results)
+    return {
+        "recipients": len(chat_ids),
+        "sent": sent,
+        "failed": len(chat_ids) - sent,
+        "seconds": elapsed,
+        "messages_per_second": (len(chat_ids) / elapsed) if elapsed > 0 else None,
+    }
+
+
+class BroadcastQueue:
+    """
+    خيط واحد يبث الإشارات بالترتيب حتى لا يتجاوز البث حدود تيليجرام ولا يؤخر دورة الفحص التالية.
+    pending() > 0 عند انتهاء دورة فحص يعني أن بث الشموع السابقة لم ينته بعد (scan_runs.broadcast_backlog).
+    """
+
+    def __init__(self, workers=None):
+        self.workers = workers
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self.enqueued = 0
+        self.completed = 0
+        self.failed = 0
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="broadcast", daemon=True)
+                self._thread.start()
+
+    def enqueue(self, signal_log_id, text, strategy):
+        self.start()
+        with self._lock:
+            self.enqueued += 1
+        self._queue.put((signal_log_id, text, strategy, time.monotonic()))
+
+    def pending(self):
+        # ما زال في الطابور أو قيد البث الآن
+        return self._queue.unfinished_tasks
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                self._queue.task_done()
+                return
+            signal_log_id, text, strategy, enqueued_at = item
+            try:
+                with session_scope() as db:
+                    log = db.get(SignalLog, signal_log_id)
+                    if log is not None:
+                        stats = broadcast_signal(db, log, text, strategy, workers=self.workers)
+                        metrics.BROADCAST_SECONDS.observe(stats["seconds"], strategy=strategy)
+                metrics.BROADCAST_LAG_SECONDS.observe(time.monotonic() - enqueued_at)
+                self.completed += 1
+            except Exception as e:
+                self.failed += 1
+                print(f"[broadcast] signal {signal_log_id} failed: {e}")
+            finally:
+                self._queue.task_done()
+
+    def join(self):
+        self._queue.join()
+
+    def stop(self):
+        thread, self._thread = self._thread, None
+        if thread is not None:
+            self._queue.put(None)
+            thread.join(timeout=5)
+
+    def _after_fork(self):
+        # الخيط لا ينتقل مع fork؛ البث يعمل في عامل المهام المجدولة فقط
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def stats(self):
+        return {"pending": self.pending(), "enqueued": self.enqueued,
+                "completed": self.completed, "failed": self.failed}
+
+
+broadcast_queue = BroadcastQueue()
+os.register_at_fork(after_in_child=broadcast_queue._after_fork)
@@ -0,0 +1,172 @@
+# candle_cache.py
+# كاش مشترك للشموع داخل العملية: مفتاحه (symbol, timeframe)، ينتهي عند إغلاق الشمعة،
+# محدود الحجم بـ LRU، ويدمج الطلبات المتزامنة لنفس المفتاح في طلب واحد للبورصة
+import threading
+import time
+from collections import OrderedDict
+
+import metrics
+
+TIMEFRAME_SECONDS = {
+    "1m": 60,
+    "3m": 180,
+    "5m": 300,
+    "15m": 900,
+    "30m": 1800,
+    "1h": 3600,
+    "4h": 14400,
+    "1d": 86400,
+}
+
+
+def timeframe_seconds(timeframe):
+    if timeframe in TIMEFRAME_SECONDS:
+        return TIMEFRAME_SECONDS[timeframe]
+    unit = timeframe[-1]
+    value = int(timeframe[:-1])
+    return value * {"m": 60, "h": 3600, "d": 86400}[unit]
+
+
+class _Entry:
+    __slots__ = ("candles", "expires_at")
+
+    def __init__(self, candles, expires_at):
+        self.candles = candles
+        self.expires_at = expires_at
+
+
+class _Pending:
+    __slots__ = ("event", "result", "error")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class CandleCache:
+    """
+    fetch: دالة بنفس توقيع fetch_ohlcv(symbol, timeframe, limit) وترجع شموعاً بطابع زمني بالمللي ثانية.
+    ttl: أقصى عمر للعنصر بالثواني (افتراضياً حتى إغلاق الشمعة الحالية فقط).
+    """
+
+    def __init__(self, fetch, max_entries=1000, ttl=None, clock=time.time):
+        self._fetch = fetch
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._clock = clock
+        self._entries = OrderedDict()
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.fetches = 0
+
+    def _expires_at(self, now, timeframe):
+        period = timeframe_seconds(timeframe)
+        boundary = (int(now // period) + 1) * period
+        if self.ttl is not None:
+            return min(boundary, now + self.ttl)
+        return boundary
+
+    def get(self, symbol, timeframe, limit):
+        key = (symbol, timeframe)
+        now = self._clock()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires_at > now and len(entry.candles) >= limit:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                metrics.CANDLE_CACHE_REQUESTS.inc(result="hit")
+                return entry.candles[-limit:]
+            self.misses += 1
+            metrics.CANDLE_CACHE_REQUESTS.inc(result="miss")
+            pending = self._inflight.get(key)
+            owner = pending is None
+            if owner:
+                pending = _Pending()
+                self._inflight[key] = pending
+                previous = entry.candles if entry is not None else None
+
+        if not owner:
+            # طلب آخر لنفس المفتاح قيد التنفيذ: ننتظر نتيجته بدلاً من طلب جديد للبورصة
+            pending.event.wait()
+            if pending.error is not None:
+                raise pending.error
+            return pending.result[-limit:] if pending.result else pending.result
+
+        try:
+            candles = self._refresh(symbol, timeframe, limit, previous, now)
+            with self._lock:
+                if candles:
+                    self._store(key, candles, now)
+                pending.result = candles
+        except Exception as e:
+            pending.error = e
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            pending.event.set()
+        return candles[-limit:] if candles else candles
+
+    def _refresh(self, symbol, timeframe, limit, previous, now):
+        if previous and len(previous) >= limit:
+            period_ms = timeframe_seconds(timeframe) * 1000
+            last_ts = previous[-1][0]
+            current_open = int(now // timeframe_seconds(timeframe)) * period_ms
+            # عدد الشموع الجديدة + آخر شمعة مخزنة لأنها ربما لم تكن مغلقة وقت جلبها
+            missing = max(0, (current_open - last_ts) // period_ms) + 1
+            if missing < limit:
+                self.fetches += 1
+                with metrics.OHLCV_FETCH_SECONDS.time(source="incremental"):
+                    newest = self._fetch(symbol, timeframe, int(missing))
+                if newest:
+                    return _merge(previous, newest, limit)
+        self.fetches += 1
+        with metrics.OHLCV_FETCH_SECONDS.time(source="full"):
+            return self._fetch(symbol, timeframe, limit)
+
+    def put(self, symbol, timeframe, candles):
+        # لتعبئة الكاش مسبقاً بنتائج الجلب غير المتزامن (okx_async) قبل فحص الاستراتيجيات
+        if not candles:
+            return
+        with self._lock:
+            self._store((symbol, timeframe), list(candles), self._clock())
+
+    def _store(self, key, candles, now):
+        self._entries[key] = _Entry(candles, self._expires_at(now, key[1]))
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, symbol=None, timeframe=None):
+        with self._lock:
+            if symbol is None:
+                self._entries.clear()
+                return
+            for key in [k for k in self._entries if k[0] == symbol and (timeframe is None or k[1] == timeframe)]:
+                del self._entries[key]
+
+    def __len__(self):
+        return len(self._entries)
+
+
+def _merge(previous, newest, limit):
+    first_ts = newest[0][0]
+    kept = [c for c in previous if c[0] < first_ts]
+    merged = kept + list(newest)
+    return merged[-limit:]
+
+
+def fetch_ohlcv(symbol, timeframe, limit):
+    # okx_api (ومكتباته) تُحمّل عند أول جلب فعلي؛ signal_engine يستورد هذه الوحدة من webhook أيضاً
+    from okx_api import fetch_ohlcv as fetch
+    return fetch(symbol, timeframe, limit)
+
+
+cache = CandleCache(fetch_ohlcv)
+
+
+def get_ohlcv(symbol, timeframe, limit):
+    return cache.get(symbol, timeframe, limit)
@@ -0,0 +1,84 @@
+# entitlements.py
+# كاش في الذاكرة لصلاحية المستخدم (هل لديه اشتراك فعال) حتى لا تلمس الرسائل المتكررة قاعدة البيانات
+# يُبطل صراحةً عند الدفع أو التفعيل أو /cancel، وينتهي تلقائياً عند end_date
+# الإبطال يصل لكل عمال الخادم عبر عدادات shared_state (كل عنصر يحفظ جيله وقت القراءة من القاعدة)
+import os
+import threading
+from collections import OrderedDict, namedtuple
+from datetime import datetime
+
+from config import ENTITLEMENT_CACHE_SIZE
+from shared_state import generations as shared_generations
+
+Entitlement = namedtuple("Entitlement", ["user_id", "strategy", "start_date", "end_date", "first_name"])
+
+
+class EntitlementCache:
+
+    def __init__(self, max_size=ENTITLEMENT_CACHE_SIZE, clock=datetime.utcnow, generations=None):
+        self.max_size = max_size
+        self._clock = clock
+        self._generations = generations or shared_generations
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        os.register_at_fork(after_in_child=self._after_fork)
+
+    def generation(self, telegram_id):
+        # يُقرأ قبل الاستعلام من القاعدة ويُمرر إلى put، حتى لا يُخزن إبطال حدث أثناء الاستعلام كقيمة صالحة
+        return self._generations.get(str(telegram_id))
+
+    def get(self, telegram_id):
+        key = str(telegram_id)
+        current = self._generations.get(key)
+        with self._lock:
+            item = self._entries.get(key)
+            if item is not None:
+                generation, entitlement = item
+                if generation == current and entitlement.end_date is not None and entitlement.end_date >= self._clock():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entitlement
+                # انتهى الاشتراك أو أبطله عامل آخر: نحذفه حتى تقرر قاعدة البيانات الحالة الجديدة
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, telegram_id, entitlement, generation=None):
+        key = str(telegram_id)
+        if generation is None:
+            generation = self._generations.get(key)
+        with self._lock:
+            self._entries[key] = (generation, entitlement)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, telegram_id):
+        key = str(telegram_id)
+        self._generations.bump(key)
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def _after_fork(self):
+        # كل عامل يبدأ بكاش فارغ وقفل جديد
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def stats(self):
+        return {"size": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+    def __len__(self):
+        return len(self._entries)
+
+
+cache = EntitlementCache()
+
+
+def invalidate(telegram_id):
+    cache.invalidate(telegram_id)
@@ -0,0 +1,37 @@
+# gunicorn.conf.py
+# gunicorn -c gunicorn.conf.py wsgi:app
+# لا نستورد config هنا: القيم أدناه يجب أن تُضبط في البيئة قبل أن يقرأها config عند تحميل التطبيق
+import os
+import tempfile
+
+bind = f"0.0.0.0:{os.getenv('PORT', '5000')}"
+workers = int(os.getenv("WEB_WORKERS", "4"))
+# عمال بخيوط: أغلب زمن الطلب انتظار لقاعدة البيانات
+worker_class = "gthread"
+threads = int(os.getenv("WEB_THREADS", "8"))
+timeout = 30
+keepalive = 5
+# التطبيق يُحمّل مرة في العملية الأم (استيراد الوحدات مرة واحدة؛ الجداول تُنشأ فقط عبر manage.py init-db)،
+# ثم كل وحدة تعيد تهيئة اتصالاتها وأقفالها وطوابيرها في العامل عبر os.register_at_fork
+preload_app = True
+
+# كاش الصلاحيات ونتائج /advice في كل عامل يُبطل عبر عدادات مشتركة في هذا الملف
+os.environ.setdefault("SHARED_STATE_PATH", os.path.join(tempfile.gettempdir(), "market_signals_bot.state"))
+# كل عامل يكتب لقطة مقاييسه هنا، و /metrics في أي عامل يعرض مجموعها
+os.environ.setdefault("METRICS_DIR", os.path.join(tempfile.gettempdir(), "market_signals_bot.metrics"))
+# حد تيليجرام العام (~30 رسالة/ثانية) للبوت كله: رصيد واحد مشترك بين كل العمال في هذا الملف،
+# تسحب منه ردود الأوامر أولاً ثم البث والتذكيرات في عامل المهام (telegram_client)
+os.environ.setdefault("TELEGRAM_RATE_STATE_PATH", os.path.join(tempfile.gettempdir(), "market_signals_bot.telegram_rate"))
+
+
+def on_starting(server):
+    import metrics
+    metrics.REGISTRY.clear_dir()
+
+
+def post_worker_init(worker):
+    import metrics
+    import wsgi
+    metrics.REGISTRY.start_flusher()
+    if wsgi.start_jobs_if_leader():
+        worker.log.info("background jobs running in worker %s", worker.pid)
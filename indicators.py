@@ -0,0 +1,234 @@
+# indicators.py
+# محرك مؤشرات تزايدي: يحتفظ بحالة EMA9/EMA21/RSI لكل رمز ويحدّثها بـ O(1) عند إغلاق كل شمعة
+# القيم مطابقة (حتى خطأ التقريب) لحساب pandas ewm(adjust=False) من جديد على نافذة الشموع نفسها:
+# الحالة تمتد عبر النوافذ، ثم يُطرح أثر ما قبل أول شمعة في النافذة (انظر IndicatorState.window)
+import threading
+from collections import deque
+
+EMA_FAST = 9
+EMA_SLOW = 21
+RSI_PERIOD = 14
+
+# عدد الشموع المعتمدة التي نحتفظ بقيمها لتصحيح بداية النافذة؛ أكبر من LIMIT في strategies
+HISTORY = 1000
+
+
+def _ema_alpha(span):
+    return 2.0 / (span + 1)
+
+
+_ALPHAS = (_ema_alpha(EMA_FAST), _ema_alpha(EMA_SLOW), 1.0 / RSI_PERIOD, 1.0 / RSI_PERIOD)
+
+
+class IndicatorState:
+    """
+    الحالة الجارية لرمز واحد: آخر قيم EMA ومتوسطات Wilder للربح والخسارة منذ أول شمعة رآها المحرك.
+    push() تعتمد شمعة مغلقة، و peek() تحسب القيم لشمعة لم تُغلق بعد دون تعديل الحالة.
+    """
+    __slots__ = ("ema_fast", "ema_slow", "avg_gain", "avg_loss", "last_close", "last_ts", "count", "_history", "_order",
+                 "window_start", "correct", "prev")
+
+    def __init__(self):
+        self.ema_fast = None
+        self.ema_slow = None
+        self.avg_gain = 0.0
+        self.avg_loss = 0.0
+        self.last_close = None
+        self.last_ts = None
+        self.count = 0
+        # ts -> (رقم الشمعة، close، القيم الأربع بعدها)
+        self._history = {}
+        self._order = deque()
+        # نتيجة آخر update: بداية النافذة، دالة التصحيح لها، وقيم آخر شمعة مغلقة
+        self.window_start = None
+        self.correct = None
+        self.prev = None
+
+    def _raw(self):
+        return self.ema_fast, self.ema_slow, self.avg_gain, self.avg_loss
+
+    def _step(self, close):
+        if self.last_close is None:
+            # أول شمعة: ewm(adjust=False) تبدأ من القيمة نفسها، و diff() الأولى NaN تُعامل كصفر
+            return close, close, 0.0, 0.0
+        delta = close - self.last_close
+        gain = delta if delta > 0 else 0.0
+        loss = -delta if delta < 0 else 0.0
+        return tuple(a * x + (1 - a) * y for a, x, y in zip(_ALPHAS, (close, close, gain, loss), self._raw()))
+
+    def push(self, ts, close):
+        close = float(close)
+        self.ema_fast, self.ema_slow, self.avg_gain, self.avg_loss = self._step(close)
+        self.last_close = close
+        self.last_ts = ts
+        self._history[ts] = (self.count, close, self._raw())
+        self._order.append(ts)
+        if len(self._order) > HISTORY:
+            self._history.pop(self._order.popleft(), None)
+        self.count += 1
+
+    def window(self, start_ts):
+        """
+        يرجع دالة تحوّل القيم الجارية (رقم الشمعة، القيم الأربع) إلى قيم نافذة تبدأ عند start_ts،
+        أو None إذا لم تعد تلك الشمعة في التاريخ المحفوظ.
+        القيمة المبدوءة من النافذة W والجارية E تحققان نفس المعادلة y = a*x + (1-a)*y_prev بعد البداية،
+        فالفرق بينهما يتضاءل بـ (1-a) كل شمعة: W_t = E_t - (1-a)^(t-s) * (E_s - W_s)،
+        حيث W_s هي close للـ EMA وصفر لمتوسطي الربح والخسارة.
+        """
+        entry = self._history.get(start_ts)
+        if entry is None:
+            return None
+        start, close, values = entry
+        offsets = [v - seed for v, seed in zip(values, (close, close, 0.0, 0.0))]
+
+        def correct(index, raw):
+            out = [value - (1 - a) ** (index - start) * offset for a, value, offset in zip(_ALPHAS, raw, offsets)]
+            # نافذة بلا خسائر (أو أرباح) قيمتها الدقيقة صفر؛ الطرح يترك بقايا تقريب يجب ألا تغيّر RSI
+            for i in (2, 3):
+                if out[i] <= 1e-9 * abs(raw[i]):
+                    out[i] = 0.0
+            return out
+
+        return correct
+
+    def peek(self, close, correct=None):
+        raw = self._step(float(close))
+        ema_fast, ema_slow, avg_gain, avg_loss = correct(self.count, raw) if correct else raw
+        return ema_fast, ema_slow, _rsi_value(avg_gain, avg_loss)
+
+    def snapshot(self, correct=None):
+        raw = self._raw()
+        ema_fast, ema_slow, avg_gain, avg_loss = correct(self.count - 1, raw) if correct else raw
+        return ema_fast, ema_slow, _rsi_value(avg_gain, avg_loss)
+
+
+def _rsi_value(avg_gain, avg_loss):
+    # نفس سلوك pandas: 0/0 -> NaN، و x/0 -> inf أي RSI = 100
+    if avg_loss == 0:
+        return float("nan") if avg_gain == 0 else 100.0
+    rs = avg_gain / avg_loss
+    return 100 - (100 / (1 + rs))
+
+
+class IndicatorEngine:
+    """
+    يحتفظ بـ IndicatorState لكل رمز. آخر شمعة في القائمة تُعامل كشمعة مفتوحة (تُحسب بـ peek)
+    وكل ما قبلها يُعتمد مرة واحدة فقط، لذلك لا يُعاد حساب التاريخ كاملاً في كل فحص.
+    """
+
+    def __init__(self):
+        self._states = {}
+        self._lock = threading.Lock()
+
+    def reset(self, symbol=None):
+        with self._lock:
+            if symbol is None:
+                self._states.clear()
+            else:
+                self._states.pop(symbol, None)
+
+    def update(self, symbol, candles):
+        """
+        candles: قائمة [timestamp, open, high, low, close, volume] مرتبة تصاعدياً كما ترجعها fetch_ohlcv.
+        ترجع (prev, last) حيث كل عنصر (ema9, ema21, rsi) أو None إذا لم تكفِ البيانات.
+        """
+        if not candles or len(candles) < 2:
+            return None
+        with self._lock:
+            state = self._states.get(symbol)
+            closed = candles[:-1]
+            if state is not None and state.last_ts == closed[-1][0] and state.window_start == closed[0][0]:
+                # لم تُغلق شمعة جديدة منذ آخر فحص: فقط الشمعة المفتوحة تغيّرت
+                return state.prev, state.peek(candles[-1][4], state.correct)
+            if state is None or state.last_ts is None or not _overlaps(state.last_ts, closed):
+                # لا توجد حالة أو هناك فجوة في البيانات: نبني الحالة من النافذة المتوفرة
+                state = IndicatorState()
+                self._states[symbol] = state
+            for candle in _new_candles(state.last_ts, closed):
+                state.push(candle[0], candle[4])
+            correct = state.window(closed[0][0])
+            if correct is None:
+                # بداية النافذة أقدم من التاريخ المحفوظ: نعيد البناء منها
+                state = IndicatorState()
+                self._states[symbol] = state
+                for candle in closed:
+                    state.push(candle[0], candle[4])
+                correct = state.window(closed[0][0])
+            state.window_start, state.correct = closed[0][0], correct
+            state.prev = state.snapshot(correct)
+            last = state.peek(candles[-1][4], correct)
+        return state.prev, last
+
+
+def _new_candles(last_ts, closed):
+    # الشموع بعد آخر شمعة معتمدة، بالمرور من النهاية: العمل بعدد الشموع الجديدة وليس طول النافذة
+    if last_ts is None:
+        return closed
+    start = len(closed)
+    while start > 0 and closed[start - 1][0] > last_ts:
+        start -= 1
+    return closed[start:]
+
+
+def _overlaps(last_ts, closed):
+    # الحالة قابلة للاستمرار فقط إذا كانت آخر شمعة معتمدة ما زالت داخل النافذة الجديدة
+    return bool(closed) and closed[0][0] <= last_ts <= closed[-1][0]
+
+
+engine = IndicatorEngine()
+
+
+# نسخ متجهة تعمل على مصفوفة (رموز × شموع) دفعة واحدة، تستخدمها strategies / scanner / backtest
+# numpy يُستورد داخل الدوال: المسار التزايدي أعلاه و webhook لا يحتاجانه
+
+def ewm_matrix(values, alpha):
+    # نفس ewm(adjust=False) لكن على كل الصفوف معاً؛ كل صف يبدأ من أول قيمة غير NaN فيه
+    import numpy as np
+    out = np.empty_like(values)
+    prev = np.full(values.shape[0], np.nan)
+    for t in range(values.shape[1]):
+        x = values[:, t]
+        cur = np.where(np.isnan(prev), x, alpha * x + (1 - alpha) * prev)
+        # NaN الحشو لا يلغي القيمة السابقة
+        cur = np.where(np.isnan(x), prev, cur)
+        out[:, t] = cur
+        prev = cur
+    return out
+
+
+def ema_matrix(closes, span):
+    return ewm_matrix(closes, _ema_alpha(span))
+
+
+def rsi_matrix(closes, period=RSI_PERIOD):
+    import numpy as np
+    delta = np.diff(closes, axis=1, prepend=np.nan)
+    valid = ~np.isnan(closes)
+    # أول فرق لكل صف (NaN) يُعامل كصفر كما في rsi() الأصلية
+    gain = np.where(valid, np.where(delta > 0, delta, 0.0), np.nan)
+    loss = np.where(valid, np.where(delta < 0, -delta, 0.0), np.nan)
+    avg_gain = ewm_matrix(gain, 1.0 / period)
+    avg_loss = ewm_matrix(loss, 1.0 / period)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rs = avg_gain / avg_loss
+        return 100 - (100 / (1 + rs))
+
+
+# المقابل المتجه لكل قيمة في IndicatorState.snapshot() / peek() بالترتيب نفسه: (func, params)
+# strategies تربط بها مؤشرات السجل، فلا تُكتب قائمة المؤشرات التزايدية يدوياً
+INCREMENTAL_OUTPUTS = (
+    (ema_matrix, {"span": EMA_FAST}),
+    (ema_matrix, {"span": EMA_SLOW}),
+    (rsi_matrix, {"period": RSI_PERIOD}),
+)
+
+
+def rsi(series, period=14):
+    # النسخة المرجعية على pandas Series (كانت مكررة في strategy_one و strategy_two)
+    delta = series.diff()
+    gain = delta.where(delta > 0, 0.0)
+    loss = -delta.where(delta < 0, 0.0)
+    avg_gain = gain.ewm(alpha=1/period, adjust=False).mean()
+    avg_loss = loss.ewm(alpha=1/period, adjust=False).mean()
+    rs = avg_gain / avg_loss
+    return 100 - (100 / (1 + rs))
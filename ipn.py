@@ -0,0 +1,154 @@
+# ipn.py
+# استقبال NowPayments IPN بشكل idempotent: التحقق من HMAC مرة واحدة على الجسم الخام،
+# منع التكرار عبر payment_id (كاش في الذاكرة + فهرس فريد في processed_payments)،
+# والتفعيل وتسجيل الدفعة في معاملة واحدة
+import json
+import threading
+from collections import OrderedDict, namedtuple
+from datetime import datetime, timedelta
+
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from models import ProcessedPayment, Subscription
+from nowpayments import parse_subscription_order_id, verify_nowpayments_signature
+import services
+
+IPNResult = namedtuple("IPNResult", ["status", "telegram_id", "end_date"])
+
+# processed: تم التفعيل، duplicate: سبق معالجتها، already_active: للمستخدم اشتراك فعال،
+# ignored: حالة دفع غير نهائية، not_found: لا يوجد مستخدم/اشتراك
+PROCESSED = "processed"
+DUPLICATE = "duplicate"
+ALREADY_ACTIVE = "already_active"
+IGNORED = "ignored"
+NOT_FOUND = "not_found"
+
+
+class _SeenPayments:
+    """مجموعة محدودة الحجم لأحدث payment_id المعالجة: فحص O(1) قبل لمس قاعدة البيانات."""
+
+    def __init__(self, max_size=100000):
+        self.max_size = max_size
+        self._ids = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __contains__(self, payment_id):
+        with self._lock:
+            return payment_id in self._ids
+
+    def add(self, payment_id):
+        with self._lock:
+            self._ids[payment_id] = None
+            while len(self._ids) > self.max_size:
+                self._ids.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._ids.clear()
+
+
+seen = _SeenPayments()
+
+
+def parse_verified(raw_body: bytes, signature_header: str):
+    """يرجع جسم IPN كـ dict إذا كان التوقيع صحيحاً، وإلا None."""
+    if not signature_header or not verify_nowpayments_signature(raw_body, signature_header):
+        return None
+    try:
+        return json.loads(raw_body)
+    except ValueError:
+        return None
+
+
+def ingest(db: Session, data: dict) -> IPNResult:
+    if data.get("payment_status") != "finished":
+        return IPNResult(IGNORED, None, None)
+    if data.get("payment_id") in (None, ""):
+        # بدون payment_id لا يمكن منع التكرار: str(None) كان سيجعل كل IPN لاحق بلا معرف "مكرراً"
+        return IPNResult(IGNORED, None, None)
+    payment_id = str(data.get("payment_id"))
+    if payment_id in seen:
+        return IPNResult(DUPLICATE, None, None)
+    if db.query(ProcessedPayment.id).filter(ProcessedPayment.payment_id == payment_id).first():
+        seen.add(payment_id)
+        return IPNResult(DUPLICATE, None, None)
+
+    try:
+        subscription, telegram_id = _apply(db, data, payment_id)
+        if subscription is None and telegram_id is None:
+            db.rollback()
+            return IPNResult(NOT_FOUND, None, None)
+        db.add(ProcessedPayment(
+            payment_id=payment_id,
+            payment_status=data.get("payment_status"),
+            order_id=str(data.get("order_id")),
+            subscription_id=subscription.id if subscription is not None else None,
+        ))
+        # الاشتراك وسجل الدفعة في commit واحد؛ IPN متزامن بنفس payment_id سيفشل على الفهرس الفريد
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        seen.add(payment_id)
+        return IPNResult(DUPLICATE, None, None)
+    seen.add(payment_id)
+    if subscription is None:
+        return IPNResult(ALREADY_ACTIVE, telegram_id, None)
+    return IPNResult(PROCESSED, telegram_id, subscription.end_date)
+
+
+def _invoice_subscription(db, data):
+    """
+    يرجع (هل الدفعة على فاتورة اشتراك من فواتيرنا، الاشتراك أو None).
+    التعرف بـ invoice_id المحفوظ (بأي حالة) أو بـ order_id ذي البادئة sub-.
+    """
+    invoice_id = data.get("invoice_id")
+    if invoice_id is not None:
+        subscription = db.query(Subscription).filter(Subscription.invoice_id == str(invoice_id)).first()
+        if subscription is not None:
+            return True, subscription
+    subscription_id = parse_subscription_order_id(data.get("order_id"))
+    if subscription_id is not None:
+        return True, db.get(Subscription, subscription_id)
+    return False, None
+
+
+def _apply(db, data, payment_id):
+    # 1) فاتورة اشتراك (services.get_or_create_invoice، bot.py، renewals.py): order_id رقم اشتراك وليس
+    # telegram_id، فلا نصل أبداً للمسار القديم أدناه حتى لا يُفعّل اشتراك لمستخدم آخر بالخطأ
+    ours, invoice_subscription = _invoice_subscription(db, data)
+    if ours:
+        if invoice_subscription is None or invoice_subscription.user is None:
+            return None, None
+        if invoice_subscription.status != "pending":
+            # دفعة ثانية على فاتورة فُعّلت سابقاً: نسجلها فقط
+            return None, invoice_subscription.user.telegram_id
+        invoice_subscription.payment_id = payment_id
+        subscription = services.activate_subscription(db, payment_id, commit=False)
+        return subscription, subscription.user.telegram_id
+
+    # 2) اشتراك سُجل له payment_id مسبقاً
+    subscription = services.activate_subscription(db, payment_id, commit=False)
+    if subscription is not None:
+        return subscription, subscription.user.telegram_id
+
+    # 3) المسار القديم: order_id هو telegram_id للمستخدم
+    user = services.get_user(db, str(data.get("order_id")), create_if_not_exist=False)
+    if not user:
+        return None, None
+    if services.get_active_subscription_for_user(db, user.id):
+        # الاشتراك فعال أصلاً: نسجل الدفعة فقط حتى لا تُعاد معالجتها
+        return None, user.telegram_id
+    start_date = datetime.utcnow()
+    subscription = Subscription(
+        user_id=user.id,
+        start_date=start_date,
+        end_date=start_date + timedelta(days=30),
+        status="active",
+        payment_id=payment_id,
+        amount=data.get("pay_amount"),
+        currency=data.get("pay_currency"),
+    )
+    db.add(subscription)
+    db.flush()
+    return subscription, user.telegram_id
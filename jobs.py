@@ -0,0 +1,66 @@
+# jobs.py
+# جدولة مهام الخلفية (APScheduler) بدلاً من تنفيذها داخل طلبات webhook
+import fcntl
+import os
+
+from config import JOBS_LOCK_PATH
+
+_scheduler = None
+_leader_fd = None
+
+
+def get_scheduler():
+    global _scheduler
+    if _scheduler is None:
+        # APScheduler يُحمّل عند أول جدولة فقط، لا عند استيراد app
+        from apscheduler.schedulers.background import BackgroundScheduler
+        _scheduler = BackgroundScheduler(
+            timezone="UTC",
+            # لا نشغّل نسختين من نفس المهمة، ونجمع التشغيلات الفائتة في تشغيل واحد
+            job_defaults={"coalesce": True, "max_instances": 1, "misfire_grace_time": 60},
+        )
+    return _scheduler
+
+
+def add_interval_job(func, seconds, job_id):
+    scheduler = get_scheduler()
+    scheduler.add_job(func, "interval", seconds=seconds, id=job_id, replace_existing=True)
+    return scheduler
+
+
+def add_cron_job(func, job_id, **trigger):
+    scheduler = get_scheduler()
+    scheduler.add_job(func, "cron", id=job_id, replace_existing=True, **trigger)
+    return scheduler
+
+
+def start():
+    scheduler = get_scheduler()
+    if not scheduler.running:
+        scheduler.start()
+    return scheduler
+
+
+def shutdown():
+    if _scheduler is not None and _scheduler.running:
+        _scheduler.shutdown(wait=False)
+
+
+def acquire_leader(path=JOBS_LOCK_PATH):
+    """
+    مع عدة عمال للخادم يجب أن تعمل المهام المجدولة في عملية واحدة فقط.
+    يرجع True للعملية التي تملك القفل (يبقى مأخوذاً حتى تنتهي، ثم يأخذه العامل البديل).
+    """
+    global _leader_fd
+    if _leader_fd is not None:
+        return True
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        os.close(fd)
+        return False
+    os.ftruncate(fd, 0)
+    os.write(fd, str(os.getpid()).encode())
+    _leader_fd = fd
+    return True
@@ -0,0 +1,83 @@
+# manage.py
+# أوامر التشغيل الإدارية بدلاً من تنفيذها عند استيراد app / bot:
+#   python manage.py init-db    إنشاء الجداول والفهارس (آمن للتكرار)
+#   python manage.py migrate    إضافة الأعمدة والفهارس الجديدة لقاعدة موجودة
+#   python manage.py report     الإيرادات حسب العملة/الاستراتيجية وعدد المشتركين الفعالين (JSON)
+#   python manage.py export subscriptions --format csv -o subs.csv
+import argparse
+import json
+import sys
+import time
+from datetime import datetime
+
+
+def init_db_command(args):
+    from models import init_db
+    started = time.perf_counter()
+    init_db()
+    print(f"[manage] schema ready in {time.perf_counter() - started:.2f}s")
+
+
+def migrate_command(args):
+    from models import migrate
+    started = time.perf_counter()
+    migrate()
+    print(f"[manage] migrations applied in {time.perf_counter() - started:.2f}s")
+
+
+def report_command(args):
+    import reports
+    with reports.readonly_session() as db:
+        result = {
+            "revenue": reports.revenue(db, by=args.by, since=args.since, until=args.until),
+            "active_subscribers": reports.active_subscribers(db),
+        }
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+
+
+def export_command(args):
+    import reports
+    started = time.perf_counter()
+    out = open(args.output, "w", newline="", encoding="utf-8") if args.output else sys.stdout
+    try:
+        count = reports.export(args.table, out, fmt=args.format, batch_size=args.batch_size)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    # إلى stderr حتى لا يختلط بالتصدير عند الكتابة إلى stdout
+    print(f"[manage] exported {count} {args.table} rows in {time.perf_counter() - started:.2f}s", file=sys.stderr)
+
+
+def _date(value):
+    return datetime.fromisoformat(value)
+
+
+def build_parser():
+    from config import EXPORT_BATCH_SIZE
+    parser = argparse.ArgumentParser(description="market-signals-bot management commands")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("init-db", help="create tables and indexes").set_defaults(func=init_db_command)
+    commands.add_parser("migrate", help="add new columns and indexes to an existing database").set_defaults(func=migrate_command)
+
+    report = commands.add_parser("report", help="revenue and active subscriber counts")
+    report.add_argument("--by", nargs="+", default=["currency", "strategy"], choices=["currency", "strategy", "status"])
+    report.add_argument("--since", type=_date, help="ISO date, by subscription start_date")
+    report.add_argument("--until", type=_date)
+    report.set_defaults(func=report_command)
+
+    export = commands.add_parser("export", help="stream a table as CSV or JSON")
+    export.add_argument("table", choices=["users", "subscriptions", "signal_logs"])
+    export.add_argument("--format", choices=["csv", "json"], default="csv")
+    export.add_argument("-o", "--output", help="file path (default: stdout)")
+    export.add_argument("--batch-size", type=int, default=EXPORT_BATCH_SIZE)
+    export.set_defaults(func=export_command)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,339 @@
+# metrics.py
+# عدادات ومقاييس لحظية (gauges) ومدرجات زمنية (histograms) بصيغة Prometheus النصية تُعرض على /metrics في app.py
+# بدون اعتماديات إضافية؛ عند METRICS_ENABLED=0 كل تسجيل يرجع فوراً بعد فحص متغير واحد
+# مع عدة عمال gunicorn: كل عامل يكتب لقطة من قيمه في METRICS_DIR، و /metrics يجمعها كلها
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from functools import wraps
+
+from config import METRICS_ENABLED, METRICS_DIR, METRICS_FLUSH_SECONDS
+
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+enabled = METRICS_ENABLED
+
+
+class _Metric:
+    kind = None
+    # قيم تراكمية تبقى من لقطات العمال المنتهين؛ القيم اللحظية تُؤخذ من اللقطات الحديثة فقط
+    cumulative = True
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        REGISTRY.register(self)
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def reset(self):
+        self._values = {}
+        self._lock = threading.Lock()
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        if not enabled:
+            return
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def snapshot(self):
+        with self._lock:
+            return {key: value for key, value in self._values.items()}
+
+    @staticmethod
+    def merge(into, value):
+        return (into or 0) + value
+
+    def render(self, values):
+        for key, value in sorted(values.items()):
+            yield f"{self.name}{_labels(self.labelnames, key)} {_number(value)}"
+
+
+class Gauge(_Metric):
+    """قيمة لحظية لكل عامل، و /metrics يعرض مجموعها. set_function تُقرأ عند كل لقطة."""
+    kind = "gauge"
+    cumulative = False
+
+    def __init__(self, name, help_text, labelnames=()):
+        super().__init__(name, help_text, labelnames)
+        self._functions = {}
+
+    def set(self, value, **labels):
+        if not enabled:
+            return
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def set_function(self, func, **labels):
+        # الدالة تبقى بعد fork (reset لا يمسحها) وتقرأ حالة العامل نفسه
+        self._functions[self._key(labels)] = func
+
+    def snapshot(self):
+        if not enabled:
+            return {}
+        with self._lock:
+            values = dict(self._values)
+        for key, func in self._functions.items():
+            values[key] = func()
+        return values
+
+    @staticmethod
+    def merge(into, value):
+        return (into or 0) + value
+
+    render = Counter.render
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, count=1, **labels):
+        # count: لتسجيل متوسط دفعة (مثلاً زمن الرمز الواحد في فحص متجه) كـ count ملاحظة بنفس القيمة
+        if not enabled:
+            return
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                # [عدد كل خانة (غير تراكمي) ..., +Inf, المجموع]
+                series = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += count
+            series[-1] += value * count
+
+    def time(self, **labels):
+        if not enabled:
+            return _NULL_TIMER
+        return _Timer(self, labels)
+
+    def snapshot(self):
+        with self._lock:
+            return {key: list(series) for key, series in self._values.items()}
+
+    @staticmethod
+    def merge(into, value):
+        if into is None:
+            return list(value)
+        return [a + b for a, b in zip(into, value)]
+
+    def render(self, values):
+        for key, series in sorted(values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series[:-1]):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else _number(bound)
+                yield f"{self.name}_bucket{_labels(self.labelnames + ('le',), key + (le,))} {cumulative}"
+            yield f"{self.name}_sum{_labels(self.labelnames, key)} {_number(series[-1])}"
+            yield f"{self.name}_count{_labels(self.labelnames, key)} {cumulative}"
+
+
+class _Timer:
+    __slots__ = ("histogram", "labels", "started")
+
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.started, **self.labels)
+
+
+class _NullTimer:
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+def timed(histogram, **labels):
+    """مزخرف يسجل زمن الدالة في histogram؛ عند التعطيل يستدعي الدالة مباشرة."""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if not enabled:
+                return func(*args, **kwargs)
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                histogram.observe(time.perf_counter() - started, **labels)
+        return wrapper
+    return decorator
+
+
+class Registry:
+
+    def __init__(self):
+        self._metrics = []
+        self._flusher = None
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        self._metrics.append(metric)
+
+    def snapshot(self):
+        return {m.name: [[list(k), v] for k, v in m.snapshot().items()] for m in self._metrics}
+
+    def _path(self, pid=None):
+        return os.path.join(METRICS_DIR, f"metrics-{pid or os.getpid()}.json")
+
+    def flush(self):
+        # كتابة ذرية: ملف مؤقت ثم إعادة تسمية، حتى لا يقرأ عامل آخر ملفاً نصف مكتوب
+        path = self._path()
+        tmp = f"{path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.snapshot(), f)
+        os.replace(tmp, path)
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(METRICS_FLUSH_SECONDS)
+            try:
+                self.flush()
+            except OSError as e:
+                print(f"[metrics] flush error: {e}")
+
+    def clear_dir(self):
+        # عند بدء الخادم: لقطات تشغيل سابق لا تخص العمال الحاليين
+        if not METRICS_DIR or not os.path.isdir(METRICS_DIR):
+            return
+        for filename in os.listdir(METRICS_DIR):
+            if filename.startswith("metrics-"):
+                os.remove(os.path.join(METRICS_DIR, filename))
+
+    def start_flusher(self):
+        if not (enabled and METRICS_DIR):
+            return
+        with self._lock:
+            if self._flusher is not None:
+                return
+            os.makedirs(METRICS_DIR, exist_ok=True)
+            self._flusher = threading.Thread(target=self._flush_loop, name="metrics-flush", daemon=True)
+            self._flusher.start()
+
+    def _collect(self):
+        merged = {m.name: {} for m in self._metrics}
+        by_name = {m.name: m for m in self._metrics}
+
+        def add(name, key, value):
+            metric = by_name.get(name)
+            if metric is not None:
+                merged[name][key] = metric.merge(merged[name].get(key), value)
+
+        for metric in self._metrics:
+            for key, value in metric.snapshot().items():
+                add(metric.name, key, value)
+        if METRICS_DIR and os.path.isdir(METRICS_DIR):
+            own = os.path.basename(self._path())
+            stale_before = time.time() - 3 * METRICS_FLUSH_SECONDS
+            for filename in os.listdir(METRICS_DIR):
+                # ملفات العمال المنتهين تبقى حتى لا تنقص العدادات التراكمية
+                if not filename.endswith(".json") or filename == own:
+                    continue
+                path = os.path.join(METRICS_DIR, filename)
+                try:
+                    fresh = os.path.getmtime(path) >= stale_before
+                    with open(path) as f:
+                        data = json.load(f)
+                except (OSError, ValueError):
+                    continue
+                for name, series in data.items():
+                    metric = by_name.get(name)
+                    if metric is None or not (metric.cumulative or fresh):
+                        continue
+                    for key, value in series:
+                        add(name, tuple(key), value)
+        return merged
+
+    def render(self):
+        merged = self._collect()
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render(merged[metric.name]))
+        return "\n".join(lines) + "\n"
+
+    def _after_fork(self):
+        # القيم المنسوخة من العملية الأم لا تخص العامل، وخيط الكتابة لا ينتقل مع fork
+        self._flusher = None
+        self._lock = threading.Lock()
+        for metric in self._metrics:
+            metric.reset()
+
+
+def _labels(names, values):
+    if not names:
+        return ""
+    pairs = ",".join(f'{n}="{_escape(v)}"' for n, v in zip(names, values))
+    return "{" + pairs + "}"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _number(value):
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+REGISTRY = Registry()
+os.register_at_fork(after_in_child=REGISTRY._after_fork)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def render():
+    return REGISTRY.render()
+
+
+# نقاط القياس
+
+WEBHOOK_REQUESTS = Counter("webhook_requests_total", "Webhook requests by route and command", ("route", "command"))
+WEBHOOK_SECONDS = Histogram("webhook_request_seconds", "Webhook handling time", ("route", "command"))
+DB_QUERY_SECONDS = Histogram("db_query_seconds", "Time spent in service-layer queries", ("query",))
+HTTP_CLIENT_REQUESTS = Counter("http_client_requests_total", "Outbound HTTP calls by service and status",
+                               ("service", "endpoint", "status"))
+HTTP_CLIENT_SECONDS = Histogram("http_client_request_seconds", "Outbound HTTP call latency", ("service", "endpoint"))
+OHLCV_FETCH_SECONDS = Histogram("ohlcv_fetch_seconds", "OHLCV fetch time per symbol", ("source",))
+CANDLE_CACHE_REQUESTS = Counter("candle_cache_requests_total", "Candle cache lookups", ("result",))
+STRATEGY_EVAL_SECONDS = Histogram("strategy_eval_seconds", "Strategy evaluation time per symbol", ("mode",))
+SCAN_CYCLE_SECONDS = Histogram("signal_scan_cycle_seconds", "Full signal scan cycle time",
+                               buckets=(0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0))
+SIGNALS_EMITTED = Counter("signals_emitted_total", "Stored signals by strategy", ("strategy",))
+BROADCAST_SECONDS = Histogram("signal_broadcast_seconds", "Fan-out time of one signal to its subscribers", ("strategy",),
+                              buckets=(0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0))
+BROADCAST_LAG_SECONDS = Histogram("signal_broadcast_lag_seconds", "Time from storing a signal to the end of its broadcast",
+                                  buckets=(0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0, 1800.0))
+RENEWAL_REMINDERS = Counter("renewal_reminders_total", "Renewal reminders by window and result", ("kind", "result"))
+OUTBOX_QUEUE_DEPTH = Gauge("outbox_queue_depth", "Messages waiting in the outbox queue")
+OUTBOX_MESSAGES = Counter("outbox_messages_total", "Outbox messages by result", ("result",))
+OUTBOX_SEND_SECONDS = Histogram("outbox_send_latency_seconds", "Time from enqueue to sent reply",
+                                buckets=(0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0))
@@ -1,12 +1,94 @@
-from sqlalchemy import create_engine, Column, Integer, String, DateTime, Float, JSON, ForeignKey, Boolean
-from sqlalchemy.orm import declarative_base, sessionmaker, relationship
+import os
+import threading
+from contextlib import contextmanager
+
+from sqlalchemy import create_engine, event, inspect, text, Column, Integer, String, DateTime, Float, JSON, ForeignKey, Boolean, Index, UniqueConstraint
+from sqlalchemy.orm import declarative_base, sessionmaker, relationship, scoped_session, Session
 from datetime import datetime
 
-DATABASE_URL = "sqlite:///./market_signals_bot.db"
+from config import DATABASE_URL, DB_POOL_SIZE, DB_MAX_OVERFLOW, SQLITE_BUSY_TIMEOUT_MS
 
 Base = declarative_base()
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
-SessionLocal = sessionmaker(bind=engine)
+
+def make_engine(url=DATABASE_URL):
+    if url.startswith("sqlite"):
+        engine = create_engine(
+            url,
+            connect_args={"check_same_thread": False, "timeout": SQLITE_BUSY_TIMEOUT_MS / 1000},
+        )
+
+        @event.listens_for(engine, "connect")
+        def _sqlite_pragmas(dbapi_connection, connection_record):
+            # WAL يسمح للقراءات بالعمل أثناء الكتابة، و busy_timeout يمنع أخطاء "database is locked" الفورية
+            cursor = dbapi_connection.cursor()
+            if not url.endswith(":memory:") and url not in ("sqlite://", "sqlite:///"):
+                cursor.execute("PRAGMA journal_mode=WAL")
+            cursor.execute("PRAGMA synchronous=NORMAL")
+            cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+            cursor.execute("PRAGMA foreign_keys=ON")
+            cursor.execute("PRAGMA temp_store=MEMORY")
+            cursor.execute("PRAGMA cache_size=-20000")
+            cursor.close()
+
+        return engine
+    return create_engine(
+        url,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_pre_ping=True,
+        pool_recycle=1800,
+    )
+
+_engine = None
+_engine_lock = threading.Lock()
+
+def get_engine():
+    # المحرك (ومجمع الاتصالات) يُنشأ عند أول جلسة وليس عند الاستيراد
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = make_engine()
+    return _engine
+
+def __getattr__(name):
+    # للتوافق مع "from models import engine"
+    if name == "engine":
+        return get_engine()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+class LazySession(Session):
+    """جلسة بدون bind صريح تستخدم المحرك الافتراضي، فيُنشأ عند أول استخدام فقط."""
+
+    def __init__(self, bind=None, **kwargs):
+        super().__init__(bind=bind or get_engine(), **kwargs)
+
+SessionLocal = sessionmaker(class_=LazySession)
+# جلسة لكل خيط/طلب: تُغلق في نهاية الطلب عبر ScopedSession.remove()
+ScopedSession = scoped_session(SessionLocal)
+
+def _after_fork():
+    # اتصالات المجمع لا تُشارك بين العمليات: العامل الابن يبدأ مجمعاً جديداً دون إغلاق اتصالات الأب،
+    # ويتخلى عن أي جلسة منسوخة من الأب بدلاً من إغلاقها
+    global _engine_lock
+    _engine_lock = threading.Lock()
+    if _engine is not None:
+        _engine.dispose(close=False)
+    ScopedSession.registry.clear()
+
+os.register_at_fork(after_in_child=_after_fork)
+
+@contextmanager
+def session_scope():
+    session = SessionLocal()
+    try:
+        yield session
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
 
 class User(Base):
     __tablename__ = "users"
@@ -22,6 +104,13 @@ class User(Base):
 
 class Subscription(Base):
     __tablename__ = "subscriptions"
+    __table_args__ = (
+        # الاستعلامات الساخنة: الاشتراك الفعال لمستخدم، وانتهاء الاشتراكات، والبحث برقم الدفع
+        Index("ix_subscriptions_user_status_end", "user_id", "status", "end_date"),
+        Index("ix_subscriptions_payment_id", "payment_id"),
+        # مسح نطاق end_date للاشتراكات الفعالة: تذكيرات التجديد (renewals.py) ومهمة الانتهاء
+        Index("ix_subscriptions_status_end", "status", "end_date"),
+    )
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"))
     strategy = Column(String, nullable=False, default="strategy_one")
@@ -31,13 +120,21 @@ class Subscription(Base):
     payment_id = Column(String, nullable=True)
     amount = Column(Float, nullable=True)
     currency = Column(String, nullable=True)
+    # فاتورة NowPayments للاشتراك المعلّق: تُعاد لنفس المستخدم بدلاً من إنشاء فاتورة جديدة
+    invoice_id = Column(String, nullable=True, index=True)
+    invoice_url = Column(String, nullable=True)
 
     user = relationship("User", back_populates="subscriptions")
 
 class SignalLog(Base):
     __tablename__ = "signal_logs"
+    __table_args__ = (
+        # /advice يقرأ أحدث إشارات الاستراتيجية
+        Index("ix_signal_logs_strategy_sent_at", "strategy", "sent_at"),
+    )
     id = Column(Integer, primary_key=True, index=True)
-    signal_id = Column(String, nullable=True)
+    signal_id = Column(String, nullable=True, unique=True, index=True)
+    strategy = Column(String, nullable=True)
     symbol = Column(String, nullable=True)
     entry_price = Column(Float, nullable=True)
     tps = Column(JSON, nullable=True)
@@ -47,5 +144,95 @@ class SignalLog(Base):
     admin_id = Column(String, nullable=True)
     notes = Column(String, nullable=True)
 
-def init_db():
-    Base.metadata.create_all(bind=engine)
+class SignalDelivery(Base):
+    __tablename__ = "signal_deliveries"
+    id = Column(Integer, primary_key=True, index=True)
+    signal_log_id = Column(Integer, ForeignKey("signal_logs.id"), index=True)
+    telegram_id = Column(String, nullable=False)
+    ok = Column(Boolean, default=False)
+    status_code = Column(Integer, nullable=True)
+    error = Column(String, nullable=True)
+    attempts = Column(Integer, default=1)
+    sent_at = Column(DateTime, default=datetime.utcnow)
+
+class ScanRun(Base):
+    # توقيت كل دورة فحص لمعرفة ما إذا تجاوز الفحص ميزانية الشمعة (5 دقائق)
+    __tablename__ = "scan_runs"
+    id = Column(Integer, primary_key=True)
+    candle_ts = Column(Integer, nullable=True)
+    started_at = Column(DateTime, default=datetime.utcnow)
+    duration_seconds = Column(Float, nullable=True)
+    symbols = Column(Integer, default=0)
+    signals = Column(Integer, default=0)
+    overran = Column(Boolean, default=False)
+    # إشارات دورات سابقة ما زالت تنتظر البث عند انتهاء هذه الدورة: البث لا يواكب الشموع
+    broadcast_backlog = Column(Integer, default=0)
+
+class ProcessedPayment(Base):
+    # سجل IPN المعالجة: الفهرس الفريد على payment_id يضمن أن الدفعة الواحدة تُفعّل مرة واحدة فقط
+    __tablename__ = "processed_payments"
+    id = Column(Integer, primary_key=True)
+    payment_id = Column(String, unique=True, index=True, nullable=False)
+    payment_status = Column(String, nullable=True)
+    order_id = Column(String, nullable=True)
+    subscription_id = Column(Integer, ForeignKey("subscriptions.id"), nullable=True)
+    processed_at = Column(DateTime, default=datetime.utcnow)
+
+class RenewalReminder(Base):
+    # تذكير التجديد يُسجَّل قبل إرساله: الفهرس الفريد يضمن تذكيراً واحداً لكل اشتراك ونافذة (kind)
+    __tablename__ = "renewal_reminders"
+    __table_args__ = (
+        UniqueConstraint("subscription_id", "kind", name="uq_renewal_reminders_subscription_kind"),
+    )
+    id = Column(Integer, primary_key=True)
+    subscription_id = Column(Integer, ForeignKey("subscriptions.id"), nullable=False)
+    kind = Column(String, nullable=False)  # مثل 3d و 1d: عدد الأيام قبل end_date
+    telegram_id = Column(String, nullable=False)
+    # الاشتراك المعلّق الذي أُنشئت له فاتورة التجديد
+    renewal_subscription_id = Column(Integer, ForeignKey("subscriptions.id"), nullable=True)
+    invoice_url = Column(String, nullable=True)
+    status = Column(String, default="claimed")  # claimed, sent, failed
+    status_code = Column(Integer, nullable=True)
+    error = Column(String, nullable=True)
+    # عدد دورات الإرسال؛ renewals.due يعيد اختيار الفاشل بخطأ مؤقت حتى RENEWAL_MAX_ATTEMPTS
+    attempts = Column(Integer, default=1)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    sent_at = Column(DateTime, nullable=True)
+
+# أعمدة أضيفت بعد إنشاء الجداول القديمة (جداول app.py السابقة لم تحتوِ strategy و is_admin)
+_ADDED_COLUMNS = {
+    "users": {"is_admin": "BOOLEAN DEFAULT 0"},
+    "subscriptions": {
+        "strategy": "VARCHAR NOT NULL DEFAULT 'strategy_one'",
+        "invoice_id": "VARCHAR",
+        "invoice_url": "VARCHAR",
+    },
+    "signal_logs": {"strategy": "VARCHAR"},
+    "scan_runs": {"broadcast_backlog": "INTEGER DEFAULT 0"},
+    "renewal_reminders": {"attempts": "INTEGER DEFAULT 1"},
+}
+
+def _upgrade_schema(bind):
+    inspector = inspect(bind)
+    with bind.begin() as conn:
+        for table, columns in _ADDED_COLUMNS.items():
+            if not inspector.has_table(table):
+                continue
+            existing = {c["name"] for c in inspector.get_columns(table)}
+            for name, ddl in columns.items():
+                if name not in existing:
+                    conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {name} {ddl}"))
+    # create_all لا يضيف الفهارس الجديدة لجداول موجودة مسبقاً
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=bind, checkfirst=True)
+
+def init_db(bind=None):
+    # لا يُستدعى عند الاستيراد: يشغله "python manage.py init-db" (أو migrate) مرة عند النشر
+    bind = bind or get_engine()
+    Base.metadata.create_all(bind=bind)
+    _upgrade_schema(bind)
+
+def migrate(bind=None):
+    """يضيف الأعمدة والفهارس الجديدة لقاعدة موجودة دون إنشاء جداول."""
+    _upgrade_schema(bind or get_engine())
@@ -1,45 +1,189 @@
 # nowpayments.py
-import requests
+# عميل NowPayments واحد: جلسة keep-alive مشتركة، مهلات محددة، وإعادة المحاولة مع jitter على 5xx و 429
+# requests / httpx تُستورد داخل العميل الذي يحتاجها: webhook يستورد هذه الوحدة للتحقق من IPN فقط
+import asyncio
 import os
+import random
+import time
 import hmac
 import hashlib
 
-from config import NOWPAYMENTS_API_KEY, NOWPAYMENTS_IPN_SECRET
+from config import NOWPAYMENTS_API_KEY, NOWPAYMENTS_IPN_SECRET, NOWPAYMENTS_API_BASE
+import metrics
 
-NOWPAYMENTS_API_URL = "https://api.nowpayments.io/v1/invoice"
+RETRY_STATUSES = {429, 500, 502, 503, 504}
 
-HEADERS = {
-    "x-api-key": NOWPAYMENTS_API_KEY,
-    "Content-Type": "application/json"
-}
+# order_id لفواتير الاشتراكات: البادئة تميزها عن order_id القديم الذي كان telegram_id للمستخدم
+ORDER_PREFIX = "sub-"
 
-def create_invoice(subscription_id: int, amount_usd: float, pay_currency: str = "usdt", ipn_callback_url: str = None):
-    """
-    ينشئ فاتورة في NowPayments ويرجع (invoice_url, invoice_id) أو (None, None)
-    subscription_id: سنستخدمه كـ order_id لربط الفاتورة بالاشتراك في DB
-    """
-    if ipn_callback_url is None:
-        ipn_callback_url = os.getenv("NOWPAYMENTS_IPN_CALLBACK_URL")
 
+def subscription_order_id(subscription_id):
+    return f"{ORDER_PREFIX}{subscription_id}"
+
+
+def parse_subscription_order_id(order_id):
+    """يرجع رقم الاشتراك من order_id بالبادئة، أو None لأي order_id آخر."""
+    order_id = str(order_id or "")
+    if order_id.startswith(ORDER_PREFIX) and order_id[len(ORDER_PREFIX):].isdigit():
+        return int(order_id[len(ORDER_PREFIX):])
+    return None
+
+
+def invoice_payload(order_id, price_amount, price_currency="usd", pay_currency=None, order_description=None,
+                    ipn_callback_url=None, success_url=None, cancel_url=None):
     payload = {
-        "price_amount": amount_usd,
-        "price_currency": "usd",       # السعر مقيم بالدولار
-        "pay_currency": pay_currency,  # العملة التي يريد الدفع بها (usdt الخ)
-        "order_id": str(subscription_id),
-        "order_description": f"Subscription #{subscription_id}",
-        "ipn_callback_url": ipn_callback_url
+        "price_amount": price_amount,
+        "price_currency": price_currency,
+        "order_id": str(order_id),
+        "order_description": order_description or f"Subscription #{parse_subscription_order_id(order_id) or order_id}",
+        "ipn_callback_url": ipn_callback_url or os.getenv("NOWPAYMENTS_IPN_CALLBACK_URL"),
     }
+    if pay_currency:
+        payload["pay_currency"] = pay_currency
+    success_url = success_url or os.getenv("NOWPAYMENTS_SUCCESS_URL")
+    cancel_url = cancel_url or os.getenv("NOWPAYMENTS_CANCEL_URL")
+    if success_url:
+        payload["success_url"] = success_url
+    if cancel_url:
+        payload["cancel_url"] = cancel_url
+    return payload
+
+
+def parse_invoice(data):
+    # data يحتوي على keys مثل: id, invoice_url, etc.
+    invoice_url = data.get("invoice_url")
+    invoice_id = data.get("id") or data.get("invoice_id") or data.get("payment_id")
+    return invoice_url, (str(invoice_id) if invoice_id is not None else None)
+
+
+def _backoff(attempt, retry_after=None):
+    if retry_after:
+        return retry_after
+    # exponential backoff مع full jitter حتى لا تعيد كل العمليات المحاولة في نفس اللحظة
+    return random.uniform(0, min(8.0, 0.5 * (2 ** attempt)))
+
+
+def _retry_after(headers):
     try:
-        resp = requests.post(NOWPAYMENTS_API_URL, headers=HEADERS, json=payload, timeout=15)
-        resp.raise_for_status()
-        data = resp.json()
-        # data يحتوي على keys مثل: id, invoice_url, etc.
-        invoice_url = data.get("invoice_url")
-        invoice_id = data.get("id") or data.get("invoice_id") or data.get("payment_id")
-        return invoice_url, invoice_id
-    except Exception as e:
-        print(f"[nowpayments] create_invoice error: {e}")
-        return None, None
+        return float(headers.get("Retry-After"))
+    except (TypeError, ValueError):
+        return None
+
+
+def _record(path, started, status):
+    metrics.HTTP_CLIENT_SECONDS.observe(time.perf_counter() - started, service="nowpayments", endpoint=path)
+    metrics.HTTP_CLIENT_REQUESTS.inc(service="nowpayments", endpoint=path, status=status)
+
+
+class NowPaymentsClient:
+
+    def __init__(self, api_base=None, api_key=None, timeout=(3.05, 15), max_retries=3, pool_size=10):
+        self.api_base = api_base or NOWPAYMENTS_API_BASE
+        self.timeout = timeout
+        self.max_retries = max_retries
+        import requests
+        from requests.adapters import HTTPAdapter
+        self.session = requests.Session()
+        self.session.headers.update({"x-api-key": api_key or NOWPAYMENTS_API_KEY or "", "Content-Type": "application/json"})
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def _post(self, path, payload):
+        import requests
+        for attempt in range(self.max_retries + 1):
+            started = time.perf_counter()
+            try:
+                resp = self.session.post(f"{self.api_base}{path}", json=payload, timeout=self.timeout)
+            except requests.RequestException as e:
+                _record(path, started, "error")
+                if attempt == self.max_retries:
+                    raise
+                print(f"[nowpayments] {path} attempt {attempt + 1} failed: {e}")
+                time.sleep(_backoff(attempt))
+                continue
+            _record(path, started, resp.status_code)
+            if resp.status_code in RETRY_STATUSES and attempt < self.max_retries:
+                time.sleep(_backoff(attempt, _retry_after(resp.headers)))
+                continue
+            resp.raise_for_status()
+            return resp.json()
+
+    def create_invoice(self, order_id, price_amount, **kwargs):
+        """يرجع (invoice_url, invoice_id) أو (None, None) عند الفشل."""
+        try:
+            return parse_invoice(self._post("/invoice", invoice_payload(order_id, price_amount, **kwargs)))
+        except Exception as e:
+            print(f"[nowpayments] create_invoice error: {e}")
+            return None, None
+
+
+class AsyncNowPaymentsClient:
+    """نفس NowPaymentsClient لكن عبر httpx.AsyncClient لاستخدامه من معالجات bot.py."""
+
+    def __init__(self, api_base=None, api_key=None, timeout=15.0, max_retries=3, pool_size=10):
+        self.api_base = api_base or NOWPAYMENTS_API_BASE
+        self.max_retries = max_retries
+        import httpx
+        self._client = httpx.AsyncClient(
+            timeout=httpx.Timeout(timeout, connect=3.05),
+            limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size),
+            headers={"x-api-key": api_key or NOWPAYMENTS_API_KEY or "", "Content-Type": "application/json"},
+        )
+
+    async def _post(self, path, payload):
+        import httpx
+        for attempt in range(self.max_retries + 1):
+            started = time.perf_counter()
+            try:
+                resp = await self._client.post(f"{self.api_base}{path}", json=payload)
+            except httpx.TransportError as e:
+                _record(path, started, "error")
+                if attempt == self.max_retries:
+                    raise
+                print(f"[nowpayments] {path} attempt {attempt + 1} failed: {e}")
+                await asyncio.sleep(_backoff(attempt))
+                continue
+            _record(path, started, resp.status_code)
+            if resp.status_code in RETRY_STATUSES and attempt < self.max_retries:
+                await asyncio.sleep(_backoff(attempt, _retry_after(resp.headers)))
+                continue
+            resp.raise_for_status()
+            return resp.json()
+
+    async def create_invoice(self, order_id, price_amount, **kwargs):
+        try:
+            return parse_invoice(await self._post("/invoice", invoice_payload(order_id, price_amount, **kwargs)))
+        except Exception as e:
+            print(f"[nowpayments] create_invoice error: {e}")
+            return None, None
+
+    async def aclose(self):
+        await self._client.aclose()
+
+
+_client = None
+
+
+def get_client():
+    global _client
+    if _client is None:
+        _client = NowPaymentsClient()
+    return _client
+
+
+def create_invoice(subscription_id: int, amount_usd: float, pay_currency: str = "usdt", ipn_callback_url: str = None):
+    """
+    ينشئ فاتورة في NowPayments ويرجع (invoice_url, invoice_id) أو (None, None)
+    subscription_id: يُرسل كـ order_id بالبادئة sub- لربط الفاتورة بالاشتراك في DB
+    """
+    return get_client().create_invoice(
+        subscription_order_id(subscription_id),
+        amount_usd,
+        price_currency="usd",          # السعر مقيم بالدولار
+        pay_currency=pay_currency,     # العملة التي يريد الدفع بها (usdt الخ)
+        ipn_callback_url=ipn_callback_url,
+    )
 
 def verify_nowpayments_signature(raw_body: bytes, signature_header: str) -> bool:
     """
@@ -0,0 +1,142 @@
+# okx_async.py
+# طبقة جلب شموع غير متزامنة: جلسة HTTP واحدة بمجمع اتصالات، تزامن محدود، ومحدد معدل بأوزان OKX
+import asyncio
+import random
+import time
+
+import httpx
+
+from config import OKX_BASE_URL, OKX_CONCURRENCY, OKX_RATE_PER_SECOND, OKX_RATE_BURST
+from ratelimit import AsyncTokenBucket
+import metrics
+
+CANDLES_PATH = "/api/v5/market/candles"
+MAX_CANDLES_PER_REQUEST = 300
+
+# OKX يستخدم حروفاً كبيرة للساعات والأيام
+BAR_NAMES = {"1h": "1H", "2h": "2H", "4h": "4H", "6h": "6H", "12h": "12H", "1d": "1D", "1w": "1W"}
+
+
+def okx_inst_id(symbol):
+    return symbol.replace("/", "-").upper()
+
+
+def parse_candles(rows):
+    # OKX يرجع الأحدث أولاً كنصوص: [ts, o, h, l, c, vol, ...]؛ نعيدها بصيغة fetch_ohlcv تصاعدياً
+    candles = [
+        [int(row[0]), float(row[1]), float(row[2]), float(row[3]), float(row[4]), float(row[5])]
+        for row in rows
+    ]
+    candles.reverse()
+    return candles
+
+
+class AsyncOHLCVFetcher:
+    """
+    يستخدم من داخل حلقة asyncio (مثل تطبيق bot.py) عبر await fetch_many(...)،
+    ومن الكود المتزامن عبر fetch_many_sync(...).
+    """
+
+    def __init__(self, base_url=None, concurrency=None, rate=None, burst=None,
+                 timeout=10.0, max_retries=4, client=None):
+        self.base_url = base_url or OKX_BASE_URL
+        self.concurrency = concurrency or OKX_CONCURRENCY
+        self.max_retries = max_retries
+        self._timeout = timeout
+        self._client = client
+        self._owns_client = client is None
+        self._bucket = AsyncTokenBucket(rate or OKX_RATE_PER_SECOND, burst or OKX_RATE_BURST)
+        self.requests = 0
+        self.throttled = 0
+        self.last_scan_seconds = None
+
+    def _get_client(self):
+        if self._client is None:
+            limits = httpx.Limits(max_connections=self.concurrency, max_keepalive_connections=self.concurrency)
+            self._client = httpx.AsyncClient(base_url=self.base_url, timeout=self._timeout, limits=limits)
+        return self._client
+
+    async def aclose(self):
+        if self._client is not None and self._owns_client:
+            await self._client.aclose()
+            self._client = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.aclose()
+
+    async def fetch_ohlcv(self, symbol, timeframe="5m", limit=100):
+        # الزمن يشمل انتظار محدد المعدل وإعادة المحاولات، أي ما يراه الفحص فعلاً
+        with metrics.OHLCV_FETCH_SECONDS.time(source="okx_async"):
+            return await self._fetch_ohlcv(symbol, timeframe, limit)
+
+    async def _fetch_ohlcv(self, symbol, timeframe, limit):
+        params = {
+            "instId": okx_inst_id(symbol),
+            "bar": BAR_NAMES.get(timeframe, timeframe),
+            "limit": str(min(limit, MAX_CANDLES_PER_REQUEST)),
+        }
+        client = self._get_client()
+        for attempt in range(self.max_retries + 1):
+            await self._bucket.acquire()
+            self.requests += 1
+            try:
+                resp = await client.get(CANDLES_PATH, params=params)
+            except httpx.TransportError as e:
+                if attempt == self.max_retries:
+                    print(f"[okx_async] fetch_ohlcv {symbol} error: {e}")
+                    return []
+                await asyncio.sleep(_backoff(attempt))
+                continue
+            if resp.status_code == 429 or resp.status_code >= 500:
+                if resp.status_code == 429:
+                    self.throttled += 1
+                    self._bucket.drain()
+                if attempt == self.max_retries:
+                    print(f"[okx_async] fetch_ohlcv {symbol} gave up after HTTP {resp.status_code}")
+                    return []
+                await asyncio.sleep(_retry_after(resp) or _backoff(attempt))
+                continue
+            if resp.status_code != 200:
+                print(f"[okx_async] fetch_ohlcv {symbol} HTTP {resp.status_code}")
+                return []
+            body = resp.json()
+            if body.get("code") not in ("0", 0):
+                print(f"[okx_async] fetch_ohlcv {symbol} error: {body.get('msg')}")
+                return []
+            return parse_candles(body.get("data") or [])
+        return []
+
+    async def fetch_many(self, symbols, timeframe="5m", limit=100):
+        """يرجع {symbol: candles} لكل الرموز مع احترام حد التزامن وحد المعدل."""
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def one(symbol):
+            async with semaphore:
+                return symbol, await self.fetch_ohlcv(symbol, timeframe, limit)
+
+        started = time.perf_counter()
+        results = await asyncio.gather(*(one(s) for s in symbols))
+        self.last_scan_seconds = time.perf_counter() - started
+        return dict(results)
+
+
+def _retry_after(resp):
+    value = resp.headers.get("Retry-After")
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+def _backoff(attempt):
+    return min(8.0, 0.25 * (2 ** attempt)) * (0.5 + random.random() / 2)
+
+
+def fetch_many_sync(symbols, timeframe="5m", limit=100, **kwargs):
+    async def run():
+        async with AsyncOHLCVFetcher(**kwargs) as fetcher:
+            return await fetcher.fetch_many(symbols, timeframe, limit)
+    return asyncio.run(run())
@@ -0,0 +1,160 @@
+# outbox.py
+# طابور رسائل صادرة مع عمال في الخلفية: الـ webhook يضيف الرسالة ويرجع فوراً،
+# والعمال يرسلونها عبر TelegramClient (جلسة مشتركة، مهلات، إعادة محاولة)
+import os
+import queue
+import threading
+import time
+from collections import deque
+
+from config import OUTBOX_WORKERS, OUTBOX_MAX_QUEUE, OUTBOX_COALESCE
+import metrics
+
+TELEGRAM_MAX_MESSAGE_LENGTH = 4096
+
+
+class Outbox:
+    """
+    coalesce: إذا وصلت عدة رسائل لنفس المحادثة قبل إرسال الأولى تُدمج في رسالة واحدة.
+    """
+
+    def __init__(self, client=None, workers=OUTBOX_WORKERS, max_queue=OUTBOX_MAX_QUEUE, coalesce=OUTBOX_COALESCE):
+        self._client = client
+        self._owns_client = client is None
+        self.workers = workers
+        self.coalesce = coalesce
+        self.max_queue = max_queue
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._threads = []
+        self._latencies = deque(maxlen=1000)
+        self.enqueued = 0
+        self.sent = 0
+        self.failed = 0
+        self.dropped = 0
+        self.coalesced = 0
+
+    @property
+    def client(self):
+        if self._client is None:
+            # telegram_client (و requests) يُحمّل مع أول رسالة وليس عند استيراد app
+            from telegram_client import get_client
+            self._client = get_client()
+        return self._client
+
+    def start(self):
+        with self._lock:
+            if self._threads:
+                return
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._run, name=f"outbox-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def enqueue(self, chat_id, text):
+        if not self._threads:
+            self.start()
+        now = time.monotonic()
+        with self._lock:
+            self.enqueued += 1
+            if self.coalesce:
+                pending = self._pending.get(chat_id)
+                if pending is not None:
+                    pending.append(text)
+                    self.coalesced += 1
+                    metrics.OUTBOX_MESSAGES.inc(result="coalesced")
+                    return True
+                self._pending[chat_id] = [text]
+        try:
+            self._queue.put_nowait((chat_id, text, now))
+            return True
+        except queue.Full:
+            with self._lock:
+                self._pending.pop(chat_id, None)
+                self.dropped += 1
+            metrics.OUTBOX_MESSAGES.inc(result="dropped")
+            print(f"[outbox] queue full, dropped message to {chat_id}")
+            return False
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                self._queue.task_done()
+                return
+            chat_id, text, enqueued_at = item
+            if self.coalesce:
+                with self._lock:
+                    texts = self._pending.pop(chat_id, [text])
+            else:
+                texts = [text]
+            try:
+                for chunk in _chunks("\n\n".join(texts)):
+                    result = self.client.send_message(chat_id, chunk)
+                    if result.ok:
+                        self.sent += 1
+                        metrics.OUTBOX_MESSAGES.inc(result="sent")
+                    else:
+                        self.failed += 1
+                        metrics.OUTBOX_MESSAGES.inc(result="failed")
+                        print(f"[outbox] send to {chat_id} failed: {result.status_code} {result.error}")
+            except Exception as e:
+                self.failed += 1
+                metrics.OUTBOX_MESSAGES.inc(result="failed")
+                print(f"[outbox] send to {chat_id} error: {e}")
+            latency = time.monotonic() - enqueued_at
+            self._latencies.append(latency)
+            metrics.OUTBOX_SEND_SECONDS.observe(latency)
+            self._queue.task_done()
+
+    def join(self):
+        self._queue.join()
+
+    def stop(self):
+        threads, self._threads = self._threads, []
+        for _ in threads:
+            self._queue.put(None)
+        for thread in threads:
+            thread.join(timeout=5)
+
+    def _after_fork(self):
+        # خيوط العمال لا تنتقل للعملية الابن: طابور فارغ جديد، والخيوط تبدأ عند أول رسالة
+        self._queue = queue.Queue(maxsize=self.max_queue)
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._threads = []
+        if self._owns_client:
+            self._client = None
+
+    def stats(self):
+        latencies = sorted(self._latencies)
+        return {
+            "queue_depth": self._queue.qsize(),
+            "enqueued": self.enqueued,
+            "sent": self.sent,
+            "failed": self.failed,
+            "dropped": self.dropped,
+            "coalesced": self.coalesced,
+            "send_latency_p50": _percentile(latencies, 50),
+            "send_latency_p99": _percentile(latencies, 99),
+        }
+
+
+def _chunks(text, size=TELEGRAM_MAX_MESSAGE_LENGTH):
+    return [text[i:i + size] for i in range(0, len(text), size)] or [text]
+
+
+def _percentile(ordered, pct):
+    if not ordered:
+        return None
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+outbox = Outbox()
+os.register_at_fork(after_in_child=outbox._after_fork)
+metrics.OUTBOX_QUEUE_DEPTH.set_function(lambda: outbox._queue.qsize())
+
+
+def send_message(chat_id, text):
+    return outbox.enqueue(chat_id, text)
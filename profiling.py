@@ -0,0 +1,69 @@
+# profiling.py
+# مُحلل بالعينات خفيف لدورة فحص الإشارات: خيط يأخذ stack الخيط المستهدف كل بضع ميلي ثوانٍ
+# ويكتب النتيجة بصيغة stacks مطوية (سطر لكل مسار: "a;b;c عدد") تقرأها أدوات flamegraph / speedscope
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+from config import SCAN_PROFILE_DIR, SCAN_PROFILE_INTERVAL_MS
+
+
+class SamplingProfiler:
+
+    def __init__(self, interval_ms=SCAN_PROFILE_INTERVAL_MS, thread_id=None):
+        self.interval = interval_ms / 1000.0
+        self.thread_id = thread_id or threading.get_ident()
+        self.samples = Counter()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _sample(self):
+        frame = sys._current_frames().get(self.thread_id)
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+            frame = frame.f_back
+        if stack:
+            self.samples[";".join(reversed(stack))] += 1
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def folded(self):
+        return "".join(f"{stack} {count}\n" for stack, count in self.samples.most_common())
+
+    def write(self, path):
+        with open(path, "w") as f:
+            f.write(self.folded())
+        return path
+
+
+@contextmanager
+def maybe_profile(name, directory=SCAN_PROFILE_DIR):
+    """يحلل الكتلة فقط إذا ضُبط SCAN_PROFILE_DIR؛ غير ذلك لا يكلف شيئاً."""
+    if not directory:
+        yield None
+        return
+    profiler = SamplingProfiler().start()
+    try:
+        yield profiler
+    finally:
+        profiler.stop()
+        os.makedirs(directory, exist_ok=True)
+        path = profiler.write(os.path.join(directory, f"{name}-{int(time.time())}.folded"))
+        print(f"[profiling] {sum(profiler.samples.values())} samples written to {path}")
@@ -0,0 +1,194 @@
+# ratelimit.py
+# محددات معدل بخوارزمية token bucket
+import asyncio
+import fcntl
+import mmap
+import os
+import struct
+import threading
+import time
+from contextlib import contextmanager
+
+
+class AsyncTokenBucket:
+    """
+    rate: عدد الرموز (tokens) المضافة في الثانية، capacity: أقصى رصيد (حجم الدفعة المسموح بها).
+    acquire(weight) تنتظر حتى يتوفر وزن الطلب كاملاً.
+    """
+
+    def __init__(self, rate, capacity, clock=time.monotonic):
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self._clock = clock
+        self._tokens = float(capacity)
+        self._updated = clock()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = self._clock()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self, weight=1):
+        async with self._lock:
+            while True:
+                self._refill()
+                if self._tokens >= weight:
+                    self._tokens -= weight
+                    return
+                await asyncio.sleep((weight - self._tokens) / self.rate)
+
+    def drain(self):
+        # تُستدعى عند استلام 429: البورصة ترى أننا تجاوزنا الحد فنفرغ الرصيد
+        self._tokens = 0.0
+        self._updated = self._clock()
+
+
+class TokenBucket:
+    """نسخة متزامنة آمنة للخيوط من AsyncTokenBucket، مع إمكانية الإيقاف المؤقت عند 429."""
+
+    def __init__(self, rate, capacity, clock=time.monotonic, sleep=time.sleep):
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self._clock = clock
+        self._sleep = sleep
+        self._tokens = float(capacity)
+        self._updated = clock()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def _reserve(self, weight):
+        # يحجز الوزن ويرجع مدة الانتظار اللازمة قبل الإرسال (قد يصبح الرصيد سالباً مؤقتاً)
+        with self._lock:
+            now = self._clock()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= weight
+            wait = 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+            return max(wait, self._paused_until - now)
+
+    def acquire(self, weight=1):
+        wait = self._reserve(weight)
+        if wait > 0:
+            self._sleep(wait)
+
+    def pause(self, seconds):
+        with self._lock:
+            self._paused_until = max(self._paused_until, self._clock() + seconds)
+
+
+class SharedTokenBucket:
+    """
+    رصيد واحد مشترك بين كل عمليات الخادم عبر ملف mmap (path)، أو داخل العملية فقط بدونه.
+    acquire(reserve=0): أولوية عالية، تحجز فوراً ولو صار الرصيد سالباً ثم تنتظر (مثل TokenBucket).
+    acquire(reserve=n): أولوية منخفضة، تأخذ فقط ما يبقي n رمزاً في الرصيد، فأصحاب الأولوية العالية
+    يأخذون كل ما يحتاجونه أولاً ويستهلكون ما يتركه الآخرون.
+    """
+    # الرصيد، وقت آخر تحديث، الإيقاف حتى (بساعة monotonic المشتركة بين العمليات)، علامة التهيئة
+    _STATE = struct.Struct("dddQ")
+
+    def __init__(self, rate, capacity, path=None, clock=time.monotonic, sleep=time.sleep):
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self.path = path or None
+        self._clock = clock
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        self._fd = None
+        if self.path:
+            self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+            if os.fstat(self._fd).st_size < self._STATE.size:
+                os.ftruncate(self._fd, self._STATE.size)
+            self._buf = mmap.mmap(self._fd, self._STATE.size, mmap.MAP_SHARED, mmap.PROT_READ | mmap.PROT_WRITE)
+        else:
+            self._buf = bytearray(self._STATE.size)
+        os.register_at_fork(after_in_child=self._after_fork)
+
+    @contextmanager
+    def _locked(self):
+        # قفل الخيوط داخل العملية ثم قفل الملف بين العمليات (lockf لا يفصل بين خيوط العملية الواحدة)
+        with self._lock:
+            if self._fd is None:
+                yield
+                return
+            fcntl.lockf(self._fd, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.lockf(self._fd, fcntl.LOCK_UN)
+
+    def _load(self, now):
+        tokens, updated, paused_until, ready = self._STATE.unpack_from(self._buf)
+        if not ready or now < updated:
+            # ملف جديد، أو ملف من قبل إعادة تشغيل الجهاز (الساعة بدأت من الصفر)
+            return self.capacity, 0.0
+        return min(self.capacity, tokens + (now - updated) * self.rate), paused_until
+
+    def _store(self, tokens, now, paused_until):
+        self._STATE.pack_into(self._buf, 0, tokens, now, paused_until, 1)
+
+    def _take(self, weight, reserve):
+        # يرجع (مدة الانتظار، هل حُجز الوزن)
+        with self._locked():
+            now = self._clock()
+            tokens, paused_until = self._load(now)
+            taken = False
+            wait = paused_until - now
+            if wait <= 0:
+                if not reserve:
+                    tokens -= weight
+                    taken = True
+                    wait = 0.0 if tokens >= 0 else -tokens / self.rate
+                elif tokens - weight >= reserve - 1e-9:  # بقايا تقريب إعادة التعبئة لا تؤخر الحجز
+                    tokens -= weight
+                    taken = True
+                    wait = 0.0
+                else:
+                    wait = (reserve + weight - tokens) / self.rate
+            self._store(tokens, now, paused_until)
+            return wait, taken
+
+    def acquire(self, weight=1, reserve=0.0):
+        while True:
+            wait, taken = self._take(weight, reserve)
+            if wait > 0:
+                self._sleep(wait)
+            if taken:
+                return
+
+    def pause(self, seconds):
+        with self._locked():
+            now = self._clock()
+            tokens, paused_until = self._load(now)
+            self._store(tokens, now, max(paused_until, now + seconds))
+
+    def _after_fork(self):
+        # الـ mmap يبقى مشتركاً في العملية الابن؛ قفل الخيوط قد يكون منسوخاً وهو مأخوذ
+        self._lock = threading.Lock()
+
+
+class KeyedRateLimiter:
+    """حد أدنى للفاصل بين طلبين لنفس المفتاح (مثلاً لكل محادثة في تيليجرام)."""
+
+    def __init__(self, min_interval, max_keys=100000, clock=time.monotonic, sleep=time.sleep):
+        self.min_interval = float(min_interval)
+        self.max_keys = max_keys
+        self._clock = clock
+        self._sleep = sleep
+        self._next_allowed = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, key):
+        with self._lock:
+            now = self._clock()
+            allowed = self._next_allowed.get(key, now)
+            start = max(now, allowed)
+            self._next_allowed[key] = start + self.min_interval
+            if len(self._next_allowed) > self.max_keys:
+                self._prune(now)
+        if start > now:
+            self._sleep(start - now)
+
+    def _prune(self, now):
+        for key in [k for k, t in self._next_allowed.items() if t <= now]:
+            del self._next_allowed[key]
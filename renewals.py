@@ -0,0 +1,293 @@
+# renewals.py
+# تذكيرات التجديد قبل انتهاء الاشتراك، مع فاتورة تجديد جاهزة في الرسالة:
+# - الاختيار بمسح نطاق على الفهرس (status, end_date) لكل نافذة، بدفعات keyset (end_date, id)،
+#   فالكلفة تتبع عدد الاشتراكات القريبة من الانتهاء وليس حجم الجدول
+# - فاتورة NowPayments على اشتراك معلّق يُعاد استخدامه (نفس منطق /subscribe)، بمعدل محدود
+# - سجل renewal_reminders يُكتب قبل إنشاء الفواتير والإرسال، والفهرس الفريد (subscription_id, kind) يمنع التكرار:
+#   دورتان متداخلتان لا تنشئان فاتورتين لنفس المستخدم، وانقطاع بعد التسجيل يعني تذكيراً مفقوداً وليس مكرراً
+# - الفشل المؤقت (5xx، 429، انقطاع) يُعاد في الدورات التالية حتى RENEWAL_MAX_ATTEMPTS؛ 400/403 لا يُعاد
+# - الإرسال عبر TelegramClient (حدوده العامة ولكل محادثة) بعدة خيوط، والنتائج تُسجل دفعة واحدة
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from sqlalchemy import and_, bindparam, exists, insert, or_, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, aliased
+
+from config import (RENEWAL_REMINDER_DAYS, RENEWAL_BATCH_SIZE, RENEWAL_WORKERS, RENEWAL_INVOICE_RATE,
+                    RENEWAL_MAX_ATTEMPTS)
+from models import User, Subscription, RenewalReminder, session_scope
+from nowpayments import subscription_order_id
+from ratelimit import TokenBucket
+from strategies import STRATEGIES
+import metrics
+
+# attempts: None لتذكير جديد، أو عدد محاولات تذكير سابق فشل بخطأ مؤقت
+Candidate = namedtuple("Candidate", ["subscription_id", "user_id", "telegram_id", "strategy", "end_date", "attempts"])
+# اشتراك التجديد المعلّق وفاتورته
+Renewal = namedtuple("Renewal", ["subscription_id", "amount", "invoice_url", "invoice_id"])
+
+
+def windows(days=RENEWAL_REMINDER_DAYS):
+    """
+    [(kind, من يوم, إلى يوم)] قبل end_date. النوافذ لا تتداخل: اشتراك ينتهي بعد 12 ساعة
+    يأخذ تذكير 1d فقط وليس 3d أيضاً.
+    """
+    days = sorted(days)
+    return [(f"{d}d", lo, d) for lo, d in zip([0] + days, days)]
+
+
+def retryable(max_attempts=RENEWAL_MAX_ATTEMPTS):
+    """تذكير فشل بخطأ مؤقت ولم يستنفد محاولاته: بلا رد (انقطاع/مهلة)، 429، أو 5xx."""
+    return and_(
+        RenewalReminder.status == "failed",
+        RenewalReminder.attempts < max_attempts,
+        or_(RenewalReminder.status_code.is_(None), RenewalReminder.status_code == 429,
+            RenewalReminder.status_code >= 500),
+    )
+
+
+def due(db: Session, kind, start, end, after=None, limit=RENEWAL_BATCH_SIZE, max_attempts=RENEWAL_MAX_ATTEMPTS):
+    """
+    الاشتراكات الفعالة التي ينتهي تاريخها في (start, end] ولم يُرسل لها تذكير kind
+    (أو فشل إرساله بخطأ مؤقت)، مرتبة حسب (end_date, id) وبعد المؤشر after.
+    """
+    later = aliased(Subscription)
+    stmt = (
+        select(Subscription.id, Subscription.user_id, User.telegram_id, Subscription.strategy, Subscription.end_date,
+               RenewalReminder.attempts)
+        .join(User, User.id == Subscription.user_id)
+        .outerjoin(RenewalReminder, and_(RenewalReminder.subscription_id == Subscription.id,
+                                         RenewalReminder.kind == kind))
+        .where(Subscription.status == "active")
+        .where(Subscription.end_date > start, Subscription.end_date <= end)
+        .where(or_(RenewalReminder.id.is_(None), retryable(max_attempts)))
+        # جدد المستخدم مسبقاً: اشتراك فعال آخر له ينتهي بعد هذا
+        .where(~exists().where(
+            later.user_id == Subscription.user_id,
+            later.status == "active",
+            later.end_date > Subscription.end_date,
+        ))
+        .order_by(Subscription.end_date, Subscription.id)
+        .limit(limit)
+    )
+    if after is not None:
+        end_date, subscription_id = after
+        stmt = stmt.where(or_(
+            Subscription.end_date > end_date,
+            and_(Subscription.end_date == end_date, Subscription.id > subscription_id),
+        ))
+    return [Candidate(*row) for row in db.execute(stmt)]
+
+
+def pending_renewals(db: Session, candidates):
+    """
+    اشتراك معلّق واحد لكل (مستخدم، استراتيجية): الموجود يُعاد مع فاتورته، والناقص يُنشأ دفعة واحدة.
+    يرجع {(user_id, strategy): Renewal}.
+    """
+    keys = {(c.user_id, c.strategy) for c in candidates if c.strategy in STRATEGIES}
+    renewals = {}
+    if not keys:
+        return renewals
+    rows = db.execute(
+        select(Subscription.user_id, Subscription.strategy, Subscription.id, Subscription.amount,
+               Subscription.invoice_url, Subscription.invoice_id)
+        .where(Subscription.user_id.in_({user_id for user_id, _ in keys}))
+        .where(Subscription.status == "pending")
+        .order_by(Subscription.id)
+    )
+    for user_id, strategy, *renewal in rows:
+        if (user_id, strategy) in keys:
+            renewals[(user_id, strategy)] = Renewal(*renewal)
+    missing = [key for key in keys if key not in renewals]
+    if missing:
+        created = db.execute(
+            insert(Subscription).returning(Subscription.id, Subscription.user_id, Subscription.strategy),
+            [
+                {"user_id": user_id, "strategy": strategy, "amount": STRATEGIES[strategy].price_usd,
+                 "currency": "USDT", "status": "pending"}
+                for user_id, strategy in missing
+            ],
+        )
+        for subscription_id, user_id, strategy in created:
+            renewals[(user_id, strategy)] = Renewal(subscription_id, STRATEGIES[strategy].price_usd, None, None)
+    db.commit()
+    return renewals
+
+
+def create_invoices(db: Session, renewals, client, limiter, workers=RENEWAL_WORKERS):
+    """ينشئ الفواتير الناقصة بالتوازي ضمن حد المعدل، ويحفظها، ويرجع renewals محدّثة."""
+    missing = [(key, r) for key, r in renewals.items() if not r.invoice_url]
+    if not missing:
+        return renewals
+
+    def create(item):
+        key, renewal = item
+        limiter.acquire()
+        return key, client.create_invoice(subscription_order_id(renewal.subscription_id), renewal.amount,
+                                          price_currency="usd", pay_currency="usdt")
+
+    renewals = dict(renewals)
+    stored = []
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for key, (invoice_url, invoice_id) in pool.map(create, missing):
+            if invoice_url:
+                renewals[key] = renewals[key]._replace(invoice_url=invoice_url, invoice_id=invoice_id)
+                stored.append({"b_id": renewals[key].subscription_id, "b_url": invoice_url, "b_invoice": invoice_id})
+    if stored:
+        db.connection().execute(
+            update(Subscription.__table__)
+            .where(Subscription.__table__.c.id == bindparam("b_id"))
+            .values(invoice_url=bindparam("b_url"), invoice_id=bindparam("b_invoice")),
+            stored,
+        )
+    db.commit()
+    return renewals
+
+
+def claim(db: Session, kind, candidates):
+    """
+    يسجل التذكيرات قبل إرسالها ويرجع المرشحين الذين سُجلوا فعلاً.
+    إذا سبقتنا عملية أخرى لبعضهم يفشل الإدخال الجماعي، فنعيده صفاً صفاً ونتجاوز الموجود.
+    إعادة المحاولة تحجز الصف الفاشل نفسه بتحديث مشروط على عدد محاولاته.
+    """
+    retries = [c for c in candidates if c.attempts is not None]
+    candidates = [c for c in candidates if c.attempts is None]
+    claimed = reclaim(db, kind, retries) if retries else []
+    if candidates:
+        claimed += insert_claims(db, kind, candidates)
+    return claimed
+
+
+def reclaim(db: Session, kind, candidates):
+    table = RenewalReminder.__table__
+    claimed = []
+    for c in candidates:
+        result = db.execute(
+            update(table)
+            .where(table.c.subscription_id == c.subscription_id, table.c.kind == kind,
+                   table.c.status == "failed", table.c.attempts == c.attempts)
+            .values(status="claimed", attempts=table.c.attempts + 1, status_code=None, error=None)
+        )
+        # صفر صفوف: عملية أخرى حجزته قبلنا
+        if result.rowcount:
+            claimed.append(c)
+    db.commit()
+    return claimed
+
+
+def insert_claims(db: Session, kind, candidates):
+    def row(c):
+        return {
+            "subscription_id": c.subscription_id,
+            "kind": kind,
+            "telegram_id": c.telegram_id,
+            "status": "claimed",
+            "attempts": 1,
+        }
+
+    try:
+        db.execute(insert(RenewalReminder), [row(c) for c in candidates])
+        db.commit()
+        return candidates
+    except IntegrityError:
+        db.rollback()
+    claimed = []
+    for c in candidates:
+        try:
+            db.execute(insert(RenewalReminder), [row(c)])
+            db.commit()
+            claimed.append(c)
+        except IntegrityError:
+            db.rollback()
+    return claimed
+
+
+def reminder_text(candidate, invoice_url=None):
+    strategy = STRATEGIES.get(candidate.strategy)
+    title = strategy.title if strategy else candidate.strategy
+    text = f"⏰ ينتهي اشتراكك ({title}) في {candidate.end_date.strftime('%Y-%m-%d %H:%M')} UTC.\n"
+    if invoice_url:
+        # الدفع قبل الانتهاء يضيف المدة الجديدة بعد نهاية الاشتراك الحالي
+        return text + f"للتجديد ادفع عبر الرابط:\n{invoice_url}"
+    return text + "أرسل /renew للحصول على رابط التجديد."
+
+
+def send_batch(candidates, renewals, client, workers=RENEWAL_WORKERS):
+    def send(c):
+        renewal = renewals.get((c.user_id, c.strategy))
+        return client.send_message(c.telegram_id, reminder_text(c, renewal.invoice_url if renewal else None))
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(send, candidates))
+
+
+def record_results(db: Session, kind, candidates, results, renewals):
+    now = datetime.utcnow()
+    table = RenewalReminder.__table__
+
+    def row(c, r):
+        renewal = renewals.get((c.user_id, c.strategy))
+        return {"b_subscription": c.subscription_id, "b_status": "sent" if r.ok else "failed",
+                "b_code": r.status_code, "b_error": r.error, "b_sent_at": now if r.ok else None,
+                "b_renewal": renewal.subscription_id if renewal else None,
+                "b_url": renewal.invoice_url if renewal else None}
+
+    db.connection().execute(
+        update(table)
+        .where(table.c.subscription_id == bindparam("b_subscription"), table.c.kind == kind)
+        .values(status=bindparam("b_status"), status_code=bindparam("b_code"),
+                error=bindparam("b_error"), sent_at=bindparam("b_sent_at"),
+                renewal_subscription_id=bindparam("b_renewal"), invoice_url=bindparam("b_url")),
+        [row(c, r) for c, r in zip(candidates, results)],
+    )
+    db.commit()
+    sent = sum(1 for r in results if r.ok)
+    metrics.RENEWAL_REMINDERS.inc(sent, kind=kind, result="sent")
+    metrics.RENEWAL_REMINDERS.inc(len(results) - sent, kind=kind, result="failed")
+    return sent
+
+
+def remind_window(db: Session, kind, start, end, telegram, payments, limiter,
+                  batch_size=RENEWAL_BATCH_SIZE, workers=RENEWAL_WORKERS):
+    stats = {"selected": 0, "sent": 0, "failed": 0, "invoices": 0}
+    after = None
+    while True:
+        candidates = due(db, kind, start, end, after=after, limit=batch_size)
+        if not candidates:
+            return stats
+        after = (candidates[-1].end_date, candidates[-1].subscription_id)
+        stats["selected"] += len(candidates)
+        # الحجز أولاً: الفواتير تُنشأ فقط لما حجزته هذه الدورة
+        claimed = claim(db, kind, candidates)
+        if not claimed:
+            continue
+        renewals = pending_renewals(db, claimed)
+        with_invoice = sum(1 for r in renewals.values() if r.invoice_url)
+        renewals = create_invoices(db, renewals, payments, limiter, workers)
+        stats["invoices"] += sum(1 for r in renewals.values() if r.invoice_url) - with_invoice
+        results = send_batch(claimed, renewals, telegram, workers)
+        sent = record_results(db, kind, claimed, results, renewals)
+        stats["sent"] += sent
+        stats["failed"] += len(claimed) - sent
+
+
+def run(now=None, telegram=None, payments=None, batch_size=RENEWAL_BATCH_SIZE, workers=RENEWAL_WORKERS):
+    """مهمة مجدولة: تذكير كل نافذة في RENEWAL_REMINDER_DAYS. يرجع إحصاءات لكل نافذة."""
+    if telegram is None:
+        from telegram_client import get_bulk_client
+        telegram = get_bulk_client()
+    if payments is None:
+        import nowpayments
+        payments = nowpayments.get_client()
+    limiter = TokenBucket(RENEWAL_INVOICE_RATE, max(1, RENEWAL_INVOICE_RATE))
+    now = now or datetime.utcnow()
+    stats = {}
+    with session_scope() as db:
+        for kind, lo, hi in windows():
+            stats[kind] = remind_window(db, kind, now + timedelta(days=lo), now + timedelta(days=hi),
+                                        telegram, payments, limiter, batch_size, workers)
+    if any(s["selected"] for s in stats.values()):
+        print(f"[renewals] {stats}")
+    return stats
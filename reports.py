@@ -0,0 +1,201 @@
+# reports.py
+# أدوات الأدمن والتقارير: تعيين الأدمن دفعة واحدة، تجميعات الإيرادات والمشتركين داخل SQL،
+# وتصدير CSV/JSON متدفق بترقيم keyset (id > آخر id) فلا يُحمّل أي جدول كاملاً في الذاكرة.
+# القراءة عبر محرك منفصل للقراءة فقط (REPORTS_DATABASE_URL) حتى لا يزاحم التصدير كتابات webhook
+import csv
+import io
+import json
+import os
+import threading
+from contextlib import contextmanager
+from datetime import date, datetime
+
+from sqlalchemy import event, func, select, update
+from sqlalchemy.orm import Session, sessionmaker
+
+from config import REPORTS_DATABASE_URL, EXPORT_BATCH_SIZE
+from models import User, Subscription, SignalLog, make_engine
+
+# حد متغيرات SQLite في الاستعلام الواحد (999 في الإصدارات القديمة)
+_IN_CHUNK = 500
+
+# الاشتراكات المدفوعة: المعلّقة لم تُدفع بعد
+PAID_STATUSES = ("active", "expired")
+
+_readonly_engine = None
+_readonly_lock = threading.Lock()
+
+
+def make_readonly_engine(url=REPORTS_DATABASE_URL):
+    engine = make_engine(url)
+
+    @event.listens_for(engine, "connect")
+    def _readonly(dbapi_connection, connection_record):
+        # رفض أي كتابة على مستوى الاتصال نفسه، وليس فقط بالاتفاق في الكود
+        cursor = dbapi_connection.cursor()
+        if engine.dialect.name == "sqlite":
+            cursor.execute("PRAGMA query_only=ON")
+        elif engine.dialect.name == "postgresql":
+            cursor.execute("SET SESSION CHARACTERISTICS AS TRANSACTION READ ONLY")
+        elif engine.dialect.name == "mysql":
+            cursor.execute("SET SESSION TRANSACTION READ ONLY")
+        cursor.close()
+
+    return engine
+
+
+def get_readonly_engine():
+    global _readonly_engine
+    if _readonly_engine is None:
+        with _readonly_lock:
+            if _readonly_engine is None:
+                _readonly_engine = make_readonly_engine()
+    return _readonly_engine
+
+
+def _after_fork():
+    global _readonly_lock
+    _readonly_lock = threading.Lock()
+    if _readonly_engine is not None:
+        _readonly_engine.dispose(close=False)
+
+
+os.register_at_fork(after_in_child=_after_fork)
+
+
+@contextmanager
+def readonly_session():
+    session = sessionmaker(bind=get_readonly_engine())()
+    try:
+        yield session
+    finally:
+        session.rollback()
+        session.close()
+
+
+# تعيين الأدمن
+
+def set_admins(db: Session, telegram_ids, is_admin=True):
+    """
+    تحديث واحد لكل دفعة من المعرفات بدلاً من جلب كل مستخدم وتعديله.
+    يرجع (عدد المستخدمين المحدَّثين، المعرفات غير الموجودة في قاعدة البيانات).
+    """
+    telegram_ids = list(dict.fromkeys(str(t).strip() for t in telegram_ids if str(t).strip()))
+    updated, found = 0, set()
+    for start in range(0, len(telegram_ids), _IN_CHUNK):
+        chunk = telegram_ids[start:start + _IN_CHUNK]
+        found.update(db.execute(select(User.telegram_id).where(User.telegram_id.in_(chunk))).scalars())
+        updated += db.execute(
+            update(User).where(User.telegram_id.in_(chunk)).values(is_admin=is_admin)
+        ).rowcount
+    db.commit()
+    return updated, [t for t in telegram_ids if t not in found]
+
+
+# التجميعات
+
+def revenue(db: Session, by=("currency", "strategy"), since=None, until=None):
+    """مجموع المبالغ وعدد الاشتراكات المدفوعة مجمّعة حسب أعمدة by (حسب start_date)."""
+    columns = [getattr(Subscription, name) for name in by]
+    stmt = (
+        select(*columns, func.count(Subscription.id), func.coalesce(func.sum(Subscription.amount), 0))
+        .where(Subscription.status.in_(PAID_STATUSES))
+        .group_by(*columns)
+        .order_by(*columns)
+    )
+    if since is not None:
+        stmt = stmt.where(Subscription.start_date >= since)
+    if until is not None:
+        stmt = stmt.where(Subscription.start_date < until)
+    return [
+        dict(zip(by, row[:len(by)]), subscriptions=row[-2], total=float(row[-1]))
+        for row in db.execute(stmt)
+    ]
+
+
+def active_subscribers(db: Session, now=None):
+    """عدد المشتركين الفعالين (مستخدمون مميزون) لكل استراتيجية."""
+    now = now or datetime.utcnow()
+    stmt = (
+        select(Subscription.strategy, func.count(func.distinct(Subscription.user_id)))
+        .where(Subscription.status == "active")
+        .where(Subscription.end_date >= now)
+        .group_by(Subscription.strategy)
+        .order_by(Subscription.strategy)
+    )
+    return {strategy: count for strategy, count in db.execute(stmt)}
+
+
+# التصدير
+
+EXPORTS = {
+    "users": (User, ["id", "telegram_id", "username", "first_name", "last_name", "is_admin", "created_at"]),
+    "subscriptions": (Subscription, ["id", "user_id", "strategy", "status", "start_date", "end_date",
+                                     "payment_id", "amount", "currency", "invoice_id"]),
+    "signal_logs": (SignalLog, ["id", "signal_id", "strategy", "symbol", "entry_price", "tps", "sl",
+                                "sent_at", "sent_to_count", "admin_id", "notes"]),
+}
+
+
+def iter_rows(db: Session, table, batch_size=EXPORT_BATCH_SIZE, where=()):
+    """
+    صفوف الجدول كـ dict مرتبة حسب id، دفعة بعد دفعة: WHERE id > آخر id ORDER BY id LIMIT batch_size.
+    كل دفعة استعلام مستقل على المفتاح الأساسي، فالكلفة ثابتة مهما تقدم التصدير (بعكس OFFSET)،
+    والمعاملة تُغلق بين الدفعات فلا تبقى قراءة طويلة مفتوحة.
+    """
+    model, names = EXPORTS[table]
+    columns = [getattr(model, name) for name in names]
+    last_id = 0
+    while True:
+        stmt = select(*columns).where(model.id > last_id, *where).order_by(model.id).limit(batch_size)
+        rows = db.execute(stmt).all()
+        db.rollback()
+        if not rows:
+            return
+        for row in rows:
+            yield dict(zip(names, row))
+        last_id = rows[-1][0]
+
+
+def _value(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+def iter_csv(rows, fieldnames):
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=fieldnames)
+    writer.writeheader()
+    for row in rows:
+        writer.writerow({k: json.dumps(v) if isinstance(v, (list, dict)) else _value(v) for k, v in row.items()})
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+
+def iter_json(rows):
+    # مصفوفة JSON تُكتب عنصراً عنصراً
+    yield "["
+    separator = "\n"
+    for row in rows:
+        yield separator + json.dumps({k: _value(v) for k, v in row.items()}, ensure_ascii=False)
+        separator = ",\n"
+    yield "\n]\n"
+
+
+def export(table, out, fmt="csv", batch_size=EXPORT_BATCH_SIZE, where=()):
+    """يكتب الجدول إلى ملف نصي مفتوح out ويرجع عدد الصفوف."""
+    counter = [0]
+
+    def counted(rows):
+        for row in rows:
+            counter[0] += 1
+            yield row
+
+    with readonly_session() as db:
+        rows = counted(iter_rows(db, table, batch_size, where))
+        chunks = iter_csv(rows, EXPORTS[table][1]) if fmt == "csv" else iter_json(rows)
+        for chunk in chunks:
+            out.write(chunk)
+    return counter[0]
@@ -0,0 +1,71 @@
+# scanner.py
+# ماسح السوق: يقيّم كل استراتيجيات السجل (strategies.py) لكل الرموز دفعة واحدة باستخدام مصفوفة NumPy (رموز × شموع)
+import time
+
+import numpy as np
+
+import metrics
+from candle_cache import cache, get_ohlcv
+from strategies import STRATEGIES, evaluate_last
+
+TIMEFRAME = '5m'
+LIMIT = 100
+
+
+def stack_closes(candles_by_symbol, limit=LIMIT):
+    """
+    يرجع (symbols, closes) حيث closes مصفوفة (عدد الرموز × limit) محاذاة لليمين،
+    والرموز ذات البيانات الأقصر تُملأ من اليسار بـ NaN.
+    """
+    symbols = list(candles_by_symbol)
+    closes = np.full((len(symbols), limit), np.nan)
+    for i, symbol in enumerate(symbols):
+        candles = candles_by_symbol[symbol] or []
+        tail = [c[4] for c in candles[-limit:]]
+        if tail:
+            closes[i, limit - len(tail):] = tail
+    return symbols, closes
+
+
+def evaluate(closes, strategies=None):
+    """يرجع {strategy: مصفوفة bool بطول عدد الرموز} لآخر شمعة؛ المؤشرات المشتركة تُحسب مرة واحدة."""
+    return evaluate_last(closes, strategies)
+
+
+def scan(symbols, fetch=None):
+    """
+    scan(symbols) -> {symbol: {strategy: bool}}
+    fetch: دالة بديلة لجلب الشموع (افتراضياً الكاش المشترك get_ohlcv)
+    """
+    fetch = fetch or get_ohlcv
+    candles_by_symbol = {symbol: fetch(symbol, TIMEFRAME, LIMIT) for symbol in symbols}
+    return scan_candles(candles_by_symbol)
+
+
+async def scan_async(symbols, fetcher):
+    """
+    نفس scan لكن الشموع تُجلب بالتوازي عبر okx_async.AsyncOHLCVFetcher،
+    وتُخزن في الكاش المشترك حتى تستفيد منها check_signal في الاستراتيجيات أيضاً.
+    """
+    candles_by_symbol = await fetcher.fetch_many(symbols, TIMEFRAME, LIMIT)
+    for symbol, candles in candles_by_symbol.items():
+        cache.put(symbol, TIMEFRAME, candles)
+    return scan_candles(candles_by_symbol)
+
+
+def scan_candles(candles_by_symbol):
+    symbols, closes = stack_closes(candles_by_symbol)
+    results = {symbol: {name: False for name in STRATEGIES} for symbol in symbols}
+    if not symbols:
+        return results
+    # رموز بأقل من شمعتين لا يمكن فحص التقاطع فيها
+    enough = np.count_nonzero(~np.isnan(closes), axis=1) >= 2
+    started = time.perf_counter()
+    evaluated = evaluate(closes)
+    # زمن الرمز الواحد داخل الفحص المتجه، قابل للمقارنة مع check_signal
+    per_symbol = (time.perf_counter() - started) / len(symbols)
+    metrics.STRATEGY_EVAL_SECONDS.observe(per_symbol, count=len(symbols), mode="batch")
+    for name, fired in evaluated.items():
+        for i in np.flatnonzero(fired & enough):
+            results[symbols[i]][name] = True
+    return results
@@ -1,7 +1,13 @@
 from models import User, Subscription
-from sqlalchemy.orm import Session
+from sqlalchemy import exists, func
+from sqlalchemy.orm import Session, aliased
 from datetime import datetime, timedelta
 
+import entitlements
+import metrics
+import nowpayments
+from strategies import get_strategy
+
 def get_or_create_user(db: Session, telegram_id: str, username=None, first_name=None, last_name=None):
     user = db.query(User).filter(User.telegram_id == telegram_id).first()
     if not user:
@@ -17,6 +23,7 @@ def get_or_create_user(db: Session, telegram_id: str, username=None, first_name=
     return user
 
 def create_subscription(db: Session, telegram_id: str, strategy: str, amount: float, currency: str = "USDT"):
+    get_strategy(strategy)  # ValueError إذا لم تكن الاستراتيجية في السجل
     user = get_or_create_user(db, telegram_id)
     subscription = Subscription(
         user_id=user.id,
@@ -30,23 +37,75 @@ def create_subscription(db: Session, telegram_id: str, strategy: str, amount: fl
     db.refresh(subscription)
     return subscription
 
-def activate_subscription(db: Session, payment_id: str):
+def get_or_create_pending_subscription(db: Session, telegram_id: str, strategy: str, amount: float, currency: str = "USDT"):
+    # الضغط المتكرر على /subscribe يرجع نفس الاشتراك المعلّق (ونفس فاتورته)
+    get_strategy(strategy)
+    subscription = (
+        db.query(Subscription)
+        .join(User, Subscription.user_id == User.id)
+        .filter(User.telegram_id == telegram_id)
+        .filter(Subscription.strategy == strategy)
+        .filter(Subscription.status == "pending")
+        .order_by(Subscription.id.desc())
+        .first()
+    )
+    if subscription:
+        return subscription
+    return create_subscription(db, telegram_id, strategy, amount, currency)
+
+def store_invoice(db: Session, subscription_id: int, invoice_url: str, invoice_id: str):
+    db.query(Subscription).filter(Subscription.id == subscription_id).update(
+        {Subscription.invoice_url: invoice_url, Subscription.invoice_id: invoice_id},
+        synchronize_session=False,
+    )
+    db.commit()
+
+def get_or_create_invoice(db: Session, subscription: Subscription, client=None):
+    """يرجع (invoice_url, invoice_id) للاشتراك المعلّق، وينشئ فاتورة جديدة فقط إذا لم تكن موجودة."""
+    if subscription.invoice_url:
+        return subscription.invoice_url, subscription.invoice_id
+    client = client or nowpayments.get_client()
+    invoice_url, invoice_id = client.create_invoice(
+        nowpayments.subscription_order_id(subscription.id), subscription.amount, price_currency="usd", pay_currency="usdt"
+    )
+    if invoice_url:
+        store_invoice(db, subscription.id, invoice_url, invoice_id)
+    return invoice_url, invoice_id
+
+def activate_subscription(db: Session, payment_id: str, commit: bool = True):
+    """
+    commit=False: التفعيل يصبح جزءاً من معاملة المستدعي (مثل ipn.ingest) ولا يُبطل الكاش،
+    والمستدعي مسؤول عن commit وإبطال كاش الصلاحيات بعده.
+    """
     subscription = db.query(Subscription).filter(Subscription.payment_id == payment_id).first()
     if subscription and subscription.status != "active":
+        now = datetime.utcnow()
+        # تجديد قبل الانتهاء (فاتورة تذكير renewals.py أو /renew): المدة الجديدة تبدأ بعد الاشتراك الحالي
+        current_end = db.query(func.max(Subscription.end_date)).filter(
+            Subscription.user_id == subscription.user_id,
+            Subscription.strategy == subscription.strategy,
+            Subscription.status == "active",
+            Subscription.end_date > now,
+        ).scalar()
         subscription.status = "active"
-        subscription.start_date = datetime.utcnow()
-        subscription.end_date = datetime.utcnow() + timedelta(days=30)
+        subscription.start_date = current_end or now
+        subscription.end_date = subscription.start_date + timedelta(days=30)
+        if not commit:
+            db.flush()
+            return subscription
         db.commit()
+        if subscription.user:
+            entitlements.invalidate(subscription.user.telegram_id)
         return subscription
     return None
 
+@metrics.timed(metrics.DB_QUERY_SECONDS, query="get_active_subscription")
 def get_active_subscription(db: Session, telegram_id: str):
-    user = db.query(User).filter(User.telegram_id == telegram_id).first()
-    if not user:
-        return None
+    # استعلام واحد بالربط بدلاً من جلب المستخدم ثم اشتراكه
     subscription = (
         db.query(Subscription)
-        .filter(Subscription.user_id == user.id)
+        .join(User, Subscription.user_id == User.id)
+        .filter(User.telegram_id == telegram_id)
         .filter(Subscription.status == "active")
         .filter(Subscription.end_date >= datetime.utcnow())
         .order_by(Subscription.end_date.desc())
@@ -54,6 +113,57 @@ def get_active_subscription(db: Session, telegram_id: str):
     )
     return subscription
 
+@metrics.timed(metrics.DB_QUERY_SECONDS, query="get_user")
+def get_user(db: Session, telegram_id, create_if_not_exist=True, user_info=None):
+    user = db.query(User).filter_by(telegram_id=str(telegram_id)).first()
+    if not user and create_if_not_exist:
+        user = User(
+            telegram_id=str(telegram_id),
+            username=user_info.get("username") if user_info else None,
+            first_name=user_info.get("first_name") if user_info else None,
+            last_name=user_info.get("last_name") if user_info else None,
+        )
+        db.add(user)
+        db.commit()
+    return user
+
+@metrics.timed(metrics.DB_QUERY_SECONDS, query="get_active_subscription_for_user")
+def get_active_subscription_for_user(db: Session, user_id: int):
+    now = datetime.utcnow()
+    return db.query(Subscription).filter(
+        Subscription.user_id == user_id,
+        Subscription.status == "active",
+        Subscription.start_date <= now,
+        Subscription.end_date >= now
+    ).first()
+
+@metrics.timed(metrics.DB_QUERY_SECONDS, query="expire_subscriptions")
+def expire_subscriptions(db: Session, collect_chat_ids=False):
+    """
+    تحديث واحد على مستوى المجموعة: status='active' AND end_date < now.
+    يرجع (عدد الاشتراكات المنتهية، معرفات تيليجرام لأصحابها إذا طُلبت).
+    من جدد مسبقاً (اشتراك فعال آخر ما زال سارياً، كما في renewals.due) لا يُبلغ بالانتهاء.
+    """
+    now = datetime.utcnow()
+    chat_ids = []
+    if collect_chat_ids:
+        later = aliased(Subscription)
+        chat_ids = [tid for (tid,) in db.query(User.telegram_id).join(Subscription).filter(
+            Subscription.status == "active",
+            Subscription.end_date < now,
+            ~exists().where(
+                later.user_id == Subscription.user_id,
+                later.status == "active",
+                later.end_date >= now,
+            ),
+        ).distinct()]
+    expired = db.query(Subscription).filter(
+        Subscription.status == "active",
+        Subscription.end_date < now
+    ).update({Subscription.status: "expired"}, synchronize_session=False)
+    db.commit()
+    return expired, chat_ids
+
 def get_user_strategy(db: Session, telegram_id: str):
     subscription = get_active_subscription(db, telegram_id)
     if subscription:
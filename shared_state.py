@@ -0,0 +1,75 @@
+# shared_state.py
+# عدادات أجيال (generations) مشتركة بين عمال الخادم عبر ملف mmap على نفس الجهاز
+# كل كاش محلي يحفظ رقم الجيل مع العنصر؛ الإبطال يزيد العداد فيرى كل العمال أن نسختهم قديمة
+# دون رسائل بين العمليات ودون لمس قاعدة البيانات في كل طلب
+import fcntl
+import mmap
+import os
+import struct
+import threading
+import zlib
+
+from config import SHARED_STATE_PATH
+
+SLOTS = 65536
+_COUNTER = struct.Struct("Q")
+
+
+class Generations:
+    """
+    path: ملف العدادات (يُنشأ عند الحاجة). بدونه تبقى العدادات داخل العملية كالسابق.
+    المفاتيح تُوزع على SLOTS خانة بـ crc32؛ التصادم يسبب إبطالاً زائداً فقط وليس بيانات خاطئة.
+    """
+
+    def __init__(self, path=None, slots=SLOTS):
+        self.path = path or None
+        self.slots = slots
+        self._lock = threading.Lock()
+        self._fd = None
+        self._map = None
+        self._local = None
+        if self.path:
+            self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+            size = slots * _COUNTER.size
+            if os.fstat(self._fd).st_size < size:
+                os.ftruncate(self._fd, size)
+            self._map = mmap.mmap(self._fd, size, mmap.MAP_SHARED, mmap.PROT_READ | mmap.PROT_WRITE)
+        else:
+            self._local = [0] * slots
+        os.register_at_fork(after_in_child=self._after_fork)
+
+    @property
+    def shared(self):
+        return self._map is not None
+
+    def _slot(self, key):
+        return zlib.crc32(str(key).encode("utf-8")) % self.slots
+
+    def get(self, key):
+        slot = self._slot(key)
+        if self._local is not None:
+            return self._local[slot]
+        return _COUNTER.unpack_from(self._map, slot * _COUNTER.size)[0]
+
+    def bump(self, key):
+        slot = self._slot(key)
+        with self._lock:
+            if self._local is not None:
+                self._local[slot] += 1
+                return self._local[slot]
+            offset = slot * _COUNTER.size
+            # قفل سجل على الخانة نفسها فقط حتى لا تضيع زيادتان متزامنتان من عاملين
+            fcntl.lockf(self._fd, fcntl.LOCK_EX, _COUNTER.size, offset)
+            try:
+                value = _COUNTER.unpack_from(self._map, offset)[0] + 1
+                _COUNTER.pack_into(self._map, offset, value)
+            finally:
+                fcntl.lockf(self._fd, fcntl.LOCK_UN, _COUNTER.size, offset)
+            return value
+
+    def _after_fork(self):
+        # الـ mmap المشترك يبقى صالحاً في العملية الابن، لكن القفل قد يكون منسوخاً وهو مأخوذ
+        self._lock = threading.Lock()
+
+
+generations = Generations(SHARED_STATE_PATH)
@@ -0,0 +1,238 @@
+# signal_engine.py
+# محرك الإشارات: بعد إغلاق كل شمعة يفحص كل الرموز للاستراتيجيتين دفعة واحدة،
+# يخزن الإشارات في SignalLog ويضيفها لطابور البث (broadcast.broadcast_queue)، ويسجل زمن الدورة في scan_runs
+# البث لا يدخل في زمن الدورة: إشارة لألف مشترك تأخذ ~33 ثانية بحد تيليجرام، وتأخره يظهر في broadcast_backlog
+import asyncio
+import threading
+import time
+from datetime import datetime
+
+from sqlalchemy.exc import IntegrityError
+
+from config import (
+    SYMBOLS, SIGNAL_TIMEFRAME, SCAN_DELAY_SECONDS, SIGNAL_BROADCAST,
+    SIGNAL_TP_PERCENTS, SIGNAL_SL_PERCENT,
+)
+from candle_cache import timeframe_seconds
+from models import session_scope, SignalLog, ScanRun
+from shared_state import generations
+import jobs
+import metrics
+import profiling
+
+ADVICE_LIMIT = 5
+# مفتاح عداد الإبطال المشترك: الدورة تعمل في عامل واحد، و /advice يُخدم من كل العمال
+ADVICE_GENERATION_KEY = "signal_engine:advice"
+
+
+def current_candle_open_ms(now, timeframe=SIGNAL_TIMEFRAME):
+    period = timeframe_seconds(timeframe)
+    return int(now // period) * period * 1000
+
+
+def closed_candles(candles, open_ms):
+    # نقيّم الشموع المغلقة فقط؛ الشمعة التي بدأت للتو ما زالت تتغير
+    return [c for c in (candles or []) if c[0] < open_ms]
+
+
+def targets(entry_price):
+    tps = [round(entry_price * (1 + p / 100), 8) for p in SIGNAL_TP_PERCENTS]
+    sl = round(entry_price * (1 - SIGNAL_SL_PERCENT / 100), 8)
+    return tps, sl
+
+
+def format_signal(log):
+    tps = "\n".join(f"🎯 TP{i}: {tp}" for i, tp in enumerate(log.tps or [], 1))
+    return (
+        f"📈 إشارة شراء ({log.strategy})\n"
+        f"الرمز: {log.symbol}\n"
+        f"سعر الدخول: {log.entry_price}\n"
+        f"{tps}\n"
+        f"🛑 وقف الخسارة: {log.sl}"
+    )
+
+
+async def _fetch(symbols):
+    from okx_async import AsyncOHLCVFetcher
+    import scanner
+    async with AsyncOHLCVFetcher() as fetcher:
+        return await fetcher.fetch_many(symbols, SIGNAL_TIMEFRAME, scanner.LIMIT + 1)
+
+
+def run_cycle(symbols=None, fetch=None, now=None, broadcast=SIGNAL_BROADCAST):
+    """
+    دورة فحص واحدة. fetch: دالة بديلة ترجع {symbol: candles} (افتراضياً okx_async بالتوازي).
+    ترجع قائمة SignalLog التي أُنشئت في هذه الدورة.
+    مع SCAN_PROFILE_DIR تُحلل الدورة بالعينات وتُكتب stacks مطوية في ذلك المجلد.
+    """
+    with profiling.maybe_profile("scan"):
+        return _run_cycle(symbols, fetch, now, broadcast)
+
+
+def _run_cycle(symbols, fetch, now, broadcast):
+    # scanner يحمّل numpy و okx_api، ولا يحتاجهما webhook الذي يقرأ /advice فقط
+    import scanner
+    symbols = symbols or SYMBOLS
+    now = now if now is not None else time.time()
+    started = time.perf_counter()
+    started_at = datetime.utcnow()
+    open_ms = current_candle_open_ms(now)
+
+    candles_by_symbol = fetch(symbols) if fetch else asyncio.run(_fetch(symbols))
+    candles_by_symbol = {s: closed_candles(c, open_ms) for s, c in candles_by_symbol.items()}
+    results = scanner.scan_candles(candles_by_symbol)
+
+    logs = []
+    for symbol, fired in results.items():
+        for strategy, ok in fired.items():
+            if not ok:
+                continue
+            last = candles_by_symbol[symbol][-1]
+            entry_price = float(last[4])
+            tps, sl = targets(entry_price)
+            logs.append(SignalLog(
+                signal_id=f"{strategy}:{symbol}:{last[0]}",
+                strategy=strategy,
+                symbol=symbol,
+                entry_price=entry_price,
+                tps=tps,
+                sl=sl,
+            ))
+
+    backlog = 0
+    if broadcast:
+        import broadcast as broadcaster
+        backlog = broadcaster.broadcast_queue.pending()
+
+    with session_scope() as db:
+        stored = []
+        for log in logs:
+            try:
+                # signal_id فريد: لو عملت دورتان لنفس الشمعة لا تتكرر الإشارة
+                with db.begin_nested():
+                    db.add(log)
+                stored.append(log)
+            except IntegrityError:
+                pass
+        duration = time.perf_counter() - started
+        overran = duration > timeframe_seconds(SIGNAL_TIMEFRAME)
+        metrics.SCAN_CYCLE_SECONDS.observe(duration)
+        for log in stored:
+            metrics.SIGNALS_EMITTED.inc(strategy=log.strategy)
+        db.add(ScanRun(
+            candle_ts=open_ms,
+            started_at=started_at,
+            duration_seconds=duration,
+            symbols=len(symbols),
+            signals=len(stored),
+            overran=overran,
+            broadcast_backlog=backlog,
+        ))
+        db.commit()
+        _advice_cache.clear()
+        for log in stored:
+            db.refresh(log)
+        db.expunge_all()
+
+    if broadcast:
+        # بعد الـ commit: خيط البث يقرأ SignalLog بجلسته الخاصة
+        for log in stored:
+            broadcaster.broadcast_queue.enqueue(log.id, format_signal(log), log.strategy)
+    if overran:
+        print(f"[signal_engine] scan of {len(symbols)} symbols took {duration:.1f}s and overran the candle")
+    if backlog:
+        print(f"[signal_engine] {backlog} signals from earlier candles still broadcasting; fan-out is behind")
+    return stored
+
+
+class _AdviceCache:
+    """أحدث إشارات كل استراتيجية حتى إغلاق الشمعة التالية، حتى لا يلمس /advice قاعدة البيانات كل مرة."""
+
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def generation(self):
+        return generations.get(ADVICE_GENERATION_KEY)
+
+    def get(self, strategy, now):
+        current = self.generation()
+        with self._lock:
+            entry = self._entries.get(strategy)
+            if entry and entry[0] > now and entry[2] == current:
+                return entry[1]
+        return None
+
+    def put(self, strategy, rows, expires_at, generation):
+        with self._lock:
+            self._entries[strategy] = (expires_at, rows, generation)
+
+    def clear(self):
+        # يُبطل نسخ كل العمال وليس هذه العملية فقط
+        generations.bump(ADVICE_GENERATION_KEY)
+        with self._lock:
+            self._entries.clear()
+
+
+_advice_cache = _AdviceCache()
+
+
+def latest_signals(strategy, limit=ADVICE_LIMIT, now=None):
+    now = now if now is not None else time.time()
+    rows = _advice_cache.get(strategy, now)
+    if rows is not None:
+        return rows
+    generation = _advice_cache.generation()
+    with session_scope() as db:
+        logs = (
+            db.query(SignalLog)
+            .filter(SignalLog.strategy == strategy)
+            .order_by(SignalLog.sent_at.desc())
+            .limit(limit)
+            .all()
+        )
+        rows = [
+            {"symbol": l.symbol, "entry_price": l.entry_price, "tps": l.tps, "sl": l.sl, "sent_at": l.sent_at,
+             "strategy": l.strategy}
+            for l in logs
+        ]
+    period = timeframe_seconds(SIGNAL_TIMEFRAME)
+    _advice_cache.put(strategy, rows, (int(now // period) + 1) * period + SCAN_DELAY_SECONDS, generation)
+    return rows
+
+
+def format_advice(rows):
+    if not rows:
+        return "📊 لا توجد توصيات حالياً."
+    lines = ["📊 آخر التوصيات:"]
+    for row in rows:
+        tps = ", ".join(str(tp) for tp in row["tps"] or [])
+        lines.append(
+            f"• {row['symbol']} | دخول: {row['entry_price']} | أهداف: {tps} | وقف: {row['sl']} "
+            f"({row['sent_at'].strftime('%Y-%m-%d %H:%M')} UTC)"
+        )
+    return "\n".join(lines)
+
+
+def _run_scheduled():
+    try:
+        run_cycle()
+    except Exception as e:
+        print(f"[signal_engine] cycle error: {e}")
+
+
+def schedule():
+    # كل 5 دقائق بعد الإغلاق بثوانٍ قليلة
+    minutes = max(1, timeframe_seconds(SIGNAL_TIMEFRAME) // 60)
+    return jobs.add_cron_job(_run_scheduled, "signal_engine", minute=f"*/{minutes}", second=SCAN_DELAY_SECONDS)
+
+
+if __name__ == "__main__":
+    schedule()
+    jobs.start()
+    print("[signal_engine] running, press Ctrl+C to stop")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        jobs.shutdown()
@@ -0,0 +1,221 @@
+# strategies.py
+# سجل الاستراتيجيات: كل استراتيجية مجموعة شروط على مؤشرات مسماة ومشتركة (ema9, ema21, rsi14, ...)
+# المؤشرات تُبنى كرسم اعتماديات وتُحسب مرة واحدة لكل رمز وشمعة مهما كان عدد الاستراتيجيات التي تستخدمها
+# لإضافة باقة جديدة: أضف Strategy إلى STRATEGIES فقط
+# numpy يُحمّل عند أول حساب متجه فقط؛ services و bot يستوردون السجل للأسعار والتحقق
+import time
+
+import metrics
+from config import PRICE_STRATEGY_ONE_USD, PRICE_STRATEGY_TWO_USD
+from indicators import EMA_FAST, EMA_SLOW, RSI_PERIOD, INCREMENTAL_OUTPUTS, engine, ema_matrix, rsi_matrix
+
+TIMEFRAME = '5m'
+LIMIT = 100
+
+
+class Indicator:
+    """func(*inputs, **params) تعمل على مصفوفات (رموز × شموع)."""
+
+    def __init__(self, name, func, inputs=(), **params):
+        self.name = name
+        self.func = func
+        self.inputs = tuple(inputs)
+        self.params = params
+
+
+INDICATORS = {
+    "close": Indicator("close", None),
+    "ema9": Indicator("ema9", ema_matrix, ("close",), span=EMA_FAST),
+    "ema21": Indicator("ema21", ema_matrix, ("close",), span=EMA_SLOW),
+    "rsi14": Indicator("rsi14", rsi_matrix, ("close",), period=RSI_PERIOD),
+}
+
+
+def incremental_indicators(indicators=INDICATORS):
+    """
+    {اسم المؤشر: موضعه في قيم IndicatorEngine} لكل مؤشر في السجل يحسبه المحرك تزايدياً،
+    أي نفس الدالة والمعاملات على close مباشرة (indicators.INCREMENTAL_OUTPUTS).
+    """
+    positions = {}
+    for name, indicator in indicators.items():
+        for i, (func, params) in enumerate(INCREMENTAL_OUTPUTS):
+            if indicator.func is func and indicator.params == params and indicator.inputs == ("close",):
+                positions[name] = i
+    return positions
+
+
+INCREMENTAL_INDICATORS = incremental_indicators()
+
+
+class CrossAbove:
+    """المؤشر fast كان تحت slow في الشمعة السابقة وأصبح فوقه في الشمعة الحالية."""
+
+    def __init__(self, fast, slow):
+        self.fast = fast
+        self.slow = slow
+        self.inputs = (fast, slow)
+
+    def mask(self, values):
+        import numpy as np
+        fast, slow = values[self.fast], values[self.slow]
+        out = np.zeros(fast.shape, dtype=bool)
+        out[:, 1:] = (fast[:, :-1] < slow[:, :-1]) & (fast[:, 1:] > slow[:, 1:])
+        return out
+
+    def check(self, prev, last):
+        return prev[self.fast] < prev[self.slow] and last[self.fast] > last[self.slow]
+
+
+class Above:
+    """قيمة المؤشر في الشمعة الحالية أكبر من حد ثابت."""
+
+    def __init__(self, indicator, threshold):
+        self.indicator = indicator
+        self.threshold = threshold
+        self.inputs = (indicator,)
+
+    def mask(self, values):
+        import numpy as np
+        with np.errstate(invalid="ignore"):
+            return values[self.indicator] > self.threshold
+
+    def check(self, prev, last):
+        return last[self.indicator] > self.threshold
+
+
+class Strategy:
+
+    def __init__(self, key, conditions, price_usd=None, title=None):
+        self.key = key
+        self.conditions = list(conditions)
+        self.price_usd = price_usd
+        self.title = title or key
+
+    @property
+    def indicators(self):
+        return {name for condition in self.conditions for name in condition.inputs}
+
+    def mask(self, values):
+        result = None
+        for condition in self.conditions:
+            m = condition.mask(values)
+            result = m if result is None else (result & m)
+        return result
+
+    def check(self, prev, last):
+        return all(condition.check(prev, last) for condition in self.conditions)
+
+
+# مفاتيح هذا السجل هي القيم المسموحة في Subscription.strategy
+STRATEGIES = {
+    "strategy_one": Strategy(
+        "strategy_one",
+        [CrossAbove("ema9", "ema21"), Above("rsi14", 50)],
+        price_usd=PRICE_STRATEGY_ONE_USD,
+        title="استراتيجية 1",
+    ),
+    "strategy_two": Strategy(
+        "strategy_two",
+        [CrossAbove("ema9", "ema21"), Above("rsi14", 55)],
+        price_usd=PRICE_STRATEGY_TWO_USD,
+        title="استراتيجية 2",
+    ),
+}
+
+DEFAULT_STRATEGY = "strategy_one"
+
+
+def get_strategy(key):
+    strategy = STRATEGIES.get(key)
+    if strategy is None:
+        raise ValueError(f"unknown strategy: {key!r}")
+    return strategy
+
+
+def resolve(names):
+    """يرجع المؤشرات المطلوبة واعتمادياتها مرتبة بحيث يأتي كل مؤشر بعد مدخلاته."""
+    order = []
+    seen = set()
+
+    def visit(name, stack=()):
+        if name in seen:
+            return
+        if name in stack:
+            raise ValueError(f"indicator cycle: {' -> '.join(stack + (name,))}")
+        for dep in INDICATORS[name].inputs:
+            visit(dep, stack + (name,))
+        seen.add(name)
+        order.append(name)
+
+    for name in sorted(names):
+        visit(name)
+    return order
+
+
+def compute(closes, names):
+    """يحسب كل مؤشر مطلوب مرة واحدة فقط على مصفوفة closes (رموز × شموع)."""
+    values = {}
+    for name in resolve(names):
+        indicator = INDICATORS[name]
+        if indicator.func is None:
+            values[name] = closes
+        else:
+            values[name] = indicator.func(*(values[i] for i in indicator.inputs), **indicator.params)
+    return values
+
+
+def _as_list(strategies):
+    strategies = STRATEGIES if strategies is None else strategies
+    if isinstance(strategies, dict):
+        return list(strategies.values())
+    return list(strategies)
+
+
+def required_indicators(strategies):
+    return set().union(*(s.indicators for s in strategies))
+
+
+def evaluate_masks(closes, strategies=None):
+    """يرجع {key: مصفوفة bool (رموز × شموع)} لكل الشموع؛ المؤشرات المشتركة تُحسب مرة واحدة."""
+    strategies = _as_list(strategies)
+    values = compute(closes, required_indicators(strategies))
+    return {s.key: s.mask(values) for s in strategies}
+
+
+def evaluate_last(closes, strategies=None):
+    """يرجع {key: مصفوفة bool بطول عدد الرموز} لآخر شمعة."""
+    return {key: mask[:, -1] for key, mask in evaluate_masks(closes, strategies).items()}
+
+
+def check_all(symbol, candles=None, strategies=None):
+    """
+    يفحص رمزاً واحداً لكل الاستراتيجيات. إذا كانت كل المؤشرات المطلوبة متاحة في IndicatorEngine
+    تُستخدم الحالة التزايدية، وإلا تُحسب المؤشرات على نافذة الشموع مرة واحدة لكل الاستراتيجيات.
+    """
+    strategies = _as_list(strategies)
+    if candles is None:
+        from candle_cache import get_ohlcv
+        candles = get_ohlcv(symbol, TIMEFRAME, LIMIT)
+    if not candles or len(candles) < 2:
+        return {s.key: False for s in strategies}
+    started = time.perf_counter()
+    if required_indicators(strategies) <= INCREMENTAL_INDICATORS.keys():
+        mode = "incremental"
+        result = engine.update(symbol, candles)
+        if result is None:
+            fired = {s.key: False for s in strategies}
+        else:
+            prev, last = ({name: values[i] for name, i in INCREMENTAL_INDICATORS.items()} for values in result)
+            fired = {s.key: bool(s.check(prev, last)) for s in strategies}
+    else:
+        mode = "vectorized"
+        import numpy as np
+        closes = np.array([[float(c[4]) for c in candles]])
+        fired = {key: bool(f[0]) for key, f in evaluate_last(closes, strategies).items()}
+    metrics.STRATEGY_EVAL_SECONDS.observe(time.perf_counter() - started, mode=mode)
+    return fired
+
+
+def check_signal(key, symbol):
+    strategy = get_strategy(key)
+    return check_all(symbol, strategies=[strategy])[key]
@@ -0,0 +1,150 @@
+# telegram_client.py
+# عميل تيليجرام متزامن: جلسة requests واحدة بمجمع اتصالات keep-alive، مهلات محددة،
+# واحترام حدود تيليجرام العامة ولكل محادثة و retry_after في ردود 429
+import os
+import time
+from collections import namedtuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from config import (
+    TELEGRAM_TOKEN, TELEGRAM_API_BASE, TELEGRAM_GLOBAL_RATE, TELEGRAM_PER_CHAT_INTERVAL,
+    TELEGRAM_REPLY_RATE, TELEGRAM_RATE_STATE_PATH,
+)
+from ratelimit import TokenBucket, KeyedRateLimiter, SharedTokenBucket
+import metrics
+
+SendResult = namedtuple("SendResult", ["chat_id", "ok", "status_code", "error", "attempts"])
+
+
+class TelegramClient:
+
+    def __init__(self, token=None, api_base=None, pool_size=32, timeout=(3.05, 10),
+                 global_rate=None, per_chat_interval=None, max_retries=3, global_limiter=None):
+        token = token or TELEGRAM_TOKEN
+        self.api_url = f"{api_base or TELEGRAM_API_BASE}/bot{token}"
+        self.timeout = timeout
+        self.max_retries = max_retries
+        rate = global_rate or TELEGRAM_GLOBAL_RATE
+        # global_limiter: أي كائن فيه acquire() و pause(seconds)، مثل الرصيد المشترك أدناه
+        self.global_limiter = global_limiter or TokenBucket(rate, max(1, rate))
+        self.chat_limiter = KeyedRateLimiter(
+            TELEGRAM_PER_CHAT_INTERVAL if per_chat_interval is None else per_chat_interval
+        )
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def send_message(self, chat_id, text, **params):
+        payload = {"chat_id": chat_id, "text": text}
+        payload.update(params)
+        error = None
+        status = None
+        for attempt in range(1, self.max_retries + 2):
+            self.chat_limiter.acquire(chat_id)
+            self.global_limiter.acquire()
+            started = time.perf_counter()
+            try:
+                resp = self.session.post(f"{self.api_url}/sendMessage", json=payload, timeout=self.timeout)
+            except requests.RequestException as e:
+                _record(started, "error")
+                error = str(e)
+                status = None
+                time.sleep(min(5.0, 0.5 * attempt))
+                continue
+            status = resp.status_code
+            _record(started, status)
+            if status == 200:
+                return SendResult(chat_id, True, status, None, attempt)
+            data = _json(resp)
+            error = data.get("description") or resp.text[:200]
+            if status == 429:
+                retry_after = (data.get("parameters") or {}).get("retry_after", 1)
+                # تيليجرام يطلب إيقاف البوت كاملاً لهذه المدة وليس هذه المحادثة فقط
+                self.global_limiter.pause(retry_after)
+                continue
+            if status >= 500:
+                time.sleep(min(5.0, 0.5 * attempt))
+                continue
+            # 400/403 (مثلاً المستخدم حظر البوت): لا فائدة من إعادة المحاولة
+            break
+        return SendResult(chat_id, False, status, error, attempt)
+
+
+def _record(started, status):
+    metrics.HTTP_CLIENT_SECONDS.observe(time.perf_counter() - started, service="telegram", endpoint="sendMessage")
+    metrics.HTTP_CLIENT_REQUESTS.inc(service="telegram", endpoint="sendMessage", status=status)
+
+
+def _json(resp):
+    try:
+        return resp.json()
+    except ValueError:
+        return {}
+
+
+# عميلان يسحبان من رصيد واحد بمعدل TELEGRAM_GLOBAL_RATE (مشترك بين العمال عبر TELEGRAM_RATE_STATE_PATH):
+# - get_client: ردود الأوامر (outbox) بأولوية عالية، وتستخدم كامل الحد عندما لا يوجد بث
+# - get_bulk_client: البث والتذكيرات بأولوية منخفضة، بسقف bulk_rate() ومما تتركه الردود فقط
+_bucket = None
+_client = None
+_bulk_client = None
+
+
+def bulk_rate():
+    if TELEGRAM_REPLY_RATE >= TELEGRAM_GLOBAL_RATE:
+        raise ValueError(
+            f"TELEGRAM_REPLY_RATE ({TELEGRAM_REPLY_RATE:g}) must be below TELEGRAM_GLOBAL_RATE ({TELEGRAM_GLOBAL_RATE:g})"
+        )
+    return TELEGRAM_GLOBAL_RATE - TELEGRAM_REPLY_RATE
+
+
+def shared_bucket():
+    global _bucket
+    if _bucket is None:
+        _bucket = SharedTokenBucket(TELEGRAM_GLOBAL_RATE, max(1, TELEGRAM_GLOBAL_RATE), TELEGRAM_RATE_STATE_PATH)
+    return _bucket
+
+
+class BulkLimiter:
+    """حد البث: سقفه الخاص ثم الرصيد المشترك مع ترك reserve رمزاً للردود."""
+
+    def __init__(self, bucket, rate, reserve):
+        self.bucket = bucket
+        self.ceiling = TokenBucket(rate, max(1, rate))
+        self.reserve = reserve
+
+    def acquire(self):
+        self.ceiling.acquire()
+        self.bucket.acquire(reserve=self.reserve)
+
+    def pause(self, seconds):
+        self.bucket.pause(seconds)
+
+
+def get_client():
+    global _client
+    if _client is None:
+        _client = TelegramClient(global_limiter=shared_bucket())
+    return _client
+
+
+def get_bulk_client():
+    global _bulk_client
+    if _bulk_client is None:
+        limiter = BulkLimiter(shared_bucket(), bulk_rate(), max(1.0, TELEGRAM_REPLY_RATE))
+        _bulk_client = TelegramClient(global_limiter=limiter)
+    return _bulk_client
+
+
+def _after_fork():
+    # جلسة requests ومحددات المعدل (وأقفالها) لا تُنسخ بين العمليات: كل عامل ينشئ عميله
+    global _bucket, _client, _bulk_client
+    _bucket = None
+    _client = None
+    _bulk_client = None
+
+
+os.register_at_fork(after_in_child=_after_fork)
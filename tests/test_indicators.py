@@ -0,0 +1,135 @@
+# مطابقة المحرك التزايدي والنسخ المتجهة لحساب pandas ewm(adjust=False) الأصلي على نافذة الشموع
+import math
+
+import pytest
+
+np = pytest.importorskip("numpy")
+pd = pytest.importorskip("pandas")
+
+from indicators import EMA_FAST, EMA_SLOW, RSI_PERIOD, IndicatorEngine, IndicatorState, ema_matrix, rsi, rsi_matrix
+
+WINDOW = 100
+PERIOD_MS = 300000
+
+
+def random_walk(n, seed=7):
+    rng = np.random.default_rng(seed)
+    return list(100 * np.exp(np.cumsum(rng.normal(0, 0.01, n))))
+
+
+def candles_for(closes, start=0):
+    return [[(start + i) * PERIOD_MS, c, c, c, c, 1.0] for i, c in enumerate(closes)]
+
+
+def pandas_indicators(closes):
+    """المسار المرجعي لـ check_signal قبل المحرك: حساب كامل على النافذة."""
+    close = pd.Series(closes, dtype=float)
+    ema_fast = close.ewm(span=EMA_FAST, adjust=False).mean()
+    ema_slow = close.ewm(span=EMA_SLOW, adjust=False).mean()
+    rsi_series = rsi(close, RSI_PERIOD)
+    return ema_fast.to_numpy(), ema_slow.to_numpy(), rsi_series.to_numpy()
+
+
+def assert_close(actual, expected):
+    for a, e in zip(actual, expected):
+        if math.isnan(e):
+            assert math.isnan(a)
+        else:
+            assert a == pytest.approx(e, rel=1e-9, abs=1e-9)
+
+
+def test_state_fresh_window_matches_pandas():
+    closes = random_walk(WINDOW)
+    state = IndicatorState()
+    for ts, close in enumerate(closes):
+        state.push(ts, close)
+    ema_fast, ema_slow, rsi_values = pandas_indicators(closes)
+    assert_close(state.snapshot(), (ema_fast[-1], ema_slow[-1], rsi_values[-1]))
+
+
+def test_engine_sliding_window_matches_fresh_pandas():
+    # نفس استدعاءات check_signal: نافذة 100 شمعة تتقدم شمعة كل مرة، والأخيرة مفتوحة
+    closes = random_walk(2000)
+    engine = IndicatorEngine()
+    candles = candles_for(closes)
+    for end in range(WINDOW, len(candles) + 1):
+        window = candles[end - WINDOW:end]
+        prev, last = engine.update("BTC-USDT", window)
+        ema_fast, ema_slow, rsi_values = pandas_indicators([c[4] for c in window])
+        assert_close(prev, (ema_fast[-2], ema_slow[-2], rsi_values[-2]))
+        assert_close(last, (ema_fast[-1], ema_slow[-1], rsi_values[-1]))
+
+
+def test_engine_recovers_after_gap():
+    closes = random_walk(400)
+    engine = IndicatorEngine()
+    candles = candles_for(closes)
+    engine.update("ETH-USDT", candles[:WINDOW])
+    window = candles[300:300 + WINDOW]
+    prev, last = engine.update("ETH-USDT", window)
+    ema_fast, ema_slow, rsi_values = pandas_indicators([c[4] for c in window])
+    assert_close(last, (ema_fast[-1], ema_slow[-1], rsi_values[-1]))
+
+
+def test_flat_window_rsi_is_nan_like_pandas():
+    closes = random_walk(150)[:50] + [100.0] * 150
+    engine = IndicatorEngine()
+    candles = candles_for(closes)
+    for end in range(WINDOW, len(candles) + 1):
+        prev, last = engine.update("FLAT-USDT", candles[end - WINDOW:end])
+    assert math.isnan(last[2])
+
+
+@pytest.mark.parametrize("sliding", [False, True])
+def test_matrices_match_pandas(sliding):
+    closes = random_walk(WINDOW + 50)
+    if sliding:
+        rows = [closes[i:i + WINDOW] for i in range(50)]
+    else:
+        rows = [closes[:WINDOW], random_walk(WINDOW, seed=11)]
+    matrix = np.array(rows)
+    fast, slow, rsi_values = ema_matrix(matrix, EMA_FAST), ema_matrix(matrix, EMA_SLOW), rsi_matrix(matrix, RSI_PERIOD)
+    for i, row in enumerate(rows):
+        expected = pandas_indicators(row)
+        np.testing.assert_allclose(fast[i], expected[0], rtol=1e-12)
+        np.testing.assert_allclose(slow[i], expected[1], rtol=1e-12)
+        np.testing.assert_allclose(rsi_values[i], expected[2], rtol=1e-9, equal_nan=True)
+
+
+def test_matrices_left_padded_rows_match_pandas():
+    # صفوف scanner الأقصر محشوة من اليسار بـ NaN
+    short = random_walk(40, seed=3)
+    matrix = np.full((1, WINDOW), np.nan)
+    matrix[0, WINDOW - len(short):] = short
+    expected = pandas_indicators(short)
+    np.testing.assert_allclose(ema_matrix(matrix, EMA_FAST)[0, -len(short):], expected[0], rtol=1e-12)
+    np.testing.assert_allclose(rsi_matrix(matrix, RSI_PERIOD)[0, -len(short):], expected[2], rtol=1e-9, equal_nan=True)
+
+
+def test_incremental_mapping_matches_registry():
+    # كل مؤشر يعتبره strategies تزايدياً يجب أن يساوي حسابه المتجه من السجل
+    from strategies import INCREMENTAL_INDICATORS, compute
+
+    assert set(INCREMENTAL_INDICATORS) == {"ema9", "ema21", "rsi14"}
+    closes = random_walk(WINDOW)
+    prev, last = IndicatorEngine().update("BTC-USDT", candles_for(closes))
+    values = compute(np.array([closes]), INCREMENTAL_INDICATORS)
+    for name, i in INCREMENTAL_INDICATORS.items():
+        assert_close((prev[i], last[i]), values[name][0, -2:])
+
+
+def test_engine_repeated_scan_of_same_candle_reuses_state():
+    # فحص متكرر قبل إغلاق شمعة جديدة: prev من الكاش، و last تتبع سعر الشمعة المفتوحة
+    closes = random_walk(WINDOW + 1)
+    engine = IndicatorEngine()
+    candles = candles_for(closes)
+    engine.update("BTC-USDT", candles[:WINDOW])
+    state = engine._states["BTC-USDT"]
+    count = state.count
+    for close in (closes[WINDOW - 1] * 1.01, closes[WINDOW - 1] * 0.99):
+        window = candles[:WINDOW - 1] + [[candles[WINDOW - 1][0], close, close, close, close, 1.0]]
+        prev, last = engine.update("BTC-USDT", window)
+        ema_fast, ema_slow, rsi_values = pandas_indicators([c[4] for c in window])
+        assert_close(prev, (ema_fast[-2], ema_slow[-2], rsi_values[-2]))
+        assert_close(last, (ema_fast[-1], ema_slow[-1], rsi_values[-1]))
+    assert state.count == count
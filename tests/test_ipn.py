@@ -0,0 +1,66 @@
+# ipn.ingest: فواتير الاشتراكات لا تسقط أبداً في المسار القديم (order_id = telegram_id)
+from datetime import datetime, timedelta
+
+import pytest
+
+pytest.importorskip("sqlalchemy")
+
+import ipn
+from models import User, Subscription
+from nowpayments import subscription_order_id
+
+
+@pytest.fixture(autouse=True)
+def clear_seen():
+    ipn.seen.clear()
+
+
+def finished(payment_id, **fields):
+    return dict(payment_status="finished", payment_id=payment_id, **fields)
+
+
+def test_pending_invoice_is_activated(db):
+    db.add(User(id=1, telegram_id="555"))
+    db.add(Subscription(id=7, user_id=1, status="pending", invoice_id="inv7"))
+    db.commit()
+    result = ipn.ingest(db, finished("p1", invoice_id="inv7", order_id=subscription_order_id(7)))
+    assert result.status == ipn.PROCESSED and result.telegram_id == "555"
+    assert db.get(Subscription, 7).status == "active"
+
+
+def test_second_payment_on_activated_invoice_does_not_touch_other_users(db):
+    # مستخدم آخر telegram_id الخاص به يساوي رقم الاشتراك 7
+    db.add_all([User(id=1, telegram_id="555"), User(id=2, telegram_id="7")])
+    now = datetime.utcnow()
+    db.add(Subscription(id=7, user_id=1, status="active", invoice_id="inv7",
+                        start_date=now, end_date=now + timedelta(days=30)))
+    db.commit()
+    for order_id in ("7", subscription_order_id(7)):
+        result = ipn.ingest(db, finished(f"p-{order_id}", invoice_id="inv7", order_id=order_id))
+        assert result.status == ipn.ALREADY_ACTIVE and result.telegram_id == "555"
+    assert db.query(Subscription).filter(Subscription.user_id == 2).count() == 0
+
+
+def test_prefixed_order_for_missing_subscription_is_not_found(db):
+    db.add(User(id=1, telegram_id="9"))
+    db.commit()
+    result = ipn.ingest(db, finished("p2", invoice_id="unknown", order_id=subscription_order_id(9)))
+    assert result.status == ipn.NOT_FOUND
+    assert db.query(Subscription).count() == 0
+
+
+def test_legacy_order_id_is_telegram_id(db):
+    db.add(User(id=1, telegram_id="12345"))
+    db.commit()
+    result = ipn.ingest(db, finished("p3", order_id="12345", pay_amount=40, pay_currency="usdt"))
+    assert result.status == ipn.PROCESSED and result.telegram_id == "12345"
+
+
+def test_missing_payment_id_is_ignored_and_not_recorded(db):
+    db.add(User(id=1, telegram_id="12345"))
+    db.commit()
+    for _ in range(2):
+        result = ipn.ingest(db, dict(payment_status="finished", order_id="12345"))
+        assert result.status == ipn.IGNORED
+    assert db.query(ipn.ProcessedPayment).count() == 0
+    assert db.query(Subscription).count() == 0
@@ -0,0 +1,54 @@
+# SharedTokenBucket: رصيد واحد بين العمليات، والأولوية المنخفضة تأخذ فقط ما تتركه العالية
+import pytest
+
+from ratelimit import SharedTokenBucket
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+def test_low_priority_leaves_reserve_for_high_priority():
+    clock = FakeClock()
+    bucket = SharedTokenBucket(10, 10, clock=clock, sleep=clock.sleep)
+    # البث يستهلك حتى يبقى الاحتياطي فقط، دون انتظار
+    for _ in range(7):
+        bucket.acquire(reserve=3)
+    assert clock.now == 1000.0
+    # الرد يأخذ الاحتياطي فوراً
+    for _ in range(3):
+        bucket.acquire()
+    assert clock.now == 1000.0
+    # الرصيد صفر: البث ينتظر حتى يعود الاحتياطي ويزيد رمزاً (0.4 ثانية بمعدل 10/ثانية)
+    bucket.acquire(reserve=3)
+    assert clock.now == pytest.approx(1000.4)
+
+
+def test_high_priority_uses_full_rate_when_idle():
+    clock = FakeClock()
+    bucket = SharedTokenBucket(10, 10, clock=clock, sleep=clock.sleep)
+    for _ in range(30):
+        bucket.acquire()
+    # 10 رصيد أولي + 20 بمعدل 10/ثانية
+    assert clock.now == pytest.approx(1002.0)
+
+
+def test_balance_and_pause_are_shared_through_the_file(tmp_path):
+    clock = FakeClock()
+    path = str(tmp_path / "rate")
+    first = SharedTokenBucket(10, 10, path, clock=clock, sleep=clock.sleep)
+    second = SharedTokenBucket(10, 10, path, clock=clock, sleep=clock.sleep)
+    for _ in range(10):
+        first.acquire()
+    second.acquire()
+    assert clock.now == pytest.approx(1000.1)
+    first.pause(5)
+    second.acquire()
+    assert clock.now == pytest.approx(1005.1)
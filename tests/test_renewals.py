@@ -0,0 +1,99 @@
+# renewals.due: إعادة التذكيرات الفاشلة مؤقتاً فقط، و expire_subscriptions لا يبلغ من جدد مسبقاً
+from datetime import datetime, timedelta
+
+import pytest
+
+pytest.importorskip("sqlalchemy")
+
+import renewals
+import services
+from models import User, Subscription, RenewalReminder
+
+
+def add_user(db, user_id, end_date, strategy="strategy_one"):
+    db.add(User(id=user_id, telegram_id=str(user_id)))
+    subscription = Subscription(user_id=user_id, strategy=strategy, status="active",
+                                start_date=end_date - timedelta(days=30), end_date=end_date)
+    db.add(subscription)
+    db.flush()
+    return subscription
+
+
+def test_due_retries_only_transient_failures(db):
+    now = datetime.utcnow()
+    end = now + timedelta(hours=12)
+    reminders = {
+        1: None,                               # لا تذكير بعد
+        2: ("failed", 503, 1),                 # خطأ خادم: يُعاد
+        3: ("failed", None, 1),                # مهلة/انقطاع: يُعاد
+        4: ("failed", 429, 1),                 # حد المعدل: يُعاد
+        5: ("failed", 403, 1),                 # حظر البوت: لا يُعاد
+        6: ("failed", 503, renewals.RENEWAL_MAX_ATTEMPTS),  # استنفد محاولاته
+        7: ("sent", 200, 1),
+        8: ("claimed", None, 1),               # قيد الإرسال الآن
+    }
+    subscriptions = {}
+    for user_id, reminder in reminders.items():
+        subscriptions[user_id] = add_user(db, user_id, end + timedelta(minutes=user_id))
+        if reminder:
+            status, code, attempts = reminder
+            db.add(RenewalReminder(subscription_id=subscriptions[user_id].id, kind="1d", telegram_id=str(user_id),
+                                   status=status, status_code=code, attempts=attempts))
+    db.commit()
+
+    due = renewals.due(db, "1d", now, now + timedelta(days=1))
+    assert [c.user_id for c in due] == [1, 2, 3, 4]
+    assert [c.attempts for c in due] == [None, 1, 1, 1]
+
+    claimed = renewals.claim(db, "1d", due)
+    assert sorted(c.user_id for c in claimed) == [1, 2, 3, 4]
+    retried = db.query(RenewalReminder).filter(RenewalReminder.subscription_id == subscriptions[2].id).one()
+    assert (retried.status, retried.attempts, retried.status_code) == ("claimed", 2, None)
+    # حجز المحاولة نفسها مرة ثانية (عملية أخرى) لا يأخذ شيئاً
+    assert renewals.claim(db, "1d", due[1:]) == []
+
+
+def test_expiry_does_not_notify_prepaid_renewals(db):
+    now = datetime.utcnow()
+    add_user(db, 1, now - timedelta(minutes=1))
+    prepaid = add_user(db, 2, now - timedelta(minutes=1))
+    db.add(Subscription(user_id=2, strategy=prepaid.strategy, status="active",
+                        start_date=prepaid.end_date, end_date=prepaid.end_date + timedelta(days=30)))
+    db.commit()
+
+    expired, chat_ids = services.expire_subscriptions(db, collect_chat_ids=True)
+    assert expired == 2
+    assert chat_ids == ["1"]
+
+
+class FakePayments:
+    def __init__(self):
+        self.orders = []
+
+    def create_invoice(self, order_id, amount, **params):
+        self.orders.append(order_id)
+        return f"https://pay/{order_id}", f"inv-{order_id}"
+
+
+class FakeTelegram:
+    def send_message(self, chat_id, text):
+        from telegram_client import SendResult
+        return SendResult(chat_id, True, 200, None, 1)
+
+
+def test_invoices_only_for_claimed_reminders(db):
+    from ratelimit import TokenBucket
+
+    now = datetime.utcnow()
+    mine = add_user(db, 1, now + timedelta(hours=12))
+    taken = add_user(db, 2, now + timedelta(hours=13))
+    # دورة أخرى حجزت هذا التذكير وما زالت تنشئ فاتورته
+    db.add(RenewalReminder(subscription_id=taken.id, kind="1d", telegram_id="2", status="claimed"))
+    db.commit()
+
+    payments = FakePayments()
+    stats = renewals.remind_window(db, "1d", now, now + timedelta(days=1), FakeTelegram(), payments,
+                                   TokenBucket(1000, 1000), workers=2)
+    assert stats["sent"] == 1 and len(payments.orders) == 1
+    reminder = db.query(RenewalReminder).filter(RenewalReminder.subscription_id == mine.id).one()
+    assert reminder.status == "sent" and reminder.invoice_url == f"https://pay/{payments.orders[0]}"
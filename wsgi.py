@@ -0,0 +1,14 @@
+# wsgi.py
+# نقطة دخول الإنتاج متعددة العمليات بدلاً من خادم Flask التجريبي:
+#   gunicorn -c gunicorn.conf.py wsgi:app
+# الإعدادات (عدد العمال، المشاركة بين العمليات، المهام المجدولة) في gunicorn.conf.py
+import jobs
+from app import app, start_background_jobs
+
+
+def start_jobs_if_leader():
+    # كل عامل يحاول؛ القفل يضمن أن المهام تعمل مرة واحدة لا مرة لكل عامل
+    if jobs.acquire_leader():
+        start_background_jobs()
+        return True
+    return False